@@ -0,0 +1,242 @@
+#!/usr/bin/python
+""" Measure analysis of images by deltae.py on synthetic captures (made by
+synthetic.py) or on directory with manifest.json: latency per image, time
+of stages and peak RSS for every sampler and deltaE formula. Results can
+be saved as JSON and compared with earlier run."""
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import subprocess
+from statistics import median
+
+import synthetic
+
+DELTAE_DIR = synthetic.DELTAE_DIR
+
+# Stage and function of deltae.py timed for it, stages can be nested
+# (sampling includes decode or regions)
+STAGES = (("sampling", "sample_image"),
+          ("decode", "get_image_array"),
+          ("regions", "read_tiff_regions"),
+          ("magick", "get_patch_value"),
+          ("deltae", "delta_e_calc_array"),
+          ("sfr", "measure_sharpness"),
+          ("metadata", "get_exif_data"),
+          ("report", "write_image_report"))
+
+
+def run_child(job: dict) -> dict:
+    """Analyze image in this process, with stages timed by wrapped
+    functions of deltae.py
+    :param job: file, checker, orientation, sampler, deltae, metadata,
+                write_report and runs
+    :type job: dict
+    :return: latency of first and median run in s, median time of stages
+             in s, peak RSS in MB and dE of image
+    :rtype: dict
+    """
+    sys.path.insert(0, DELTAE_DIR)
+    import deltae
+
+    timings = {}
+
+    def timed(stage, function):
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timings[stage] = (timings.get(stage, 0.0)
+                                  + time.perf_counter() - start)
+        return wrapper
+
+    for stage, name in STAGES:
+        setattr(deltae, name, timed(stage, getattr(deltae, name)))
+
+    settings = deltae.get_settings(job["checker"], job["orientation"],
+                                   job["deltae"], sampler=job["sampler"],
+                                   metadata=job["metadata"],
+                                   write_report=job["write_report"])
+    latencies = []
+    stages = {stage: [] for stage, _ in STAGES}
+    for _ in range(job["runs"]):
+        timings.clear()
+        start = time.perf_counter()
+        result = deltae.analyze_image(job["file"], settings)
+        latencies.append(time.perf_counter() - start)
+        for stage in stages:
+            stages[stage].append(timings.get(stage, 0.0))
+
+    return {"first_s": latencies[0], "latency_s": median(latencies),
+            "stages_s": {stage: median(values)
+                         for stage, values in stages.items()
+                         if any(values)},
+            "peak_rss_mb": get_peak_rss(), "de": result.deltae}
+
+
+def get_peak_rss():
+    """Peak resident memory of this process
+    :return: peak RSS in MB, None when not available (Windows)
+    :rtype: float or None
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kB, macOS bytes
+    if sys.platform == "darwin":
+        peak /= 1024
+
+    return peak / 1024
+
+
+def measure(entry: dict, sampler: str, formula: str, args) -> dict:
+    """Run analysis of image in child process, so peak RSS and imports
+    belong to this image only
+    :param entry: entry of manifest
+    :type entry: dict
+    :param sampler: pillow, region or magick
+    :type sampler: str
+    :param formula: deltaE formula: 2k or 76
+    :type formula: str
+    :param args: parsed options
+    :type args: argparse.Namespace
+    :return: entry of results
+    :rtype: dict
+    """
+    job = {"file": entry["file"], "checker": entry["checker"],
+           "orientation": entry["orientation"], "sampler": sampler,
+           "deltae": formula, "metadata": args.metadata,
+           "write_report": not args.no_report, "runs": args.runs}
+    output = subprocess.run([sys.executable, os.path.abspath(__file__),
+                             "--child", json.dumps(job)],
+                            capture_output=True, text=True, check=True).stdout
+
+    return {"image": os.path.basename(entry["file"]),
+            "megapixels": entry["megapixels"], "sampler": sampler,
+            "deltae": formula,
+            **json.loads(output.rsplit("@", 1)[1])}
+
+
+def compare(results: list, old_file: str, max_regression: float) -> list:
+    """Compare median latency with earlier run
+    :param results: entries of results
+    :type results: list
+    :param old_file: JSON saved by --json
+    :type old_file: str
+    :param max_regression: allowed slowdown, 0.2 for 20%
+    :type max_regression: float
+    :return: image, sampler, formula, old and new latency of slower
+             entries
+    :rtype: list
+    """
+    with open(old_file, encoding="utf-8") as f:
+        old = {(r["image"], r["sampler"], r["deltae"]): r["latency_s"]
+               for r in json.load(f)["results"]}
+
+    slower = []
+    for r in results:
+        key = (r["image"], r["sampler"], r["deltae"])
+        if key not in old:
+            continue
+        ratio = r["latency_s"] / old[key]
+        print(f"{r['image']:32} {r['sampler']:7} {r['deltae']:3} "
+              f"{old[key]:8.3f} s -> {r['latency_s']:8.3f} s "
+              f"({ratio - 1:+.0%})")
+        if ratio > 1 + max_regression:
+            slower.append((*key, old[key], r["latency_s"]))
+
+    return slower
+
+
+if __name__ == '__main__':
+
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        print(f"@{json.dumps(run_child(json.loads(sys.argv[2])))}")
+        sys.exit(0)
+
+    ap = argparse.ArgumentParser(description="Measure analysis of images "
+                                             "by deltae.py")
+    synthetic.add_arguments(ap)
+    ap.add_argument("--images",
+                    help="""Directory with images and manifest.json
+                         (made by synthetic.py), instead of rendering
+                         images to temporary directory""")
+    ap.add_argument("--samplers",
+                    help="""Comma separated samplers, default pillow,region
+                         and magick when it is installed""")
+    ap.add_argument("--deltae", default="2k,76",
+                    help="Comma separated deltaE formulas, default 2k,76")
+    ap.add_argument("--metadata", default="pillow",
+                    choices=("session", "exiftool", "pillow"),
+                    help="Reading of metadata, default pillow")
+    ap.add_argument("--no-report", action="store_true",
+                    help="Don't write reports (text file and proof)")
+    ap.add_argument("--runs", "-r", type=int, default=3,
+                    help="Number of runs, median is reported (default 3)")
+    ap.add_argument("--json", metavar="FILE",
+                    help="Save results as JSON")
+    ap.add_argument("--compare", metavar="FILE",
+                    help="""Compare latency with results saved by --json,
+                         exit with error when slower""")
+    ap.add_argument("--max-regression", type=float, default=0.2,
+                    help="Allowed slowdown for --compare, default 0.2")
+    args = ap.parse_args()
+
+    samplers = ["pillow", "region"]
+    if args.samplers:
+        samplers = args.samplers.split(",")
+    elif shutil.which("magick"):
+        samplers.append("magick")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.images:
+            with open(os.path.join(args.images, "manifest.json"),
+                      encoding="utf-8") as f:
+                manifest = json.load(f)
+            # Directory could be moved after rendering
+            for entry in manifest:
+                entry["file"] = os.path.join(
+                    args.images, os.path.basename(entry["file"]))
+        else:
+            manifest = synthetic.generate_set(
+                tmp_dir, *synthetic.parse_set(args), args.noise,
+                args.deflate)
+
+        results = []
+        for entry in manifest:
+            for sampler in samplers:
+                for formula in args.deltae.split(","):
+                    r = measure(entry, sampler, formula, args)
+                    results.append(r)
+                    stages = ", ".join(f"{stage} {value:.3f}" for
+                                       stage, value in r["stages_s"].items())
+                    rss = ("" if r["peak_rss_mb"] is None
+                           else f"{r['peak_rss_mb']:7.1f} MB")
+                    print(f"{r['image']:32} {sampler:7} {formula:3} "
+                          f"{r['latency_s']:8.3f} s {rss} "
+                          f"dE {r['de']:.2f} ({stages})")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0],
+                       "numpy": synthetic.numpy.__version__,
+                       "platform": platform.platform(),
+                       "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                       "runs": args.runs, "results": results}, f, indent=2)
+
+    failed = False
+    if args.compare:
+        for image, sampler, formula, old, new in compare(
+                results, args.compare, args.max_regression):
+            print(f"Error: {image} {sampler} {formula} {old:.3f} s -> "
+                  f"{new:.3f} s over {args.max_regression:.0%} slower")
+            failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+""" Measure startup of deltae.py: import time of module and its heaviest
+imports (python -X importtime) and wall time of CLI checking text file,
+fail when over budget or when text check loads modules of image path."""
+import os
+import re
+import sys
+import json
+import tempfile
+import argparse
+import subprocess
+from statistics import median
+
+DELTAE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DELTAE = os.path.join(DELTAE_DIR, "deltae.py")
+
+# Modules used only for images or batch, text check shouldn't load them
+IMAGE_MODULES = ("PIL", "concurrent.futures.process",
+                 "xml.etree.ElementTree", "statistics")
+
+
+def write_text_file(fname: str):
+    """Write text file with reference values of cc24 in
+    deltae.picturae format
+    :param fname: file name
+    :type fname: str
+    """
+    sys.path.insert(0, DELTAE_DIR)
+    import deltae
+
+    spec = deltae.get_checker_spec("cc24")
+    with open(fname, "w", encoding="utf-8") as f:
+        f.write("deltae startup\n\n\nTargettype: CC\nPatch,R,G,B,L,a,b\n")
+        for pname, (lab_l, lab_a, lab_b) in zip(spec.patches,
+                                                spec.reference.tolist()):
+            f.write(f"{pname},0,0,0,{lab_l + 0.5},{lab_a},{lab_b}\n")
+
+
+def get_import_times() -> tuple:
+    """Import deltae with python -X importtime
+    :return: cumulative import time of deltae in ms and direct imports
+             of deltae with their cumulative time in ms
+    :rtype: float, list
+    """
+    output = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                             "import deltae"],
+                            cwd=DELTAE_DIR, capture_output=True,
+                            text=True, check=True).stderr
+
+    imports = []
+    total = 0.0
+    # Nested imports are printed before their parent, direct imports
+    # of deltae are indented by 2 spaces more than deltae itself
+    for line in output.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( +)(\S+)", line)
+        if not match:
+            continue
+        cumulative, indent, module = match.groups()
+        if module == "deltae":
+            total = int(cumulative) / 1000
+        elif len(indent) == 3:
+            imports.append((module, int(cumulative) / 1000))
+
+    return total, sorted(imports, key=lambda x: -x[1])
+
+
+def get_cli_time(fname: str) -> float:
+    """Run CLI for text file
+    :param fname: text file to check
+    :type fname: str
+    :return: wall time in ms
+    :rtype: float
+    """
+    code = ("import sys, time, runpy; start = time.perf_counter(); "
+            f"sys.argv = ['deltae.py', {fname!r}]; "
+            f"runpy.run_path({DELTAE!r}, run_name='__main__'); "
+            "print(f'@{(time.perf_counter() - start) * 1000}')")
+    output = subprocess.run([sys.executable, "-c", code], cwd=DELTAE_DIR,
+                            capture_output=True, text=True,
+                            check=True).stdout
+
+    return float(output.rsplit("@", 1)[1])
+
+
+def get_loaded_modules(fname: str) -> list:
+    """Check text file with analyze_text and list modules of image
+    path which were loaded
+    :param fname: text file to check
+    :type fname: str
+    :return: names of loaded modules
+    :rtype: list
+    """
+    code = ("import sys, json, deltae; "
+            f"deltae.analyze_text({fname!r}); "
+            "print(json.dumps([m for m in "
+            f"{IMAGE_MODULES!r} if m in sys.modules]))")
+    output = subprocess.run([sys.executable, "-c", code], cwd=DELTAE_DIR,
+                            capture_output=True, text=True,
+                            check=True).stdout
+
+    return json.loads(output)
+
+
+if __name__ == '__main__':
+
+    ap = argparse.ArgumentParser(description="Measure startup of deltae.py")
+    ap.add_argument("--runs", "-r", type=int, default=10,
+                    help="Number of runs, median is reported (default 10)")
+    ap.add_argument("--budget", "-b", type=float, default=None,
+                    help="""Maximum median time of CLI checking text file
+                         in ms, exit with error when exceeded""")
+    ap.add_argument("--top", type=int, default=10,
+                    help="Number of heaviest imports to show (default 10)")
+    ap.add_argument("--json", action="store_true",
+                    help="Print results as JSON")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        text_file = os.path.join(tmp_dir, "startup.csv")
+        write_text_file(text_file)
+
+        import_runs = [get_import_times() for _ in range(args.runs)]
+        cli_runs = [get_cli_time(text_file) for _ in range(args.runs)]
+        loaded = get_loaded_modules(text_file)
+
+    import_total = median(total for total, _ in import_runs)
+    heaviest = import_runs[0][1][:args.top]
+    cli_time = median(cli_runs)
+
+    if args.json:
+        print(json.dumps({"python": sys.version.split()[0],
+                          "import_ms": round(import_total, 1),
+                          "cli_text_ms": round(cli_time, 1),
+                          "imports_ms": {module: cumulative for
+                                         module, cumulative in heaviest},
+                          "image_modules_loaded": loaded}, indent=2))
+    else:
+        print(f"import deltae: {import_total:.1f} ms "
+              f"(median of {args.runs})")
+        for module, cumulative in heaviest:
+            print(f"  {module:32} {cumulative:8.1f} ms")
+        print(f"CLI text file: {cli_time:.1f} ms (median of {args.runs})")
+
+    failed = False
+    if loaded:
+        print(f"Error: text check loaded {', '.join(loaded)}")
+        failed = True
+    if args.budget is not None and cli_time > args.budget:
+        print(f"Error: CLI text file {cli_time:.1f} ms "
+              f"over budget {args.budget:.1f} ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,381 @@
+#!/usr/bin/python
+""" Render synthetic captures of checkers of deltae.py: patches in
+reference Lab values (Adobe RGB, like deltae.py reads them), every
+orientation, 8 and 16 bits, JPEG, PNG and TIFF, any size. TIFF and PNG
+are written strip by strip, so even 150 MP files need little memory.
+GoldenThread targets get slanted squares for SFR."""
+import os
+import sys
+import json
+import zlib
+import struct
+import argparse
+
+import numpy
+from PIL import Image, ImageDraw
+
+DELTAE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, DELTAE_DIR)
+import deltae  # noqa: E402
+
+# Width / height of capture in S orientation
+ASPECT = 1.5
+# Rotation of file to S orientation, like --orientation of deltae.py
+ORIENTATIONS = {"S": 0, "W": 270, "N": 180, "E": 90}
+# Formats and their bit depths (JPEG is 8-bit only)
+FORMATS = {"jpg": (8,), "png": (8, 16), "tif": (8, 16)}
+# Background and slanted squares in RGB (0-1)
+BACKGROUND = (0.3, 0.3, 0.3)
+SQUARE = (0.9, 0.9, 0.9)
+# Rows of TIFF strip or PNG band written at once
+STRIP_ROWS = 64
+
+
+def lab_to_rgb(lab) -> numpy.ndarray:
+    """Convert Lab (D50) to Adobe RGB, inverse of rgb_to_lab_array
+    of deltae.py
+    :param lab: Lab values
+    :type lab: numpy.ndarray (N, 3)
+    :return: RGB values in 0-1 scale
+    :rtype: numpy.ndarray (N, 3)
+    """
+    rgb_matrix, adaptation, white = deltae.get_conversion_matrices()
+    lab = numpy.asarray(lab, dtype=float)
+
+    f_y = (lab[:, 0] + 16.0) / 116.0
+    f_xyz = numpy.stack((f_y + lab[:, 1] / 500.0, f_y,
+                         f_y - lab[:, 2] / 200.0), axis=-1)
+    xyz = numpy.where(f_xyz ** 3 > deltae.color_constants.CIE_E,
+                      f_xyz ** 3, (f_xyz - 16.0 / 116.0) / 7.787) * white
+    xyz = xyz @ numpy.linalg.inv(adaptation).T
+    linear = numpy.clip(xyz @ numpy.linalg.inv(rgb_matrix).T, 0.0, 1.0)
+
+    return linear ** (1 / deltae.AdobeRGBColor.rgb_gamma)
+
+
+def render_index(checker: str, width: int, height: int) -> tuple:
+    """Draw checker in S orientation as indexes of colors
+    :param checker: name of checker
+    :type checker: str
+    :param width: width in pixels
+    :type width: int
+    :param height: height in pixels
+    :type height: int
+    :return: indexes of colors and colors in 0-1 scale
+    :rtype: Image, numpy.ndarray (N, 3)
+    """
+    spec = deltae.get_checker_spec(checker)
+    centres = spec.centres * (width / 100, height / 100)
+    # Patches with gap to the nearest one, or touching it when probe of
+    # deltae.py wouldn't fit (GoldenThread)
+    distances = numpy.hypot(*(centres[:, numpy.newaxis]
+                              - centres[numpy.newaxis]).transpose(2, 0, 1))
+    distances[numpy.diag_indices(len(centres))] = numpy.inf
+    nearest = distances.min(axis=1)
+    probe = min(round(width * spec.patch_fraction / 2), 25)
+    halves = numpy.minimum(0.5 * nearest,
+                           numpy.maximum(0.4 * nearest, probe + 2))
+
+    # Probes of deltae.py (S orientation) are painted over the patches,
+    # so every probe gets its own patch only, also where rounding makes
+    # it wider than the drawn patch
+    _, boxes = deltae.get_checker_boxes(checker, width, height, 0)
+    rectangles = numpy.column_stack(
+        (numpy.round(centres - halves[:, numpy.newaxis]),
+         numpy.round(centres + halves[:, numpy.newaxis]))).astype(int)
+    rectangles[:, :2] = numpy.minimum(rectangles[:, :2], boxes[:, :2])
+    rectangles[:, 2:] = numpy.maximum(rectangles[:, 2:], boxes[:, 2:])
+
+    index = Image.new("L", (width, height), 0)
+    draw = ImageDraw.Draw(index)
+    for number, (left, top, right, bottom) in enumerate(
+            rectangles.tolist(), 2):
+        draw.rectangle((left, top, right - 1, bottom - 1), fill=number)
+    for number, (left, top, right, bottom) in enumerate(boxes.tolist(), 2):
+        draw.rectangle((left, top, right - 1, bottom - 1), fill=number)
+
+    if checker in deltae.SFR_CHECKERS:
+        # Squares slanted by 5 degrees in bands above and below all
+        # patches, half of square and gap to patches fit into the band
+        angle = numpy.radians(5)
+        reach = numpy.cos(angle) + numpy.sin(angle)
+        corners = numpy.array(((-1, -1), (1, -1), (1, 1), (-1, 1)))
+        corners = corners @ numpy.array(((numpy.cos(angle),
+                                          numpy.sin(angle)),
+                                         (-numpy.sin(angle),
+                                          numpy.cos(angle))))
+        bands = ((0, rectangles[:, 1].min()),
+                 (rectangles[:, 3].max(), height))
+        for band_top, band_bottom in bands:
+            half = min(0.06 * height, 0.4 * (band_bottom - band_top) / reach)
+            y = (band_top + band_bottom) / 2
+            for x in (0.1, 0.3, 0.5, 0.7, 0.9):
+                draw.polygon([tuple(point) for point in
+                              (corners * half + (x * width, y)).tolist()],
+                             fill=1)
+
+    colors = numpy.vstack((BACKGROUND, SQUARE, lab_to_rgb(spec.reference)))
+
+    return index, colors
+
+
+def iter_strips(index, colors, bits: int, noise=0.0, seed=0):
+    """Give pixels of image by strips of rows
+    :param index: indexes of colors (height, width)
+    :type index: numpy.ndarray
+    :param colors: colors in 0-1 scale
+    :type colors: numpy.ndarray (N, 3)
+    :param bits: 8 or 16
+    :type bits: int
+    :param noise: standard deviation of noise in 0-1 scale
+    :type noise: float
+    :param seed: seed of noise
+    :type seed: int
+    :return: pixels of strip (rows, width, 3)
+    :rtype: Iterator[numpy.ndarray]
+    """
+    max_value = 2 ** bits - 1
+    dtype = numpy.uint8 if bits == 8 else numpy.uint16
+    table = numpy.round(colors * max_value)
+    rng = numpy.random.default_rng(seed)
+
+    for top in range(0, index.shape[0], STRIP_ROWS):
+        strip = table[index[top:top + STRIP_ROWS]]
+        if noise:
+            strip += rng.normal(0, noise * max_value, strip.shape)
+        yield numpy.clip(numpy.round(strip), 0, max_value).astype(dtype)
+
+
+def write_tiff(fname: str, strips, width: int, height: int, bits: int,
+               deflate=False):
+    """Write RGB TIFF strip by strip, uncompressed or deflate
+    :param fname: file name
+    :type fname: str
+    :param strips: pixels of strips of STRIP_ROWS rows
+    :type strips: Iterator[numpy.ndarray]
+    :param width: width in pixels
+    :type width: int
+    :param height: height in pixels
+    :type height: int
+    :param bits: 8 or 16
+    :type bits: int
+    :param deflate: compress strips with deflate
+    :type deflate: bool
+    """
+    offsets, counts = [], []
+    with open(fname, "wb") as f:
+        # IFD offset is written after strips
+        f.write(b"II*\0\0\0\0\0")
+        for strip in strips:
+            data = strip.astype(strip.dtype.newbyteorder("<")).tobytes()
+            if deflate:
+                data = zlib.compress(data, 6)
+            offsets.append(f.tell())
+            counts.append(len(data))
+            f.write(data)
+            if f.tell() % 2:
+                f.write(b"\0")
+
+        bps_offset = f.tell()
+        f.write(struct.pack("<3H", bits, bits, bits))
+        offsets_offset = f.tell()
+        f.write(struct.pack(f"<{len(offsets)}I", *offsets))
+        counts_offset = f.tell()
+        f.write(struct.pack(f"<{len(counts)}I", *counts))
+
+        strip_count = len(offsets)
+        # (tag, type, count, value), types: 3 SHORT, 4 LONG
+        tags = [(256, 4, 1, width), (257, 4, 1, height),
+                (258, 3, 3, bps_offset), (259, 3, 1, 8 if deflate else 1),
+                (262, 3, 1, 2),
+                (273, 4, strip_count,
+                 offsets_offset if strip_count > 1 else offsets[0]),
+                (277, 3, 1, 3), (278, 4, 1, STRIP_ROWS),
+                (279, 4, strip_count,
+                 counts_offset if strip_count > 1 else counts[0]),
+                (284, 3, 1, 1)]
+        ifd_offset = f.tell()
+        f.write(struct.pack("<H", len(tags)))
+        for tag, tag_type, count, value in tags:
+            if tag_type == 3 and count == 1:
+                f.write(struct.pack("<HHIHH", tag, tag_type, count, value, 0))
+            else:
+                f.write(struct.pack("<HHII", tag, tag_type, count, value))
+        f.write(struct.pack("<I", 0))
+
+        f.seek(4)
+        f.write(struct.pack("<I", ifd_offset))
+
+
+def write_png(fname: str, strips, width: int, height: int, bits: int):
+    """Write RGB PNG band by band (Pillow can't write 16-bit RGB)
+    :param fname: file name
+    :type fname: str
+    :param strips: pixels of strips
+    :type strips: Iterator[numpy.ndarray]
+    :param width: width in pixels
+    :type width: int
+    :param height: height in pixels
+    :type height: int
+    :param bits: 8 or 16
+    :type bits: int
+    """
+    def chunk(name: bytes, data: bytes) -> bytes:
+        return (struct.pack(">I", len(data)) + name + data
+                + struct.pack(">I", zlib.crc32(name + data)))
+
+    compressor = zlib.compressobj(6)
+    with open(fname, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, bits,
+                                           2, 0, 0, 0)))
+        for strip in strips:
+            rows = strip.astype(strip.dtype.newbyteorder(">")).reshape(
+                strip.shape[0], -1).view(numpy.uint8)
+            # Filter type 0 (None) before every row
+            data = numpy.hstack((numpy.zeros((len(rows), 1), numpy.uint8),
+                                 rows)).tobytes()
+            compressed = compressor.compress(data)
+            if compressed:
+                f.write(chunk(b"IDAT", compressed))
+        f.write(chunk(b"IDAT", compressor.flush()))
+        f.write(chunk(b"IEND", b""))
+
+
+def generate(out_dir: str, checker: str, orientation="S", bits=8,
+             file_format="tif", megapixels=5.0, noise=0.0,
+             deflate=False) -> dict:
+    """Render capture of checker and write it
+    :param out_dir: directory of images
+    :type out_dir: str
+    :param checker: name of checker
+    :type checker: str
+    :param orientation: S, W, N or E
+    :type orientation: str
+    :param bits: 8 or 16
+    :type bits: int
+    :param file_format: jpg, png or tif
+    :type file_format: str
+    :param megapixels: size of image
+    :type megapixels: float
+    :param noise: standard deviation of noise in 0-1 scale
+    :type noise: float
+    :param deflate: compress TIFF with deflate
+    :type deflate: bool
+    :return: entry of manifest: file and parameters of image
+    :rtype: dict
+    """
+    width = round((megapixels * 1e6 * ASPECT) ** 0.5)
+    height = round(width / ASPECT)
+    index, colors = render_index(checker, width, height)
+    # File is rotated clockwise by rotation to get S orientation
+    rotation = ORIENTATIONS[orientation]
+    if rotation:
+        index = index.rotate(rotation, expand=True)
+    index = numpy.asarray(index)
+    height, width = index.shape
+
+    deflate = deflate and file_format == "tif"
+    fname = os.path.join(out_dir, f"{checker}_{orientation}_{bits}bit_"
+                                  f"{megapixels:g}mp{'_z' * deflate}"
+                                  f".{file_format}")
+    strips = iter_strips(index, colors, bits, noise)
+    if file_format == "tif":
+        write_tiff(fname, strips, width, height, bits, deflate)
+    elif file_format == "png":
+        write_png(fname, strips, width, height, bits)
+    else:
+        Image.fromarray(numpy.vstack(list(strips))).save(fname, quality=95)
+
+    return {"file": fname, "checker": checker, "orientation": orientation,
+            "bits": bits, "format": file_format, "megapixels": megapixels,
+            "width": width, "height": height, "deflate": deflate}
+
+
+def generate_set(out_dir: str, checkers, orientations, bits, formats,
+                 sizes, noise=0.0, deflate=False) -> list:
+    """Render all combinations of parameters and write manifest.json
+    :param out_dir: directory of images
+    :type out_dir: str
+    :param checkers: names of checkers
+    :type checkers: list
+    :param orientations: orientations
+    :type orientations: list
+    :param bits: bit depths
+    :type bits: list
+    :param formats: formats (jpg, png, tif)
+    :type formats: list
+    :param sizes: sizes in megapixels
+    :type sizes: list
+    :param noise: standard deviation of noise in 0-1 scale
+    :type noise: float
+    :param deflate: compress TIFF with deflate
+    :type deflate: bool
+    :return: entries of manifest
+    :rtype: list
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = [generate(out_dir, checker, orientation, depth, file_format,
+                         size, noise, deflate)
+                for size in sizes for checker in checkers
+                for orientation in orientations for file_format in formats
+                for depth in bits if depth in FORMATS[file_format]]
+    with open(os.path.join(out_dir, "manifest.json"), "w",
+              encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+def add_arguments(ap: argparse.ArgumentParser):
+    """Add options of synthetic images to parser (shared with images.py)
+    :param ap: parser
+    :type ap: argparse.ArgumentParser
+    """
+    ap.add_argument("--checkers", default="cc24,gt10",
+                    help=f"""Comma separated checkers or all
+                         ({', '.join(deltae.checker_data)}),
+                         default cc24,gt10""")
+    ap.add_argument("--orientations", default="S",
+                    help="Comma separated orientations or all, default S")
+    ap.add_argument("--bits", default="8,16",
+                    help="Comma separated bit depths, default 8,16")
+    ap.add_argument("--formats", default="jpg,png,tif",
+                    help="Comma separated formats, default jpg,png,tif")
+    ap.add_argument("--sizes", default="5",
+                    help="""Comma separated sizes in megapixels,
+                         e.g. 5,24,50,150, default 5""")
+    ap.add_argument("--noise", type=float, default=0.0,
+                    help="Standard deviation of noise in 0-1 scale")
+    ap.add_argument("--deflate", action="store_true",
+                    help="Compress TIFF with deflate")
+
+
+def parse_set(args) -> tuple:
+    """Get lists of parameters of images from options
+    :param args: parsed options
+    :type args: argparse.Namespace
+    :return: checkers, orientations, bits, formats and sizes
+    :rtype: tuple
+    """
+    def split(value: str, everything) -> list:
+        return list(everything) if value == "all" else value.split(",")
+
+    return (split(args.checkers, deltae.checker_data),
+            split(args.orientations, ORIENTATIONS),
+            [int(depth) for depth in args.bits.split(",")],
+            split(args.formats, FORMATS),
+            [float(size) for size in args.sizes.split(",")])
+
+
+if __name__ == '__main__':
+
+    ap = argparse.ArgumentParser(description="Render synthetic captures "
+                                             "of checkers")
+    ap.add_argument("out_dir", help="Directory of images and manifest.json")
+    add_arguments(ap)
+    args = ap.parse_args()
+
+    for entry in generate_set(args.out_dir, *parse_set(args), args.noise,
+                              args.deflate):
+        print(f"{entry['file']} ({entry['width']}x{entry['height']})")
@@ -1,57 +1,72 @@
 #!/usr/bin/python
 """ Check Lab values of deltae against
 modern ColorChecker."""
+from __future__ import annotations
+import io
 import os
 import re
+import glob
+import itertools
+import atexit
+import time
+import threading
+import zlib
 import argparse
+import contextvars
 from collections import namedtuple
-from datetime import date
-from statistics import stdev, quantiles
-from typing import Any, NamedTuple
-from PIL import Image
-from colormath2.color_objects import LabColor, AdobeRGBColor
-from colormath2.color_diff import delta_e_cie1976, delta_e_cie2000
-from colormath2.color_conversions import convert_color
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache
+from datetime import date, datetime
+from typing import TYPE_CHECKING, Any, NamedTuple
+import numpy
+from colormath2 import color_constants
+from colormath2.color_objects import LabColor, AdobeRGBColor, sRGBColor
+
+# Pillow is imported only by functions which open images, so checking
+# of text files starts faster
+if TYPE_CHECKING:
+    from PIL import Image
 
 # How to include resolution checking?
 # Normalize mini CC to S, precise cropping ( :( ) and adjust percentages
 # of horizontal position: A+6 B+5 C+4 D+3 E+2 F+1
 
 # Make checker data global variable, accessible for all functions
-# and imports
+# and imports. Lab values are plain tuples, arrays and LabColor
+# objects are made only for checker in use (get_checker_spec)
 
 # Auxiliary data for repeating info about patches and checkers
 # Warning this is for 05 - for test purposes just run as is
-gt_colors = {"A01": LabColor(39.12, 13.24, 15.07),
-             "A02": LabColor(65.43, 18.11, 18.72),
-             "A03": LabColor(49.87, -4.34, -22.29),
-             "A04": LabColor(44.26, -13.80, 22.85),
-             "A05": LabColor(55.56, 9.82, -24.49),
-             "A06": LabColor(70.82, -33.43, -0.35),
-             "A07": LabColor(63.51, 34.26, 59.60),
-             "A08": LabColor(39.92, 11.81, -46.07),
-             "A09": LabColor(52.24, 48.55, 18.51),
-             "A10": LabColor(97.06, -0.40, 1.13),
-             "A11": LabColor(92.02, -0.60, 0.23),
-             "A12": LabColor(83.34, -0.75, 0.21),
-             "A13": LabColor(82.14, -1.06, 0.43),
-             "A14": LabColor(72.06, -1.19, 0.28),
-             "A15": LabColor(62.15, -1.07, 0.19),
-             "A16": LabColor(49.25, -0.16, 0.01),
-             "A17": LabColor(38.62, -0.18, -0.04),
-             "A18": LabColor(28.86, 0.54, 0.60),
-             "A19": LabColor(16.19, -0.05, 0.73),
-             "A20": LabColor(8.29, -0.81, 0.19),
-             "A21": LabColor(3.44, -0.23, 0.49),
-             "A22": LabColor(31.41, 20.98, -19.43),
-             "A23": LabColor(72.46, -24.45, 55.93),
-             "A24": LabColor(72.95, 16.83, 68.80),
-             "A25": LabColor(29.37, 13.06, -49.49),
-             "A26": LabColor(54.91, -38.91, 30.77),
-             "A27": LabColor(43.96, 52.00, 30.01),
-             "A28": LabColor(82.74, 3.45, 81.29),
-             "A29": LabColor(52.79, 50.88, -12.72),
-             "A30": LabColor(50.87, -27.17, -29.46)}
+gt_colors = {"A01": (39.12, 13.24, 15.07),
+             "A02": (65.43, 18.11, 18.72),
+             "A03": (49.87, -4.34, -22.29),
+             "A04": (44.26, -13.80, 22.85),
+             "A05": (55.56, 9.82, -24.49),
+             "A06": (70.82, -33.43, -0.35),
+             "A07": (63.51, 34.26, 59.60),
+             "A08": (39.92, 11.81, -46.07),
+             "A09": (52.24, 48.55, 18.51),
+             "A10": (97.06, -0.40, 1.13),
+             "A11": (92.02, -0.60, 0.23),
+             "A12": (83.34, -0.75, 0.21),
+             "A13": (82.14, -1.06, 0.43),
+             "A14": (72.06, -1.19, 0.28),
+             "A15": (62.15, -1.07, 0.19),
+             "A16": (49.25, -0.16, 0.01),
+             "A17": (38.62, -0.18, -0.04),
+             "A18": (28.86, 0.54, 0.60),
+             "A19": (16.19, -0.05, 0.73),
+             "A20": (8.29, -0.81, 0.19),
+             "A21": (3.44, -0.23, 0.49),
+             "A22": (31.41, 20.98, -19.43),
+             "A23": (72.46, -24.45, 55.93),
+             "A24": (72.95, 16.83, 68.80),
+             "A25": (29.37, 13.06, -49.49),
+             "A26": (54.91, -38.91, 30.77),
+             "A27": (43.96, 52.00, 30.01),
+             "A28": (82.74, 3.45, 81.29),
+             "A29": (52.79, 50.88, -12.72),
+             "A30": (50.87, -27.17, -29.46)}
 gt_obj_lev_graylist = ("A10", "A11", "A12", "A13", "A14", "A15", "A16", "A17",
                        "A18", "A19", "A19", "A20", "A21")
 
@@ -80,30 +95,30 @@ checker_data = {"cc24":
                             "F2": (90.47, 38.89),
                             "F3": (90.47, 62.44),
                             "F4": (90.47, 86.49)},
-                 "colors": {"A1": LabColor(37.54, 14.37, 14.92),
-                            "A2": LabColor(62.73, 35.83, 56.5),
-                            "A3": LabColor(28.37, 15.42, -49.8),
-                            "A4": LabColor(95.19, -1.03, 2.93),
-                            "B1": LabColor(64.66, 19.27, 17.5),
-                            "B2": LabColor(39.43, 10.75, -45.17),
-                            "B3": LabColor(54.38, -39.72, 32.27),
-                            "B4": LabColor(81.29, -0.57, 0.44),
-                            "C1": LabColor(49.32, -3.82, -22.54),
-                            "C2": LabColor(50.57, 48.64, 16.67),
-                            "C3": LabColor(42.43, 51.05, 28.62),
-                            "C4": LabColor(66.89, -0.75, -0.06),
-                            "D1": LabColor(43.46, -12.74, 22.72),
-                            "D2": LabColor(30.1, 22.54, -20.87),
-                            "D3": LabColor(81.8, 2.67, 80.41),
-                            "D4": LabColor(50.76, -0.13, 0.14),
-                            "E1": LabColor(54.94, 9.61, -24.79),
-                            "E2": LabColor(71.77, -24.13, 58.19),
-                            "E3": LabColor(50.63, 51.28, -14.12),
-                            "E4": LabColor(35.63, -0.46, -0.48),
-                            "F1": LabColor(70.48, -32.26, -0.37),
-                            "F2": LabColor(71.51, 18.24, 67.37),
-                            "F3": LabColor(49.57, -29.71, -28.32),
-                            "F4": LabColor(20.64, 0.07, -0.46)},
+                 "colors": {"A1": (37.54, 14.37, 14.92),
+                            "A2": (62.73, 35.83, 56.5),
+                            "A3": (28.37, 15.42, -49.8),
+                            "A4": (95.19, -1.03, 2.93),
+                            "B1": (64.66, 19.27, 17.5),
+                            "B2": (39.43, 10.75, -45.17),
+                            "B3": (54.38, -39.72, 32.27),
+                            "B4": (81.29, -0.57, 0.44),
+                            "C1": (49.32, -3.82, -22.54),
+                            "C2": (50.57, 48.64, 16.67),
+                            "C3": (42.43, 51.05, 28.62),
+                            "C4": (66.89, -0.75, -0.06),
+                            "D1": (43.46, -12.74, 22.72),
+                            "D2": (30.1, 22.54, -20.87),
+                            "D3": (81.8, 2.67, 80.41),
+                            "D4": (50.76, -0.13, 0.14),
+                            "E1": (54.94, 9.61, -24.79),
+                            "E2": (71.77, -24.13, 58.19),
+                            "E3": (50.63, 51.28, -14.12),
+                            "E4": (35.63, -0.46, -0.48),
+                            "F1": (70.48, -32.26, -0.37),
+                            "F2": (71.51, 18.24, 67.37),
+                            "F3": (49.57, -29.71, -28.32),
+                            "F4": (20.64, 0.07, -0.46)},
                  "graylist": ("A4", "B4", "C4", "D4", "E4", "F4"),
                  "patch_fraction": 0.13
                  },
@@ -120,18 +135,18 @@ checker_data = {"cc24":
                             "E4": (74.02, 75.00),
                             "F3": (90.47, 25.00),
                             "F4": (90.47, 75.00)},
-                 "colors": {"A3": LabColor(28.37, 15.42, -49.8),
-                            "A4": LabColor(95.19, -1.03, 2.93),
-                            "B3": LabColor(54.38, -39.72, 32.27),
-                            "B4": LabColor(81.29, -0.57, 0.44),
-                            "C3": LabColor(42.43, 51.05, 28.62),
-                            "C4": LabColor(66.89, -0.75, -0.06),
-                            "D3": LabColor(81.8, 2.67, 80.41),
-                            "D4": LabColor(50.76, -0.13, 0.14),
-                            "E3": LabColor(50.63, 51.28, -14.12),
-                            "E4": LabColor(35.63, -0.46, -0.48),
-                            "F3": LabColor(49.57, -29.71, -28.32),
-                            "F4": LabColor(20.64, 0.07, -0.46)},
+                 "colors": {"A3": (28.37, 15.42, -49.8),
+                            "A4": (95.19, -1.03, 2.93),
+                            "B3": (54.38, -39.72, 32.27),
+                            "B4": (81.29, -0.57, 0.44),
+                            "C3": (42.43, 51.05, 28.62),
+                            "C4": (66.89, -0.75, -0.06),
+                            "D3": (81.8, 2.67, 80.41),
+                            "D4": (50.76, -0.13, 0.14),
+                            "E3": (50.63, 51.28, -14.12),
+                            "E4": (35.63, -0.46, -0.48),
+                            "F3": (49.57, -29.71, -28.32),
+                            "F4": (20.64, 0.07, -0.46)},
                  "graylist": ("A4", "B4", "C4", "D4", "E4", "F4"),
                  "patch_fraction": 0.13
                  },
@@ -160,30 +175,30 @@ checker_data = {"cc24":
                             "F2": (86.8, 39.8),
                             "F3": (86.8, 59.6),
                             "F4": (86.8, 79.6)},
-                 "colors": {"A1": LabColor(37.54, 14.37, 14.92),
-                            "A2": LabColor(62.73, 35.83, 56.5),
-                            "A3": LabColor(28.37, 15.42, -49.8),
-                            "A4": LabColor(95.19, -1.03, 2.93),
-                            "B1": LabColor(64.66, 19.27, 17.5),
-                            "B2": LabColor(39.43, 10.75, -45.17),
-                            "B3": LabColor(54.38, -39.72, 32.27),
-                            "B4": LabColor(81.29, -0.57, 0.44),
-                            "C1": LabColor(49.32, -3.82, -22.54),
-                            "C2": LabColor(50.57, 48.64, 16.67),
-                            "C3": LabColor(42.43, 51.05, 28.62),
-                            "C4": LabColor(66.89, -0.75, -0.06),
-                            "D1": LabColor(43.46, -12.74, 22.72),
-                            "D2": LabColor(30.1, 22.54, -20.87),
-                            "D3": LabColor(81.8, 2.67, 80.41),
-                            "D4": LabColor(50.76, -0.13, 0.14),
-                            "E1": LabColor(54.94, 9.61, -24.79),
-                            "E2": LabColor(71.77, -24.13, 58.19),
-                            "E3": LabColor(50.63, 51.28, -14.12),
-                            "E4": LabColor(35.63, -0.46, -0.48),
-                            "F1": LabColor(70.48, -32.26, -0.37),
-                            "F2": LabColor(71.51, 18.24, 67.37),
-                            "F3": LabColor(49.57, -29.71, -28.32),
-                            "F4": LabColor(20.64, 0.07, -0.46)},
+                 "colors": {"A1": (37.54, 14.37, 14.92),
+                            "A2": (62.73, 35.83, 56.5),
+                            "A3": (28.37, 15.42, -49.8),
+                            "A4": (95.19, -1.03, 2.93),
+                            "B1": (64.66, 19.27, 17.5),
+                            "B2": (39.43, 10.75, -45.17),
+                            "B3": (54.38, -39.72, 32.27),
+                            "B4": (81.29, -0.57, 0.44),
+                            "C1": (49.32, -3.82, -22.54),
+                            "C2": (50.57, 48.64, 16.67),
+                            "C3": (42.43, 51.05, 28.62),
+                            "C4": (66.89, -0.75, -0.06),
+                            "D1": (43.46, -12.74, 22.72),
+                            "D2": (30.1, 22.54, -20.87),
+                            "D3": (81.8, 2.67, 80.41),
+                            "D4": (50.76, -0.13, 0.14),
+                            "E1": (54.94, 9.61, -24.79),
+                            "E2": (71.77, -24.13, 58.19),
+                            "E3": (50.63, 51.28, -14.12),
+                            "E4": (35.63, -0.46, -0.48),
+                            "F1": (70.48, -32.26, -0.37),
+                            "F2": (71.51, 18.24, 67.37),
+                            "F3": (49.57, -29.71, -28.32),
+                            "F4": (20.64, 0.07, -0.46)},
                  "graylist": ("A4", "B4", "C4", "D4", "E4", "F4"),
                  "patch_fraction": 0.07
                  },
@@ -200,18 +215,18 @@ checker_data = {"cc24":
                             "E4": (72.3, 74.0),
                             "F3": (86.8, 24.0),
                             "F4": (86.8, 74.0)},
-                 "colors": {"A3": LabColor(28.37, 15.42, -49.8),
-                            "A4": LabColor(95.19, -1.03, 2.93),
-                            "B3": LabColor(54.38, -39.72, 32.27),
-                            "B4": LabColor(81.29, -0.57, 0.44),
-                            "C3": LabColor(42.43, 51.05, 28.62),
-                            "C4": LabColor(66.89, -0.75, -0.06),
-                            "D3": LabColor(81.8, 2.67, 80.41),
-                            "D4": LabColor(50.76, -0.13, 0.14),
-                            "E3": LabColor(50.63, 51.28, -14.12),
-                            "E4": LabColor(35.63, -0.46, -0.48),
-                            "F3": LabColor(49.57, -29.71, -28.32),
-                            "F4": LabColor(20.64, 0.07, -0.46)},
+                 "colors": {"A3": (28.37, 15.42, -49.8),
+                            "A4": (95.19, -1.03, 2.93),
+                            "B3": (54.38, -39.72, 32.27),
+                            "B4": (81.29, -0.57, 0.44),
+                            "C3": (42.43, 51.05, 28.62),
+                            "C4": (66.89, -0.75, -0.06),
+                            "D3": (81.8, 2.67, 80.41),
+                            "D4": (50.76, -0.13, 0.14),
+                            "E3": (50.63, 51.28, -14.12),
+                            "E4": (35.63, -0.46, -0.48),
+                            "F3": (49.57, -29.71, -28.32),
+                            "F4": (20.64, 0.07, -0.46)},
                  "graylist": ("A4", "B4", "C4", "D4", "E4", "F4"),
                  "patch_fraction": 0.07
                  },
@@ -246,36 +261,36 @@ checker_data = {"cc24":
                             "A28": (58.7, 71.2),
                             "A29": (63.0, 71.2),
                             "A30": (66.8, 71.2)},
-                 "colors": {"A01": LabColor(39.12, 13.24, 15.07),
-                            "A02": LabColor(65.43, 18.11, 18.72),
-                            "A03": LabColor(49.87, -4.34, -22.29),
-                            "A04": LabColor(44.26, -13.80, 22.85),
-                            "A05": LabColor(55.56, 9.82, -24.49),
-                            "A06": LabColor(70.82, -33.43, -0.35),
-                            "A07": LabColor(63.51, 34.26, 59.60),
-                            "A08": LabColor(39.92, 11.81, -46.07),
-                            "A09": LabColor(52.24, 48.55, 18.51),
-                            "A10": LabColor(97.06, -0.40, 1.13),
-                            "A11": LabColor(92.02, -0.60, 0.23),
-                            "A12": LabColor(83.34, -0.75, 0.21),
-                            "A13": LabColor(82.14, -1.06, 0.43),
-                            "A14": LabColor(72.06, -1.19, 0.28),
-                            "A15": LabColor(62.15, -1.07, 0.19),
-                            "A16": LabColor(49.25, -0.16, 0.01),
-                            "A17": LabColor(38.62, -0.18, -0.04),
-                            "A18": LabColor(28.86, 0.54, 0.60),
-                            "A19": LabColor(16.19, -0.05, 0.73),
-                            "A20": LabColor(8.29, -0.81, 0.19),
-                            "A21": LabColor(3.44, -0.23, 0.49),
-                            "A22": LabColor(31.41, 20.98, -19.43),
-                            "A23": LabColor(72.46, -24.45, 55.93),
-                            "A24": LabColor(72.95, 16.83, 68.80),
-                            "A25": LabColor(29.37, 13.06, -49.49),
-                            "A26": LabColor(54.91, -38.91, 30.77),
-                            "A27": LabColor(43.96, 52.00, 30.01),
-                            "A28": LabColor(82.74, 3.45, 81.29),
-                            "A29": LabColor(52.79, 50.88, -12.72),
-                            "A30": LabColor(50.87, -27.17, -29.46)},
+                 "colors": {"A01": (39.12, 13.24, 15.07),
+                            "A02": (65.43, 18.11, 18.72),
+                            "A03": (49.87, -4.34, -22.29),
+                            "A04": (44.26, -13.80, 22.85),
+                            "A05": (55.56, 9.82, -24.49),
+                            "A06": (70.82, -33.43, -0.35),
+                            "A07": (63.51, 34.26, 59.60),
+                            "A08": (39.92, 11.81, -46.07),
+                            "A09": (52.24, 48.55, 18.51),
+                            "A10": (97.06, -0.40, 1.13),
+                            "A11": (92.02, -0.60, 0.23),
+                            "A12": (83.34, -0.75, 0.21),
+                            "A13": (82.14, -1.06, 0.43),
+                            "A14": (72.06, -1.19, 0.28),
+                            "A15": (62.15, -1.07, 0.19),
+                            "A16": (49.25, -0.16, 0.01),
+                            "A17": (38.62, -0.18, -0.04),
+                            "A18": (28.86, 0.54, 0.60),
+                            "A19": (16.19, -0.05, 0.73),
+                            "A20": (8.29, -0.81, 0.19),
+                            "A21": (3.44, -0.23, 0.49),
+                            "A22": (31.41, 20.98, -19.43),
+                            "A23": (72.46, -24.45, 55.93),
+                            "A24": (72.95, 16.83, 68.80),
+                            "A25": (29.37, 13.06, -49.49),
+                            "A26": (54.91, -38.91, 30.77),
+                            "A27": (43.96, 52.00, 30.01),
+                            "A28": (82.74, 3.45, 81.29),
+                            "A29": (52.79, 50.88, -12.72),
+                            "A30": (50.87, -27.17, -29.46)},
                  "graylist": gt_obj_lev_graylist,
                  "patch_fraction": 0.026
                  },
@@ -310,36 +325,36 @@ checker_data = {"cc24":
                             'A28': (89.7, 39.7),
                             'A29': (92.5, 39.7),
                             'A30': (95.2, 39.7)},
-                 "colors": {"A01": LabColor(38.76, 13.81, 14.69),
-                            "A02": LabColor(65.15, 19.21, 17.92),
-                            "A03": LabColor(49.61, -4.20, -21.33),
-                            "A04": LabColor(43.54, -12.89, 22.66),
-                            "A05": LabColor(55.52, 8.78, -24.31),
-                            "A06": LabColor(70.42, -32.39, -0.48),
-                            "A07": LabColor(63.13, 35.43, 57.84),
-                            "A08": LabColor(40.08, 10.25, -44.77),
-                            "A09": LabColor(51.75, 47.36, 16.93),
-                            "A10": LabColor(95.34, -0.90, 1.90),
-                            "A11": LabColor(92.09, -0.92, 1.46),
-                            "A12": LabColor(86.92, -1.12, 0.97),
-                            "A13": LabColor(82.37, -1.12, 0.56),
-                            "A14": LabColor(72.17, -1.05, -0.04),
-                            "A15": LabColor(62.32, -1.1, -0.01),
-                            "A16": LabColor(49.61, -1.29, -0.1),
-                            "A17": LabColor(38.89, -0.23, -0.48),
-                            "A18": LabColor(28.6, -1.09, 0.07),
-                            "A19": LabColor(17.97, 0.04, 0.09),
-                            "A20": LabColor(9.50, 0.45, 0.25),
-                            "A21": LabColor(4.33, 0.32, -0.47),
-                            "A22": LabColor(30.32, 22.13, -19.02),
-                            "A23": LabColor(72.5, -22.92, 56.08),
-                            "A24": LabColor(72.10, 19.51, 67.85),
-                            "A25": LabColor(29.51, 13.42, -47.69),
-                            "A26": LabColor(55.60, -38.46, 32.19),
-                            "A27": LabColor(43.48, 50.74, 29.13),
-                            "A28": LabColor(82.02, 3.28, 78.75),
-                            "A29": LabColor(52.85, 49.90, -12.86),
-                            "A30": LabColor(50.86, -27.78, -27.68)},
+                 "colors": {"A01": (38.76, 13.81, 14.69),
+                            "A02": (65.15, 19.21, 17.92),
+                            "A03": (49.61, -4.20, -21.33),
+                            "A04": (43.54, -12.89, 22.66),
+                            "A05": (55.52, 8.78, -24.31),
+                            "A06": (70.42, -32.39, -0.48),
+                            "A07": (63.13, 35.43, 57.84),
+                            "A08": (40.08, 10.25, -44.77),
+                            "A09": (51.75, 47.36, 16.93),
+                            "A10": (95.34, -0.90, 1.90),
+                            "A11": (92.09, -0.92, 1.46),
+                            "A12": (86.92, -1.12, 0.97),
+                            "A13": (82.37, -1.12, 0.56),
+                            "A14": (72.17, -1.05, -0.04),
+                            "A15": (62.32, -1.1, -0.01),
+                            "A16": (49.61, -1.29, -0.1),
+                            "A17": (38.89, -0.23, -0.48),
+                            "A18": (28.6, -1.09, 0.07),
+                            "A19": (17.97, 0.04, 0.09),
+                            "A20": (9.50, 0.45, 0.25),
+                            "A21": (4.33, 0.32, -0.47),
+                            "A22": (30.32, 22.13, -19.02),
+                            "A23": (72.5, -22.92, 56.08),
+                            "A24": (72.10, 19.51, 67.85),
+                            "A25": (29.51, 13.42, -47.69),
+                            "A26": (55.60, -38.46, 32.19),
+                            "A27": (43.48, 50.74, 29.13),
+                            "A28": (82.02, 3.28, 78.75),
+                            "A29": (52.85, 49.90, -12.86),
+                            "A30": (50.86, -27.78, -27.68)},
                  "graylist": gt_obj_lev_graylist,
                  "patch_fraction": 0.026
                  },
@@ -374,36 +389,36 @@ checker_data = {"cc24":
                             "A28": (89.6, 37.00),
                             "A29": (92.3, 37.00),
                             "A30": (95.0, 37.00)},
-                 "colors": {"A01": LabColor(38.76, 13.81, 14.69),
-                            "A02": LabColor(65.15, 19.21, 17.92),
-                            "A03": LabColor(49.61, -4.20, -21.33),
-                            "A04": LabColor(43.54, -12.89, 22.66),
-                            "A05": LabColor(55.52, 8.78, -24.31),
-                            "A06": LabColor(70.42, -32.39, -0.48),
-                            "A07": LabColor(63.13, 35.43, 57.84),
-                            "A08": LabColor(40.08, 10.25, -44.77),
-                            "A09": LabColor(51.75, 47.36, 16.93),
-                            "A10": LabColor(95.34, -0.90, 1.90),
-                            "A11": LabColor(92.09, -0.92, 1.46),
-                            "A12": LabColor(86.92, -1.12, 0.97),
-                            "A13": LabColor(82.37, -1.12, 0.56),
-                            "A14": LabColor(72.17, -1.05, -0.04),
-                            "A15": LabColor(62.32, -1.1, -0.01),
-                            "A16": LabColor(49.61, -1.29, -0.1),
-                            "A17": LabColor(38.89, -0.23, -0.48),
-                            "A18": LabColor(28.6, -1.09, 0.07),
-                            "A19": LabColor(17.97, 0.04, 0.09),
-                            "A20": LabColor(9.50, 0.45, 0.25),
-                            "A21": LabColor(4.33, 0.32, -0.47),
-                            "A22": LabColor(30.32, 22.13, -19.02),
-                            "A23": LabColor(72.5, -22.92, 56.08),
-                            "A24": LabColor(72.10, 19.51, 67.85),
-                            "A25": LabColor(29.51, 13.42, -47.69),
-                            "A26": LabColor(55.60, -38.46, 32.19),
-                            "A27": LabColor(43.48, 50.74, 29.13),
-                            "A28": LabColor(82.02, 3.28, 78.75),
-                            "A29": LabColor(52.85, 49.90, -12.86),
-                            "A30": LabColor(50.86, -27.78, -27.68)},
+                 "colors": {"A01": (38.76, 13.81, 14.69),
+                            "A02": (65.15, 19.21, 17.92),
+                            "A03": (49.61, -4.20, -21.33),
+                            "A04": (43.54, -12.89, 22.66),
+                            "A05": (55.52, 8.78, -24.31),
+                            "A06": (70.42, -32.39, -0.48),
+                            "A07": (63.13, 35.43, 57.84),
+                            "A08": (40.08, 10.25, -44.77),
+                            "A09": (51.75, 47.36, 16.93),
+                            "A10": (95.34, -0.90, 1.90),
+                            "A11": (92.09, -0.92, 1.46),
+                            "A12": (86.92, -1.12, 0.97),
+                            "A13": (82.37, -1.12, 0.56),
+                            "A14": (72.17, -1.05, -0.04),
+                            "A15": (62.32, -1.1, -0.01),
+                            "A16": (49.61, -1.29, -0.1),
+                            "A17": (38.89, -0.23, -0.48),
+                            "A18": (28.6, -1.09, 0.07),
+                            "A19": (17.97, 0.04, 0.09),
+                            "A20": (9.50, 0.45, 0.25),
+                            "A21": (4.33, 0.32, -0.47),
+                            "A22": (30.32, 22.13, -19.02),
+                            "A23": (72.5, -22.92, 56.08),
+                            "A24": (72.10, 19.51, 67.85),
+                            "A25": (29.51, 13.42, -47.69),
+                            "A26": (55.60, -38.46, 32.19),
+                            "A27": (43.48, 50.74, 29.13),
+                            "A28": (82.02, 3.28, 78.75),
+                            "A29": (52.85, 49.90, -12.86),
+                            "A30": (50.86, -27.78, -27.68)},
                  "graylist": gt_obj_lev_graylist,
                  "patch_fraction": 0.026
                  },
@@ -438,36 +453,36 @@ checker_data = {"cc24":
                             "A28": (89.9, 37.00),
                             "A29": (92.7, 37.00),
                             "A30": (95.3, 37.00)},
-                 "colors": {"A01": LabColor(39.12, 13.24, 15.07),
-                            "A02": LabColor(65.43, 18.11, 18.72),
-                            "A03": LabColor(49.87, -4.34, -22.29),
-                            "A04": LabColor(44.26, -13.80, 22.85),
-                            "A05": LabColor(55.56, 9.82, -24.49),
-                            "A06": LabColor(70.82, -33.43, -0.35),
-                            "A07": LabColor(63.51, 34.26, 59.60),
-                            "A08": LabColor(39.92, 11.81, -46.07),
-                            "A09": LabColor(52.24, 48.55, 18.51),
-                            "A10": LabColor(97.06, -0.40, 1.13),
-                            "A11": LabColor(92.02, -0.60, 0.23),
-                            "A12": LabColor(83.34, -0.75, 0.21),
-                            "A13": LabColor(82.14, -1.06, 0.43),
-                            "A14": LabColor(72.06, -1.19, 0.28),
-                            "A15": LabColor(62.15, -1.07, 0.19),
-                            "A16": LabColor(49.25, -0.16, 0.01),
-                            "A17": LabColor(38.62, -0.18, -0.04),
-                            "A18": LabColor(28.86, 0.54, 0.60),
-                            "A19": LabColor(16.19, -0.05, 0.73),
-                            "A20": LabColor(8.29, -0.81, 0.19),
-                            "A21": LabColor(3.44, -0.23, 0.49),
-                            "A22": LabColor(31.41, 20.98, -19.43),
-                            "A23": LabColor(72.46, -24.45, 55.93),
-                            "A24": LabColor(72.95, 16.83, 68.80),
-                            "A25": LabColor(29.37, 13.06, -49.49),
-                            "A26": LabColor(54.91, -38.91, 30.77),
-                            "A27": LabColor(43.96, 52.00, 30.01),
-                            "A28": LabColor(82.74, 3.45, 81.29),
-                            "A29": LabColor(52.79, 50.88, -12.72),
-                            "A30": LabColor(50.87, -27.17, -29.46)},
+                 "colors": {"A01": (39.12, 13.24, 15.07),
+                            "A02": (65.43, 18.11, 18.72),
+                            "A03": (49.87, -4.34, -22.29),
+                            "A04": (44.26, -13.80, 22.85),
+                            "A05": (55.56, 9.82, -24.49),
+                            "A06": (70.82, -33.43, -0.35),
+                            "A07": (63.51, 34.26, 59.60),
+                            "A08": (39.92, 11.81, -46.07),
+                            "A09": (52.24, 48.55, 18.51),
+                            "A10": (97.06, -0.40, 1.13),
+                            "A11": (92.02, -0.60, 0.23),
+                            "A12": (83.34, -0.75, 0.21),
+                            "A13": (82.14, -1.06, 0.43),
+                            "A14": (72.06, -1.19, 0.28),
+                            "A15": (62.15, -1.07, 0.19),
+                            "A16": (49.25, -0.16, 0.01),
+                            "A17": (38.62, -0.18, -0.04),
+                            "A18": (28.86, 0.54, 0.60),
+                            "A19": (16.19, -0.05, 0.73),
+                            "A20": (8.29, -0.81, 0.19),
+                            "A21": (3.44, -0.23, 0.49),
+                            "A22": (31.41, 20.98, -19.43),
+                            "A23": (72.46, -24.45, 55.93),
+                            "A24": (72.95, 16.83, 68.80),
+                            "A25": (29.37, 13.06, -49.49),
+                            "A26": (54.91, -38.91, 30.77),
+                            "A27": (43.96, 52.00, 30.01),
+                            "A28": (82.74, 3.45, 81.29),
+                            "A29": (52.79, 50.88, -12.72),
+                            "A30": (50.87, -27.17, -29.46)},
                  "graylist": gt_obj_lev_graylist,
                  "patch_fraction": 0.026
                  }
@@ -475,103 +490,291 @@ checker_data = {"cc24":
 
 text_extensions = ('.txt', '.csv')
 image_extensions = ('.png', '.jpg', '.tif')
+# Names of columns with patch name, L*, a* and b* in text files:
+# CSV header of d.p.c. export or CGATS data format. SAMPLE_ID of CGATS
+# is mostly number, it is patch name only when SAMPLE_NAME isn't
+TEXT_FIELDS = (("Patch", "SAMPLE_NAME", "SAMPLE_ID"),
+               ("L", "LAB_L"), ("a", "LAB_A"), ("b", "LAB_B"))
+# Targettype: of d.p.c. export and checkers it stands for, the first one
+# (checker of settings first) with all patches of capture is used; names
+# of checkers are recognized too
+TEXT_TARGETS = {"cc": ("cc24", "halfcc", "nanocc", "halfnanocc")}
+# Patches of text file scored by one deltaE call
+TEXT_BATCH_PATCHES = 4096
+# Seconds between scans of watched folder
+WATCH_INTERVAL = 0.1
+# Rotate checker to make sure we have it in proper orientation
+# With S - everythin is OK, with W bottom is on the left and we have
+# to rotate it 270 degrees, with N bottom is on top, etc.
+ORIENTATION_ROTATION = {'S': 0, 'W': 270, 'N': 180, 'E': 90}
+# With auto orientation warn when mean dE of two orientations differs
+# less than this
+ORIENTATION_MARGIN = 3.0
+# Finding of checker on uncropped capture: longer side of downsampled
+# copy, max dE 1976 of pixel from reference of its patch, smallest blob
+# of patch in pixels, largest blobs of every patch tried and number of
+# RANSAC samples
+LOCATE_SIZE = 1000
+LOCATE_TOLERANCE = 20
+LOCATE_MIN_AREA = 9
+LOCATE_CANDIDATES = 3
+LOCATE_ITERATIONS = 300
+# Part of pixels cut from both ends of every channel for trimmed mean
+# of probe
+PATCH_TRIM = 0.1
+# Flat field: blocks along longer side of image, L* difference from mean
+# drawn as full red (lighter) or blue (darker) and size of block
+# on heatmap in pixels
+FLAT_BLOCKS = 16
+FLAT_HEAT_RANGE = 2.0
+FLAT_HEAT_CELL = 64
+# Slanted edge SFR (ISO 12233) of GoldenThread targets: longer side of
+# copy searched for edges, size of searched tile in its pixels, min
+# coherence of gradients in tile (1 for single straight edge), slant of
+# edge in degrees, min contrast of edge (part of range of channel), max
+# deviation of rows from edge line in pixels, oversampling of edge
+# profile and number of edges
+SFR_CHECKERS = ("gtdl", "gt20", "gt10", "gt05")
+SFR_SEARCH_SIZE = 1000
+SFR_TILE = 24
+SFR_COHERENCE = 0.9
+SFR_ANGLES = (2.0, 20.0)
+SFR_MIN_CONTRAST = 0.2
+SFR_MAX_RESIDUAL = 0.5
+SFR_OVERSAMPLING = 4
+SFR_EDGES = 20
+# Fonts for proof image, first found is used
+PROOF_FONTS = ("consola.ttf", "Consolas.ttf", "DejaVuSansMono.ttf")
+# Max dE between reduced decode and full resolution before warning, when
+# it is checked by --compare-sampling without --reduced-tolerance
+REDUCED_TOLERANCE = 0.5
+# TIFF compression tags of deflate (zlib) streams
+TIFF_DEFLATE = (8, 32946)
+# Size of compressed block read from TIFF strip at once
+TIFF_READ_BLOCK = 256 * 1024
+# Names of TIFF compressions and Photoshop color modes as printed by exiftool
+TIFF_COMPRESSIONS = {1: "Uncompressed", 5: "LZW", 6: "JPEG (old-style)",
+                     7: "JPEG", 8: "Adobe Deflate", 32773: "PackBits",
+                     32946: "Deflate", 34712: "JPEG 2000"}
+PS_COLOR_MODES = {"0": "Bitmap", "1": "Grayscale", "2": "Indexed",
+                  "3": "RGB", "4": "CMYK", "7": "Multichannel",
+                  "8": "Duotone", "9": "Lab"}
+
+# Tags read by exiftool, in order of Edata fields (Compression is not used)
+EXIF_TAGS = ("Filename", "FileType", "Creator", "ColorMode", "XResolution",
+             "Make", "Model", "SerialNumber", "Lens", "ProfileDescription",
+             "BitsPerSample", "ShutterSpeed", "Aperture", "ISO", "Compression")
+Edata = namedtuple('Edata',
+                   ['filename', 'filetype', 'creator', 'colormode',
+                    'resolution', 'make', 'model', 'serialnumber',
+                    'lens', 'profile', 'bps',
+                    'shutter', 'aperture', 'iso'])
+
+# Data of checker compiled by get_checker_spec
+CheckerSpec = namedtuple('CheckerSpec',
+                         ['name', 'patches', 'reference', 'centres',
+                          'gray_mask', 'patch_fraction'])
+
+# Options of analysis made by get_settings, passed to every step
+Settings = namedtuple('Settings',
+                      ['spec', 'rotation', 'deltae', 'reference',
+                       'sampler', 'compare_sampling', 'reduced_decode',
+                       'reduced_tolerance', 'proof_size', 'metadata',
+                       'write_report', 'cache', 'cache_size', 'locate',
+                       'flat_field', 'trace', 'export'])
+
+# Results of analyze_text and analyze_image
+TextResult = namedtuple('TextResult',
+                        ['filename', 'capture', 'target', 'deltae',
+                         'patches', 'de', 'checker'])
+ImageResult = namedtuple('ImageResult',
+                         ['filename', 'deltae', 'tone', 'white_balance',
+                          'lightness_uniformity', 'color_accuracy',
+                          'patches', 'exif', 'report', 'rotation',
+                          'noise', 'sharpness'])
+# Slanted edges of image: medians of edges (SFR in cycles per pixel,
+# sharpening as max of SFR up to Nyquist), max misregistration of color
+# channels in pixels (NaN without edges) and edges (x, y, slant, SFR50,
+# SFR10, max SFR, shift of R and B channel from G across edge)
+Sharpness = namedtuple('Sharpness',
+                       ['sfr50', 'sfr10', 'sharpening', 'misregistration',
+                        'edges'])
+FlatFieldResult = namedtuple('FlatFieldResult',
+                             ['filename', 'lightness', 'mean', 'deviation',
+                              'non_uniformity', 'exif', 'report'])
+
+
+class CheckerNotFound(ValueError):
+    """Checker wasn't found on uncropped capture or isn't whole in it"""
+
 
+# exiftool -stay_open process, started with first file
+exiftool_session = None
+exiftool_lock = threading.Lock()
 
-class Patch:
-    """Class to store values related to patch."""
-    def __init__(self,
-                 ll=None, la=None, lb=None,
-                 rr=None, rg=None, rb=None,
-                 px=None, py=None, ps=None,
-                 de=None):
-        self.ll = ll
-        self.la = la
-        self.lb = lb
-        self.rr = rr
-        self.rg = rg
-        self.rb = rb
-        self.px = px
-        self.py = py
-        self.ps = ps
-        self.de = de
-
-    @property
-    def x(self):
-        """X coordinate of upper left corner."""
-        return self.px
-
-    @property
-    def y(self):
-        """Y coordinate of upper left corner."""
-        return self.py
-
-    @property
-    def l(self):
-        """L of Lab"""
-        return self.ll
-
-    @property
-    def a(self):
-        """a of Lab"""
-        return self.la
-
-    @property
-    def b(self):
-        """b of Lab"""
-        return self.lb
-
-    @property
-    def rgb_r(self):
-        """R of RGB"""
-        return self.rr
-
-    @property
-    def rgb_g(self):
-        """G of RGB"""
-        return self.rg
-
-    @property
-    def rgb_b(self):
-        """B of RGB"""
-        return self.rb
-
-    @property
-    def d(self):
-        """dE value for patch"""
-        return self.de
-
-    @property
-    def size(self):
-        """Size of probe"""
-        return self.ps
+# Cache of results of images, opened with first file
+CACHE_FILE = os.path.join(os.environ.get("XDG_CACHE_HOME",
+                                         os.path.expanduser("~/.cache")),
+                          "deltae", "results.sqlite")
+# Size of block read to get hash of file
+CACHE_READ_BLOCK = 1024 * 1024
+result_cache = None
+result_cache_lock = threading.Lock()
+
+# Tracing of stages (--trace or DELTAE_TRACE=1): trace of file is written
+# to {file}.trace.json, summary of batch to deltae_trace.json in common
+# directory of files
+TRACE_ENV = "DELTAE_TRACE"
+TRACE_SUFFIX = ".trace.json"
+TRACE_SUMMARY = "deltae_trace.json"
+# Files written next to tested image ({fname}.txt, {fname}_de.jpg and
+# {fname}.trace.json), they aren't tested in directories and globs
+REPORT_SUFFIXES = (tuple(f"{ext}.txt" for ext in image_extensions)
+                   + ("_de.jpg", "_ff.jpg", TRACE_SUFFIX))
+# Trace of file analyzed in this thread (context), None when tracing
+# is off, so files analyzed in threads don't mix their stages
+current_trace = contextvars.ContextVar("current_trace", default=None)
+NO_STAGE = nullcontext()
+
+# Values of patch in results: Lab, RGB (0-1 scale), probe in S orientation
+# (in orientation of file for located checker), dE, Lab of trimmed mean,
+# standard deviation of L* and clipped pixels of channels (NaN and -1
+# for magick sampler), one record per patch, results of images can be
+# concatenated
+PATCH_DTYPE = numpy.dtype([("patch", "U4"),
+                           ("L", float), ("a", float), ("b", float),
+                           ("R", float), ("G", float), ("B", float),
+                           ("x", numpy.int32), ("y", numpy.int32),
+                           ("size", numpy.int32), ("dE", float),
+                           ("L_trim", float), ("a_trim", float),
+                           ("b_trim", float), ("L_std", float),
+                           ("clip_R", numpy.int32), ("clip_G", numpy.int32),
+                           ("clip_B", numpy.int32)])
+
+# Columnar export (--export DIR): rows of captures and patches appended
+# to captures.csv and patches.csv, with pyarrow also to Parquet file of
+# every run in captures/ and patches/ (dataset of all runs), columns and
+# their Arrow types
+EXPORT_CAPTURE_FIELDS = (
+    ("file", "string"), ("capture", "string"), ("checker", "string"),
+    ("formula", "string"), ("analyzed", "string"),
+    *((field, "string") for field in Edata._fields[1:]),
+    ("deltae", "double"), ("tone", "double"), ("white_balance", "double"),
+    ("lightness_uniformity", "double"), ("color_accuracy", "double"),
+    ("noise", "double"), ("sfr50", "double"), ("sfr10", "double"),
+    ("sharpening", "double"), ("misregistration", "double"),
+    ("edges", "int64"), ("rotation", "int64"),
+    *((f"stars_{field}", "int64") for field in (
+        "deltae", "filetype", "bit_depth", "profile", "color_mode", "tone",
+        "white_balance", "lightness_uniformity", "color_accuracy", "noise",
+        "sfr10", "sharpening", "misregistration")))
+EXPORT_PATCH_FIELDS = (
+    ("file", "string"), ("capture", "string"),
+    *((field, {"U": "string", "f": "double", "i": "int64"}[
+        PATCH_DTYPE[field].kind]) for field in PATCH_DTYPE.names))
+# Captures buffered before rows are appended to files
+EXPORT_CHUNK = 256
 
 
 # Coordinates of middle of color square.
 # Values in percents of whole dimension - based on
 # mini cc cropped to corner markings
-def load_checker_data(checker_name="cc24") -> tuple:
-    """Load checker data
+@lru_cache(maxsize=None)
+def get_checker_spec(checker_name="cc24") -> NamedTuple:
+    """Compile data of checker into arrays, once for every checker
     :param checker_name: name of checker to get data for
     :type checker_name: str
-    :return: return data related to checker:
-             color and patch coords, patch fraction size
-    :rtype: tuple
+    :return: names of patches, reference Lab (N, 3) and middle of
+             patches (N, 2) in order of names, mask of gray patches
+             and patch fraction size, arrays are read only
+    :rtype: CheckerSpec
+    """
+    check_data = checker_data[checker_name]
+    patches = tuple(check_data["coords"])
+
+    reference = numpy.array([check_data["colors"][pname]
+                             for pname in patches], dtype=float)
+    centres = numpy.array([check_data["coords"][pname]
+                           for pname in patches], dtype=float)
+    # Gray patches in order of patches, selects them from arrays of
+    # all patches
+    gray_mask = numpy.isin(patches, check_data["graylist"])
+
+    for array in (reference, centres, gray_mask):
+        array.flags.writeable = False
+
+    return CheckerSpec(checker_name, patches, reference, centres,
+                       gray_mask, check_data["patch_fraction"])
 
-    Should be class?
+
+@lru_cache(maxsize=64)
+def get_checker_boxes(checker_name, src_width, src_height,
+                      rotation) -> tuple:
+    """Get sampling squares of all patches of checker and map them
+    into pixels of file in its own orientation, cached for files of
+    the same size
+    :param checker_name: name of checker
+    :type checker_name: str
+    :param src_width: width of image file
+    :type src_width: int
+    :param src_height: height of image file
+    :type src_height: int
+    :param rotation: rotation of file to S orientation (0, 90, 180, 270)
+    :type rotation: int
+    :return: (x, y, side) of probes in S orientation (N, 3) and
+             boxes (left, top, right, bottom) in file (N, 4),
+             in order of patches of checker
+    :rtype: numpy.ndarray, numpy.ndarray
     """
+    spec = get_checker_spec(checker_name)
+
+    # Checker coordinates are for S orientation, W (270) and E (90)
+    # have swapped dimensions
+    if rotation in (270, 90):
+        cc_width, cc_height = src_height, src_width
+    else:
+        cc_width, cc_height = src_width, src_height
+
+    # Calculate size of square to get color depending on size of
+    # checker image bigger is better because we need more precise
+    # approximation. Also bigger is more risk to not fit into
+    # real square.
+    patch_size = min(round(cc_width * spec.patch_fraction / 2), 25)
+    # Create coords for extraction from middle of the patches
+    p_x = numpy.round(cc_width * spec.centres[:, 0] / 100 - patch_size)
+    p_y = numpy.round(cc_height * spec.centres[:, 1] / 100 - patch_size)
+    probes = numpy.column_stack(
+        (p_x, p_y, numpy.full_like(p_x, patch_size * 2))).astype(int)
+
+    # Same clipping to image area as in magick -crop
+    left = numpy.maximum(probes[:, 0], 0)
+    top = numpy.maximum(probes[:, 1], 0)
+    right = numpy.minimum(probes[:, 0] + probes[:, 2], cc_width)
+    bottom = numpy.minimum(probes[:, 1] + probes[:, 2], cc_height)
 
-    check_colors = checker_data[checker_name]["colors"]
-    check_coords = checker_data[checker_name]["coords"]
-    check_gray = checker_data[checker_name]["graylist"]
-    check_fraction = checker_data[checker_name]["patch_fraction"]
+    # File is rotated clockwise by rotation to get S orientation,
+    # go back from S to pixels of file
+    source_boxes = {0: (left, top, right, bottom),
+                    90: (top, src_height - right,
+                         bottom, src_height - left),
+                    180: (src_width - right, src_height - bottom,
+                          src_width - left, src_height - top),
+                    270: (src_width - bottom, left,
+                          src_width - top, right)}
+    boxes = numpy.column_stack(source_boxes[rotation])
 
-    return check_colors, check_coords, check_gray, check_fraction
+    probes.flags.writeable = False
+    boxes.flags.writeable = False
 
+    return probes, boxes
 
-def process_color_data(data_file) -> dict:
+
+def process_color_data(data_file, spec: CheckerSpec) -> dict:
     """Create dict with fields and values in Lab
     :param data_file: name of file with data, no validation though
     :type data_file: str
+    :param spec: checker with official values used without file
+    :type spec: CheckerSpec
     :return: dict with key: field name, value: lab values
     :rtype: dict
     """
@@ -584,533 +787,3874 @@ def process_color_data(data_file) -> dict:
                 cc_vals[field] = LabColor(Lab_L, Lab_a, Lab_b)
     except TypeError:
         # When file not given use official values from x-rite
-        cc_vals = cc_colors.copy()
+        cc_vals = {pname: LabColor(*lab) for pname, lab
+                   in zip(spec.patches, spec.reference.tolist())}
 
     return cc_vals
 
 
-def delta_e_calc(color1, color2) -> float:
-    """Return values of deltaE depending on CLI option.
+def delta_e_calc(color1, color2, formula="2k") -> float:
+    """Return values of deltaE depending on formula.
     Available options are 2k (dE 2000) and 76 (dE 1976)
     :param color1: first color
-    :type color1: iterable
+    :type color1: LabColor
     :param color2: second color
-    :type color2: iterable
+    :type color2: LabColor
+    :param formula: 2k or 76
+    :type formula: str
     :return: calculated deltaE value
     :rtype: float
     """
-    calculated_delta_e = "100.0"
+    return float(delta_e_calc_array(lab_array([color1]),
+                                    lab_array([color2]), formula)[0])
+
+
+def delta_e_calc_array(lab1, lab2, formula="2k") -> numpy.ndarray:
+    """Return values of deltaE for all pairs of colors depending on
+    formula. Available options are 2k (dE 2000) and 76 (dE 1976)
+    :param lab1: first colors
+    :type lab1: numpy.ndarray (N, 3)
+    :param lab2: second colors
+    :type lab2: numpy.ndarray (N, 3)
+    :param formula: 2k or 76
+    :type formula: str
+    :return: calculated deltaE values
+    :rtype: numpy.ndarray (N,)
+    """
+    calculated_delta_e = numpy.full(len(lab1), 100.0)
 
-    if args.deltae == "2k":
-        calculated_delta_e = delta_e_cie2000(color1, color2)
-    elif args.deltae == "76":
-        calculated_delta_e = delta_e_cie1976(color1, color2)
+    with trace_stage("deltae"):
+        if formula == "2k":
+            calculated_delta_e = delta_e_cie2000_array(lab1, lab2)
+        elif formula == "76":
+            calculated_delta_e = delta_e_cie1976_array(lab1, lab2)
 
     return calculated_delta_e
 
 
-def calculate_from_text(fname: str):
-    """Calculate deltae from text file in deltae.picturae format.
+def lab_array(colors) -> numpy.ndarray:
+    """Stack Lab colors into array
+    :param colors: colors
+    :type colors: iterable of LabColor
+    :return: L, a, b values in rows
+    :rtype: numpy.ndarray (N, 3)
+    """
+    return numpy.array([color.get_value_tuple() for color in colors],
+                       dtype=float).reshape(-1, 3)
+
+
+def delta_e_cie1976_array(lab1, lab2) -> numpy.ndarray:
+    """Calculate deltaE 1976 for pairs of colors in rows of arrays.
+    :param lab1: first colors
+    :type lab1: numpy.ndarray (N, 3)
+    :param lab2: second colors
+    :type lab2: numpy.ndarray (N, 3)
+    :return: deltaE values
+    :rtype: numpy.ndarray (N,)
+    """
+    return numpy.sqrt(numpy.sum(numpy.power(lab1 - lab2, 2), axis=-1))
+
+
+def delta_e_cie2000_array(lab1, lab2) -> numpy.ndarray:
+    """Calculate deltaE 2000 for pairs of colors in rows of arrays.
+    :param lab1: first colors
+    :type lab1: numpy.ndarray (N, 3)
+    :param lab2: second colors
+    :type lab2: numpy.ndarray (N, 3)
+    :return: deltaE values
+    :rtype: numpy.ndarray (N,)
+
+    Same steps as colormath2.color_diff_matrix.delta_e_cie2000 (also
+    hue averaging) but both arguments are arrays, so values are the same.
+    """
+    L1, a1, b1 = numpy.moveaxis(numpy.asarray(lab1, dtype=float), -1, 0)
+    L2, a2, b2 = numpy.moveaxis(numpy.asarray(lab2, dtype=float), -1, 0)
+
+    avg_Lp = (L1 + L2) / 2.0
+
+    C1 = numpy.hypot(a1, b1)
+    C2 = numpy.hypot(a2, b2)
+
+    avg_C1_C2_7 = numpy.power((C1 + C2) / 2.0, 7.0)
+    G = 0.5 * (1 - numpy.sqrt(avg_C1_C2_7
+                              / (avg_C1_C2_7 + numpy.power(25.0, 7.0))))
+
+    a1p = (1.0 + G) * a1
+    a2p = (1.0 + G) * a2
+
+    C1p = numpy.hypot(a1p, b1)
+    C2p = numpy.hypot(a2p, b2)
+
+    avg_C1p_C2p = (C1p + C2p) / 2.0
+
+    h1p = numpy.degrees(numpy.arctan2(b1, a1p))
+    h1p += (h1p < 0) * 360
+
+    h2p = numpy.degrees(numpy.arctan2(b2, a2p))
+    h2p += (h2p < 0) * 360
+
+    avg_Hp = (((numpy.fabs(h1p - h2p) > 180) * 360) + h1p + h2p) / 2.0
+
+    T = (1
+         - 0.17 * numpy.cos(numpy.radians(avg_Hp - 30))
+         + 0.24 * numpy.cos(numpy.radians(2 * avg_Hp))
+         + 0.32 * numpy.cos(numpy.radians(3 * avg_Hp + 6))
+         - 0.2 * numpy.cos(numpy.radians(4 * avg_Hp - 63)))
+
+    diff_h2p_h1p = h2p - h1p
+    delta_hp = diff_h2p_h1p + (numpy.fabs(diff_h2p_h1p) > 180) * 360
+    delta_hp -= (h2p > h1p) * 720
+
+    delta_Lp = L2 - L1
+    delta_Cp = C2p - C1p
+    delta_Hp = (2 * numpy.sqrt(C2p * C1p)
+                * numpy.sin(numpy.radians(delta_hp) / 2.0))
+
+    S_L = 1 + ((0.015 * numpy.power(avg_Lp - 50, 2))
+               / numpy.sqrt(20 + numpy.power(avg_Lp - 50, 2.0)))
+    S_C = 1 + 0.045 * avg_C1p_C2p
+    S_H = 1 + 0.015 * avg_C1p_C2p * T
+
+    delta_ro = 30 * numpy.exp(-(numpy.power(((avg_Hp - 275) / 25), 2.0)))
+    avg_C1p_C2p_7 = numpy.power(avg_C1p_C2p, 7.0)
+    R_C = numpy.sqrt(avg_C1p_C2p_7 / (avg_C1p_C2p_7 + numpy.power(25.0, 7.0)))
+    R_T = -2 * R_C * numpy.sin(2 * numpy.radians(delta_ro))
+
+    return numpy.sqrt(numpy.power(delta_Lp / S_L, 2)
+                      + numpy.power(delta_Cp / S_C, 2)
+                      + numpy.power(delta_Hp / S_H, 2)
+                      + R_T * (delta_Cp / S_C) * (delta_Hp / S_H))
+
+
+def get_settings(checker="cc24", orientation="S", deltae="2k",
+                 reference=None, sampler="pillow", compare_sampling=False,
+                 reduced_decode=False, reduced_tolerance=None,
+                 proof_size=3000, metadata="session",
+                 write_report=True, cache=None,
+                 cache_size=256, locate=False,
+                 flat_field=False, trace=False,
+                 export=None) -> NamedTuple:
+    """Collect options of analysis, same as options of CLI
+    :param checker: name of checker (key of checker_data)
+    :type checker: str
+    :param orientation: orientation of checker: S, W, N, E or auto
+                        (found by dE of all four for every image)
+    :type orientation: str
+    :param deltae: deltaE formula: 2k or 76
+    :type deltae: str
+    :param reference: reference values: file with L*a*b* data, dict with
+                      key: patch name, value: LabColor or None for
+                      official values of checker
+    :type reference: str, dict or None
+    :param sampler: pillow, region or magick
+    :type sampler: str
+    :param compare_sampling: sample also with magick and full resolution
+    :type compare_sampling: bool
+    :param reduced_decode: decode JPEG and pyramidal TIFF in lower scale
+    :type reduced_decode: bool
+    :param reduced_tolerance: max dE of reduced decode before warning,
+                              full resolution is sampled to check it
+                              (None only with compare_sampling)
+    :type reduced_tolerance: float or None
+    :param proof_size: longer side of proof image, 0 for full size
+    :type proof_size: int
+    :param metadata: session, exiftool or pillow
+    :type metadata: str
+    :param write_report: write {fname}.txt and {fname}_de.jpg
+    :type write_report: bool
+    :param cache: SQLite file with cached results of images, None
+                  to analyze every time
+    :type cache: str or None
+    :param cache_size: maximum size of cache in MB
+    :type cache_size: float
+    :param locate: find checker on uncropped capture, orientation
+                   is found with it
+    :type locate: bool
+    :param flat_field: measure illumination of flat field capture
+                       instead of checker
+    :type flat_field: bool
+    :param trace: write wall time and calls of stages of every file
+                  to {fname}.trace.json
+    :type trace: bool
+    :param export: directory of columnar results (ResultExport), batch
+                   workers return rows of files for it
+    :type export: str or None
+    :return: options of analysis
+    :rtype: Settings
+    """
+    if checker not in checker_data:
+        raise ValueError(f"unknown checker: {checker}")
+    if orientation not in ORIENTATION_ROTATION and orientation != "auto":
+        raise ValueError(f"unknown orientation: {orientation}")
+    if deltae not in ("2k", "76"):
+        raise ValueError(f"unknown deltaE formula: {deltae}")
+
+    spec = get_checker_spec(checker)
+    if not isinstance(reference, dict):
+        reference = process_color_data(reference, spec)
+
+    return Settings(spec, ORIENTATION_ROTATION.get(orientation), deltae,
+                    reference, sampler, compare_sampling, reduced_decode,
+                    reduced_tolerance, proof_size, metadata, write_report,
+                    cache, cache_size, locate, flat_field, trace, export)
+
+
+def analyze_text(fname: str, settings=None, **options) -> list:
+    """Calculate deltae from text file in deltae.picturae format
+    or CGATS, for every capture in file.
     :param fname: file name
     :type fname: str
+    :param settings: options of analysis, made from options when None
+    :type settings: Settings
+    :param options: arguments of get_settings
+    :type options: Any
+    :return: results of captures (file name, capture id, target type,
+             global deltae, names and deltae of patches, checker)
+    :rtype: list of TextResult
     """
+    return list(iter_text_results(fname, settings, **options))
 
-    try:
-        with open(fname, encoding="utf-8") as f:
-            patches = f.readlines()[5:29]
-    except IndexError as ecft:
-        raise SystemExit("something wrong with file, "
-                         "didn't get 24 patches.") from ecft
-
-    deglobal = []
-    for line in patches:
-        data = line.strip().split(',')
-        # 0 - patch name, 4 - L, 5 - a, 6 - b
-        point = delta_e_calc(cc_values[data[0]],
-                             LabColor(data[4], data[5], data[6]))
-        deglobal.append(point)
-
-    # Calculate global average
-    # total FADGI control requires a lot of more tests
-    deltae = sum(deglobal)/len(patches)
 
-    # Limit to 3 numbers after point, don't need 15
-    print(f"dE: {deltae:.3f}")
+def iter_text_results(fname: str, settings=None, **options):
+    """Calculate deltae for captures of text file as they are read,
+    deltae of many small captures is calculated at once. Captures are
+    compared with reference of checker of their Targettype: (checker of
+    settings without it), captures of unknown target type or with
+    patches missing in reference are skipped with warning.
+    :param fname: file name
+    :type fname: str
+    :param settings: options of analysis, made from options when None
+    :type settings: Settings
+    :param options: arguments of get_settings
+    :type options: Any
+    :return: results of captures in order of file, nothing when file
+             has no captures
+    :rtype: Iterator[TextResult]
+    """
+    if settings is None:
+        settings = get_settings(**options)
+
+    # Lab values and their indexes by patch name for every checker
+    references = {}
+
+    def get_reference(checker):
+        if checker not in references:
+            values = settings.reference
+            if checker != settings.spec.name:
+                values = process_color_data(None, get_checker_spec(checker))
+            references[checker] = (lab_array(values.values()),
+                                   {pname: index for index, pname
+                                    in enumerate(values)})
+        return references[checker]
+
+    batch = []
+    batch_size = 0
+    blocks = iter_text_blocks(fname)
+    while True:
+        block = next(blocks, None)
+        if block is not None:
+            capture, target, name_columns, lab = block
+            checkers = get_text_checkers(target, settings.spec.name)
+            if not checkers:
+                print(f"Warning: {fname}: capture {capture} skipped, "
+                      f"unknown target type {target}")
+                continue
+            # First checker and column of names with all patches
+            for checker, names in itertools.product(checkers,
+                                                    name_columns):
+                reference, reference_index = get_reference(checker)
+                if reference_index.keys() >= set(names):
+                    break
+            else:
+                print(f"Warning: {fname}: capture {capture} skipped, "
+                      f"patches missing in reference of "
+                      f"{', '.join(checkers)}")
+                continue
+            rows = [reference_index[pname] for pname in names]
+            batch.append(((capture, target, names, lab), checker,
+                          reference[rows]))
+            batch_size += len(rows)
+            if batch_size < TEXT_BATCH_PATCHES:
+                continue
+
+        if batch:
+            de_values = delta_e_calc_array(
+                numpy.concatenate([expected for _, _, expected in batch]),
+                numpy.concatenate([block[3] for block, _, _ in batch]),
+                settings.deltae)
+            sections = numpy.cumsum([len(block[2])
+                                     for block, _, _ in batch])[:-1]
+            for ((capture, target, names, _), checker, _), de in zip(
+                    batch, numpy.split(de_values, sections)):
+                deglobal = de.tolist()
+                # Calculate global average
+                # total FADGI control requires a lot of more tests
+                deltae = sum(deglobal)/len(deglobal)
+                yield TextResult(fname, capture, target, deltae, names, de,
+                                 checker)
+            batch = []
+            batch_size = 0
+
+        if block is None:
+            return
+
+
+def get_text_checkers(target: str, checker: str) -> tuple:
+    """Get checkers which capture of text file can be, from its target
+    type
+    :param target: Targettype: of capture, - when file has none
+    :type target: str
+    :param checker: name of checker of settings
+    :type checker: str
+    :return: names of checkers in order of preference, empty when
+             target type is unknown
+    :rtype: tuple
+    """
+    name = target.lower()
+    if target == "-" or name == checker:
+        return (checker,)
+    if name in checker_data:
+        return (name,)
+
+    checkers = TEXT_TARGETS.get(name, ())
+    if checker in checkers:
+        return (checker,) + tuple(other for other in checkers
+                                  if other != checker)
+
+    return checkers
+
+
+def iter_text_blocks(fname: str):
+    """Read text file line by line and return captures one by one.
+    d.p.c. export: set-up lines (first is capture id), Targettype: line,
+    CSV header and patch rows, next capture starts with first line which
+    isn't patch row. Without Targettype: line header is recognized by
+    names of TEXT_FIELDS. CGATS: keywords (DESCRIPTOR is capture id) and
+    BEGIN_DATA_FORMAT and BEGIN_DATA sections.
+    :param fname: file name
+    :type fname: str
+    :return: capture id, target type, names of patches from every column
+             of names in header (preferred first) and Lab (N, 3)
+    :rtype: Iterator[tuple]
+    """
+    def columns_of(header, candidates):
+        return tuple(header.index(name) for name in candidates
+                     if name in header)
+
+    def is_header(line):
+        fields = line.split(",")
+        return all(columns_of(fields, candidates)
+                   for candidates in TEXT_FIELDS)
+
+    capture, target, header, separator = None, "-", None, ","
+    in_data = in_format = False
+    names, values = [], []
+    columns = ((0,), 4, 5, 6)
+
+    with open(fname, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+
+            if in_format:
+                if line == "END_DATA_FORMAT":
+                    in_format = False
+                else:
+                    header += line.split()
+                continue
+
+            if in_data:
+                fields = line.split(separator)
+                if len(fields) == len(header) and line != "END_DATA":
+                    names.append(tuple(fields[index].strip('"')
+                                       for index in columns[0]))
+                    values.append([float(fields[index])
+                                   for index in columns[1:]])
+                    continue
+                if names:
+                    yield (capture or "-", target, tuple(zip(*names)),
+                           numpy.array(values, dtype=float))
+                capture, target, header, separator = None, "-", None, ","
+                in_data = False
+                names, values = [], []
+                if line == "END_DATA":
+                    continue
+
+            if not line or line.startswith("CGATS"):
+                continue
+            if line.startswith("Targettype:"):
+                target = line.split(":", 1)[1].strip() or "-"
+            elif line == "BEGIN_DATA_FORMAT":
+                header, separator, in_format = [], None, True
+            elif line == "BEGIN_DATA" and header:
+                in_data = True
+            elif line.startswith("DESCRIPTOR"):
+                capture = line.split(None, 1)[-1].strip('"')
+            elif header is None and (target != "-" or is_header(line)):
+                # CSV header follows Targettype: line
+                header = line.split(separator)
+                in_data = True
+            elif capture is None:
+                capture = line
+            else:
+                continue
+
+            if in_data:
+                columns = (columns_of(header, TEXT_FIELDS[0]) or (0,),
+                           *((columns_of(header, candidates)
+                              or (default,))[0]
+                             for candidates, default
+                             in zip(TEXT_FIELDS[1:], (4, 5, 6))))
 
+    if names:
+        yield (capture or "-", target, tuple(zip(*names)),
+               numpy.array(values, dtype=float))
 
-def calculate_from_image(fname: str):
+
+def analyze_image(fname: str, settings=None, **options) -> NamedTuple:
     """Calculate deltae from image file by detectinc color squares.
     :param fname: file name
     :type fname: str
+    :param settings: options of analysis, made from options when None
+    :type settings: Settings
+    :param options: arguments of get_settings
+    :type options: Any
+    :return: file name, global deltae, FADGI parameters, values of
+             patches (PATCH_DTYPE), exif data, report, rotation of
+             checker, noise and SFR of slanted edges
+    :rtype: ImageResult
+    """
+    if settings is None:
+        settings = get_settings(**options)
+
+    with trace_file(fname, settings):
+        result, term_string, pixels = measure_image(fname, settings)
+        if settings.write_report:
+            write_image_report(result, term_string, settings, pixels)
+
+    return result
+
+
+def measure_image(fname: str, settings: Settings) -> tuple:
+    """Calculate deltae and report of image without writing anything
+    :param fname: file name
+    :type fname: str
+    :param settings: options of analysis
+    :type settings: Settings
+    :return: results, report for proof and pixels decoded for sampling
+             (cc_array, max_value, decode_scale), None for cached results
+    :rtype: ImageResult, str, tuple
     """
-    cc_file = Image.open(fname)
+    from PIL import Image
 
-    image_values = {}
-    for patch in cc_coords:
-        patch_name, patch_vals = get_patch_value(patch, cc_file)
-        image_values[patch_name] = LabColor(*patch_vals)
+    reference_values = settings.reference
 
-    deglobal = []
-    for patch in cc_values:
-        point = delta_e_calc(cc_values[patch], image_values[patch])
+    # Cached results skip decode, comparison of samplers and check of
+    # reduced decode need it
+    cache_key = cached = None
+    if settings.cache and not settings.compare_sampling \
+            and settings.reduced_tolerance is None:
+        with trace_stage("cache"):
+            cache_key = get_cache_key(fname, settings)
+            cached = get_result_cache(settings).get(cache_key)
 
-        checker_values[patch].de = point
+    cc_array, max_value, decode_scale = None, None, 1.0
+    if cached is None:
+        with trace_stage("open"):
+            cc_file = Image.open(fname)
+        with cc_file:
+            with trace_stage("sampling"):
+                patch_values, cc_array, max_value, decode_scale, \
+                    rotation = sample_image(cc_file, settings)
+            sharpness = Sharpness(float("nan"), float("nan"),
+                                  float("nan"), float("nan"), [])
+            if settings.spec.name in SFR_CHECKERS:
+                with trace_stage("sfr"):
+                    sharpness = measure_sharpness(cc_file, cc_array,
+                                                  max_value, decode_scale)
+        patch_names = patch_values["patch"].tolist()
+        image_values = {pname: LabColor(*lab) for pname, lab in zip(
+            patch_names, patch_values[["L", "a", "b"]].tolist())}
 
-        deglobal.append(point)
+        deglobal = delta_e_calc_array(
+            lab_array(reference_values.values()),
+            lab_array(image_values[patch] for patch in reference_values),
+            settings.deltae)
+        patch_values["dE"][[patch_names.index(patch)
+                            for patch in reference_values]] = deglobal
+        deglobal = deglobal.tolist()
 
-    # Calculate parameters:
-    # Global dE
-    deltae = sum(deglobal)/len(deglobal)
-    # Tone response and White Balance
-    tone, wbalance = get_tone_wb(image_values, cc_values)
-    # Lightness uniformity
-    light = get_ligthness_uniformity(image_values, deglobal)
-    # Color accuracy
-    color_acc = get_color_accuracy(deglobal)
+        # Calculate parameters:
+        # Global dE
+        deltae = sum(deglobal)/len(deglobal)
+        # Tone response and White Balance
+        tone, wbalance = get_tone_wb(image_values, reference_values,
+                                     settings)
+        # Lightness uniformity
+        light = get_ligthness_uniformity(image_values, deglobal)
+        # Color accuracy
+        color_acc = get_color_accuracy(deglobal)
+
+        exif_data = get_exif_data(fname, settings.metadata)
+
+        if cache_key:
+            with trace_stage("cache"):
+                get_result_cache(settings).put(
+                    cache_key, patch_values,
+                    (deltae, tone, wbalance, light, color_acc, rotation,
+                     sharpness), exif_data)
+    else:
+        patch_values, metrics, exif_data = cached
+        deltae, tone, wbalance, light, color_acc, rotation = metrics[:6]
+        sharpness = Sharpness._make(metrics[6])
+
+    # Noise as FADGI: standard deviation of L* in gray patches
+    noise = float(patch_values["L_std"][settings.spec.gray_mask].max())
 
     # Create string with exif data
-    exif_data = get_exif_data(cc_file.filename)
     exif_fadgi_str = create_exif_string(exif_data,
                                         deltae,
                                         tone,
                                         wbalance,
                                         light,
-                                        color_acc)
+                                        color_acc,
+                                        settings.deltae,
+                                        noise,
+                                        sharpness)
 
     # Limit to 3 numbers after point, don't need 15
     term_string = f"{exif_fadgi_str}"
 
-    # Initialize ImageMagick command
-    draw_string = ""
     # Initialize debug file content
     debug_file = ""
-    for pn, pv in checker_values.items():
-        # Stuff for magick drawing
-        # Marker becomes red when dE bigger than 3.0 which means
-        # it falls below 3* in FADGI2023
-        if pv.d <= 3.5:
-            stroke = "green"
-        else:
-            stroke = "red"
-        psize = checker_values[patch].size
-        # pointsize parametric or rescale everything for same size
-        draw_string += (f"-fill None -stroke {stroke} -strokewidth 2 "
-                        f"-draw "
-                        f"'rectangle {pv.x},{pv.y} "
-                        f"{pv.x+psize},{pv.y+psize}' "
-                        f"-font Consolas -pointsize 30 "
-                        f"-fill white -stroke black -strokewidth 1 "
-                        f"-draw "
-                        f"'text {pv.x},{pv.y+psize+30} \"{pv.d:.2f}\"' "
-                        )
+    for pv in patch_values:
         # Stuff for debug file
-        debug_file += (f"{pn}: Lab - {pv.l:.3f}, {pv.a:.3f}, {pv.b:.3f}, "
-                       f"\tRGB - {pv.rgb_r * 256:.2f}, {pv.rgb_g * 256:.2f}, "
-                       f"{pv.rgb_b * 256:.2f}, "
-                       f"\tdE2k - {pv.d:.3f}\n")
+        debug_file += (f"{pv['patch']}: Lab - {pv['L']:.3f}, "
+                       f"{pv['a']:.3f}, {pv['b']:.3f}, "
+                       f"\tRGB - {pv['R'] * 256:.2f}, "
+                       f"{pv['G'] * 256:.2f}, {pv['B'] * 256:.2f}, "
+                       f"\tdE2k - {pv['dE']:.3f}")
+        if not numpy.isnan(pv["L_std"]):
+            debug_file += (f", \ttrimmed Lab - {pv['L_trim']:.3f}, "
+                           f"{pv['a_trim']:.3f}, {pv['b_trim']:.3f}, "
+                           f"\tL* std - {pv['L_std']:.3f}, "
+                           f"\tclipped RGB - {pv['clip_R']}, "
+                           f"{pv['clip_G']}, {pv['clip_B']}")
+        debug_file += "\n"
+
+    for (x, y, slant, sfr50, sfr10, sfr_max, shift_r,
+         shift_b) in sharpness.edges:
+        debug_file += (f"Edge {x}, {y}: slant - {slant:.2f}, "
+                       f"\tSFR50 - {sfr50:.3f}, \tSFR10 - {sfr10:.3f}, "
+                       f"\tmax SFR - {sfr_max:.3f}, "
+                       f"\tR-G, B-G - {shift_r:.3f}, {shift_b:.3f}\n")
 
     # Get list of properties about file and add them to file
     term_string = (f"{term_string}\n"
                    f"{date.isoformat(date.today())}, "
                    "deltae.py, Mikołaj Machowski 2026")
-    draw_string += (f"-background white "
-                    f"-fill black "
-                    f"-font Consolas -pointsize 40 "
-                    f"label:'{term_string}' -append "
-                    )
 
     # Create debug file
     debug_file += (f"\n{term_string}")
 
-    magick_debug_string = (f"magick -quiet {re.escape(DELTAEFILE)}[0] "
-                           f"-rotate {cc_rotation} "
-                           f"{draw_string} "
-                           f"{re.escape(DELTAEFILE)}_de.jpg")
+    pixels = None
+    if cached is None:
+        pixels = (cc_array, max_value, decode_scale)
 
-    os.system(magick_debug_string)
+    return (ImageResult(fname, deltae, tone, wbalance, light, color_acc,
+                        patch_values, exif_data, debug_file, rotation,
+                        noise, sharpness),
+            term_string, pixels)
 
-    with open(f"{fname}.txt", "w", encoding="utf-8") as f:
-        f.write(debug_file)
 
+def write_image_report(result: ImageResult, term_string: str,
+                       settings: Settings, pixels=None):
+    """Write report {file}.txt and proof {file}_de.jpg of image
+    :param result: results of measure_image
+    :type result: ImageResult
+    :param term_string: report to write under proof
+    :type term_string: str
+    :param settings: options of analysis
+    :type settings: Settings
+    :param pixels: pixels decoded for sampling (cc_array, max_value,
+                   decode_scale), None for cached results
+    :type pixels: tuple
+    """
+    fname = result.filename
+    # Draw proof from pixels decoded for sampling, with cached
+    # results only when proof is missing
+    if pixels is not None or not os.path.exists(f"{fname}_de.jpg"):
+        cc_array, max_value, decode_scale = pixels or (None, None, 1.0)
+        if cc_array is None:
+            cc_array, max_value, decode_scale = get_proof_array(
+                fname, settings)
+        # Orientation found for image with auto orientation
+        with trace_stage("proof"):
+            draw_proof(cc_array, max_value, result.patches, term_string,
+                       settings._replace(rotation=result.rotation),
+                       decode_scale).save(f"{fname}_de.jpg", quality=92)
 
-def get_exif_data(fname) -> tuple:
-    """Get exif data for file and return it structured
-    :param fname: Name of file
+    with trace_stage("report"), open(f"{fname}.txt", "w",
+                                     encoding="utf-8") as f:
+        f.write(result.report)
+
+
+def get_proof_array(fname: str, settings: Settings) -> tuple:
+    """Decode image for proof when sampler didn't decode it
+    :param fname: file name
     :type fname: str
-    :return: Named tuple with structured data for exif
-    :rtype: NamedTuple
+    :param settings: options of analysis
+    :type settings: Settings
+    :return: pixels, maximum value of channel and their scale
+    :rtype: numpy.ndarray, int, float
     """
-    exif_out = os.popen("exiftool -s -S -T "
-                        "-Filename "
-                        "-FileType "
-                        "-Creator "
-                        "-ColorMode "
-                        "-XResolution "
-                        "-Make "
-                        "-Model "
-                        "-SerialNumber "
-                        "-Lens "
-                        "-ProfileDescription "
-                        "-BitsPerSample "
-                        "-ShutterSpeed "
-                        "-Aperture "
-                        "-ISO "
-                        "-Compression "
-                        f"{re.escape(fname)}").read().split("\t")
-
-    Edata = namedtuple('Edata',
-                       ['filename', 'filetype', 'creator', 'colormode',
-                        'resolution', 'make', 'model', 'serialnumber',
-                        'lens', 'profile', 'bps',
-                        'shutter', 'aperture', 'iso'])
-
-    # Remove last element, we get it only to scrap and get rid of new line
-    # added by Windows version of exiftool
-    exifd = Edata._make(exif_out[:-1])
+    from PIL import Image
 
-    return exifd
+    with Image.open(fname) as cc_file:
+        if settings.sampler == "region":
+            cc_array, max_value, decode_scale = get_proof_regions(
+                cc_file, settings.proof_size)
+            if cc_array is not None:
+                return cc_array, max_value, decode_scale
+        cc_array, max_value = get_image_array(cc_file)
 
+    return cc_array, max_value, 1.0
 
-def create_exif_string(ex_data, de, tone, wb, lu, ca) -> str:
-    """Create string with exif data for debug files
-    It will consists of two parts. General metadata and FADGI
-    :param exifdata: Exif data in namedtuple
-    :type exifdata: namedtuple
-    :param de: deltaE 2000
-    :type de: float
-    :param tone: tone
-    :type tone: float
-    :param wb: white balance
-    :type tone: float
-    :param lu: Light uniformity
-    :type tone: float
-    :param ca: Color accuracy
-    :type tone: float
-    :return: string to add for jpg and text files
-    :rtype: str
+
+def analyze_flat_field(fname: str, settings=None, threads=None,
+                       **options) -> NamedTuple:
+    """Measure illumination of flat field capture (grey card or white
+    board filling frame) by L* of blocks of image
+    :param fname: file name
+    :type fname: str
+    :param settings: options of analysis, made from options when None
+    :type settings: Settings
+    :param threads: number of threads reducing blocks, number of CPUs
+                    when None
+    :type threads: int
+    :param options: arguments of get_settings
+    :type options: Any
+    :return: file name, L* of blocks, their mean, max difference from
+             mean, non-uniformity, exif data and report
+    :rtype: FlatFieldResult
     """
+    if settings is None:
+        settings = get_settings(**options)
 
-    serial_no = ""
-    if ex_data.serialnumber != "-":
-        serial_no = f" ({ex_data.serialnumber})"
+    with trace_file(fname, settings):
+        result, term_string = measure_flat_field(fname, settings, threads)
+        if settings.write_report:
+            write_flat_field_report(result, term_string)
 
-    general_txt = (f"{'Filename:':9} {ex_data.filename}\n"
-                   f"{'Author:':9} {ex_data.creator}\n"
-                   f"{'Camera:':9} {ex_data.make} {ex_data.model}{serial_no}\n"
-                   f"{'Lens:':9} {ex_data.lens}\n"
-                   f"{'ISO:':9} {ex_data.iso:9} "
-                   f"{'Aperture:':9} {ex_data.aperture:9} "
-                   f"{'Shutter:':9} {ex_data.shutter:9}")
+    return result
 
-    fadgi_data = (de, ex_data.filetype, ex_data.bps, ex_data.profile,
-                  ex_data.colormode, tone, wb, lu, ca)
 
-    fadgi_stars = get_stars(fadgi_data)
+def measure_flat_field(fname: str, settings: Settings,
+                       threads=None) -> tuple:
+    """Calculate illumination of flat field without writing anything
+    :param fname: file name
+    :type fname: str
+    :param settings: options of analysis
+    :type settings: Settings
+    :param threads: number of threads reducing blocks
+    :type threads: int
+    :return: results and report for heatmap
+    :rtype: FlatFieldResult, str
+    """
+    from PIL import Image
 
-    det_txt = ""
+    with trace_stage("open"):
+        cc_file = Image.open(fname)
+    with cc_file, trace_stage("blocks"):
+        lightness = get_block_lightness(cc_file, threads)
+    exif_data = get_exif_data(fname, settings.metadata)
 
-    if args.deltae == "2k":
+    # Non-uniformity like lightness uniformity: range of L* / mean L*
+    mean = float(lightness.mean())
+    deviation = float(numpy.abs(lightness - mean).max())
+    non_uniformity = float((lightness.max() - lightness.min()) / mean)
 
-        det_txt = ("FADGI2023: prints, photographs, "
-                   "maps, posters, paintings, other 2D art\n\n"
-                   f"{'DeltaE 2000:':23}{fadgi_stars.de}{de:.3f}\n"
-                   f"{'Filetype:':23}{fadgi_stars.ft}{ex_data.filetype}\n"
-                   f"{'Bit depth:':23}{fadgi_stars.bd}{ex_data.bps}\n"
-                   f"{'Color profile:':23}{fadgi_stars.icc}{ex_data.profile}\n"
-                   f"{'Color mode:':23}{fadgi_stars.cm}{ex_data.colormode}\n"
-                   f"{'Tone response:':23}{fadgi_stars.tone}{tone:.3f}\n"
-                   f"{'White balance:':23}{fadgi_stars.wb}{wb:.3f}\n"
-                   f"{'Lightness uniformity:':23}{fadgi_stars.lu}{lu:.3%}\n"
-                   f"{'Color accuracy:':23}{fadgi_stars.ca}{ca:.3f}\n"
-                   )
+    term_string = create_flat_field_string(exif_data, lightness, mean,
+                                           deviation, non_uniformity,
+                                           settings.deltae)
+    term_string = (f"{term_string}\n"
+                   f"{date.isoformat(date.today())}, "
+                   "deltae.py, Mikołaj Machowski 2026")
 
-    elif args.deltae == "76":
+    # L* of blocks in rows of image for debug file
+    debug_file = "".join(" ".join(f"{lab_l:7.2f}" for lab_l in row) + "\n"
+                         for row in lightness.tolist())
+    debug_file += f"\n{term_string}"
 
-        det_txt = ("Metamorfoze: preserving the paper heritage\n\n"
-                   f"{'DeltaE 1976:':23}{de:.3f}\n"
-                   f"{'Filetype:':23}{ex_data.filetype}\n"
-                   f"{'Bit depth:':23}{ex_data.bps}\n"
-                   f"{'Color profile:':23}{ex_data.profile}\n"
-                   f"{'Color mode:':23}{ex_data.colormode}\n"
-                   )
+    return (FlatFieldResult(fname, lightness, mean, deviation,
+                            non_uniformity, exif_data, debug_file),
+            term_string)
 
-    return general_txt + "\n\n" + det_txt
 
+def write_flat_field_report(result: FlatFieldResult, term_string: str):
+    """Write report {file}.txt and heatmap {file}_ff.jpg of flat field
+    :param result: results of measure_flat_field
+    :type result: FlatFieldResult
+    :param term_string: report to write under heatmap
+    :type term_string: str
+    """
+    fname = result.filename
+    with trace_stage("heatmap"):
+        draw_flat_field(result.lightness, result.mean,
+                        term_string).save(f"{fname}_ff.jpg", quality=92)
 
-def get_stars(color_data: tuple) -> NamedTuple:
-    """Process parameters of color and return star rating according
-    to FADGI 2023
-    :param color_data: color data
-    :type color_data: tuple
-    :return: named tuple of strings
-    :rtype: namedtuple
+    with trace_stage("report"), open(f"{fname}.txt", "w",
+                                     encoding="utf-8") as f:
+        f.write(result.report)
 
-    FADGI 2023
-    Prints and photographs,
-    Bound volumes: rare and special materials
-    Documents (unbound): manuscripts and other rare and special materials
-    Documents (unbound): general collections
-    Oversize items: maps, posters and other materials
-    Paintings and other 2D art
 
-    File Format
-    1-4 stars TIFF, JP2 (JPEG 2000)
-    Bit depth
-    1-2 stars 8 bit
-    3-4 stars 16 bit
-    Color space
-    1-2 sRGB
-    3-4 Adobe RGB (1998), ProPhoto, ECIRGB_v2
-    Color Mode
-    1 Grayscale
-    2-4 Color (RGB)
-    Tone Response
-    1 <= 6, 2 <= 4.5, 3 <= 3, 4 <= 1.5
-    White balance
-    1 <= 8, 2 <= 6, 3 <= 4, 4 <= 2
-    Lightness uniformity
-    1 <= 8%, 2 <= 5%, 3 <= 3%, 4 <= 1%
-    DeltaE 2k
-    1 <= 6.5, 2 <= 5, 3 <= 3.5, 4 <= 2
-    Color accuracy
-    1 <= 13, 2 <= 10, 3 <= 7, 4 <= 4
-    Color channel Misregistration (unimplemented)
-    1 <= 1.2, 2 <= 0.8, 3 <= 0.5, 4 <= 0.33
-    SFR10 (unimplemented)
-    1 >= 60%, 2 >= 70%, 3 >= 80%, 4 >= 90%
-    SFR50 (unimplemented)
-    ---
-    Sharpening (units max modulation) (unimplemented)
-    1 < 1.15, 2 < 1.1, 3 < 1.05, 4 <= 1.02
-    Noise (Upper limit, Units Std Dev of L*) (unimplemented)
-    1 <= 4, 2 <= 3, 3 <= 2, 4 <= 1
+def get_cache_key(fname: str, settings: Settings) -> str:
+    """Get key of results in cache: hash of content of file and of
+    options which change results, reference values and version of tool
+    :param fname: file name
+    :type fname: str
+    :param settings: options of analysis
+    :type settings: Settings
+    :return: hex digest
+    :rtype: str
+    """
+    import hashlib
+    import json
+
+    file_hash = hashlib.sha256()
+    with open(fname, "rb") as f:
+        for block in iter(lambda: f.read(CACHE_READ_BLOCK), b""):
+            file_hash.update(block)
+
+    reference = json.dumps([[pname, *lab.get_value_tuple()] for pname, lab
+                            in settings.reference.items()])
+    key = json.dumps([file_hash.hexdigest(), settings.spec.name,
+                      settings.rotation, settings.deltae,
+                      hashlib.sha256(reference.encode()).hexdigest(),
+                      settings.sampler, settings.reduced_decode,
+                      settings.metadata, settings.locate,
+                      get_tool_version()])
 
+    return hashlib.sha256(key.encode()).hexdigest()
 
+
+@lru_cache(maxsize=None)
+def get_tool_version() -> str:
+    """Version of tool for cache: hash of this file, so results of
+    changed code aren't used
+    :return: hex digest
+    :rtype: str
     """
-    deltae, ftype, bdepth, icc, cmode, toner, whiteb, lunif, cacc = color_data
+    import hashlib
 
-    init_data: list[Any] = []
+    with open(__file__, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
 
-    # Deltae test
-    if deltae <= 2:
-        init_data.append(4)
-    elif deltae <= 3.5:
-        init_data.append(3)
-    elif deltae <= 5:
-        init_data.append(2)
-    elif deltae <= 6.5:
-        init_data.append(1)
-    else:
-        init_data.append("No stars!")
 
-    # Filetype test
-    if ftype in ["TIFF", "JP2"]:
-        init_data.append(4)
-    else:
-        init_data.append("-")
+class ResultCache:
+    """Results of images (values of patches, parameters and metadata)
+    in SQLite file, least recently used results are removed when file
+    is bigger than size limit."""
+    def __init__(self, path, size_limit):
+        import sqlite3
 
-    # Bitdepth test
-    if bdepth in ("16 16 16", "16"):
-        init_data.append(4)
-    elif bdepth in ("8 8 8", "8"):
-        init_data.append(2)
-    else:
-        init_data.append("Unknown bit-depth")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.size_limit = size_limit
+        self.connection = sqlite3.connect(path, timeout=30,
+                                          check_same_thread=False)
+        # One query at a time when threads share cache
+        self.lock = threading.Lock()
+        with self.lock, self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS results "
+                                    "(key TEXT PRIMARY KEY, patches BLOB, "
+                                    "metrics TEXT, exif TEXT, "
+                                    "size INTEGER, used REAL)")
+            self.connection.execute("CREATE INDEX IF NOT EXISTS "
+                                    "results_used ON results (used)")
 
-    # ICC test
-    if icc in ["Adobe RGB (1998)", "ProPhoto", "ECIRGB_v2"]:
-        init_data.append(4)
-    elif icc == "sRGB":
-        init_data.append(2)
-    else:
-        init_data.append(f"Unknown profile ({icc})")
+    def get(self, key):
+        """Get results from cache and mark them as used
+        :param key: key from get_cache_key
+        :type key: str
+        :return: values of patches (PATCH_DTYPE), parameters (deltae,
+                 tone, white balance, lightness uniformity, color
+                 accuracy, rotation, sharpness) and exif data, None
+                 when not in cache
+        :rtype: numpy.ndarray, tuple, Edata
+        """
+        import json
 
-    # Color mode test
-    if cmode == "RGB":
-        init_data.append(4)
-    else:
-        init_data.append(f"{cmode}")
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT patches, metrics, exif FROM results WHERE key = ?",
+                (key,)).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE results SET used = ? WHERE key = ?",
+                (time.time(), key))
 
-    # Tone response test
-    if toner <= 1.5:
-        init_data.append(4)
-    elif toner <= 3:
-        init_data.append(3)
-    elif toner <= 4.5:
+        patches = numpy.frombuffer(row[0], dtype=PATCH_DTYPE).copy()
+
+        return (patches, tuple(json.loads(row[1])),
+                Edata._make(json.loads(row[2])))
+
+    def put(self, key, patch_values, metrics, exif_data):
+        """Store results in cache, remove least recently used results
+        over size limit
+        :param key: key from get_cache_key
+        :type key: str
+        :param patch_values: values of patches (PATCH_DTYPE)
+        :type patch_values: numpy.ndarray
+        :param metrics: deltae, tone, white balance, lightness
+                        uniformity, color accuracy, rotation, sharpness
+        :type metrics: tuple
+        :param exif_data: exif data
+        :type exif_data: Edata
+        """
+        import json
+
+        patches = patch_values.tobytes()
+        metrics = json.dumps(metrics)
+        exif = json.dumps(exif_data)
+        size = len(patches) + len(metrics) + len(exif) + len(key)
+
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                (key, patches, metrics, exif, size, time.time()))
+            total = self.connection.execute(
+                "SELECT SUM(size) FROM results").fetchone()[0]
+            if total <= self.size_limit:
+                return
+            old_results = self.connection.execute(
+                "SELECT key, size FROM results ORDER BY used").fetchall()
+            for old_key, old_size in old_results:
+                if total <= self.size_limit:
+                    break
+                self.connection.execute(
+                    "DELETE FROM results WHERE key = ?", (old_key,))
+                total -= old_size
+
+    def close(self):
+        """Close SQLite file"""
+        self.connection.close()
+
+
+def get_result_cache(settings: Settings) -> ResultCache:
+    """Return cache of results of this process, open it when needed
+    :param settings: options of analysis
+    :type settings: Settings
+    :return: cache of results
+    :rtype: ResultCache
+    """
+    global result_cache
+
+    with result_cache_lock:
+        if result_cache is None or result_cache.path != settings.cache:
+            result_cache = ResultCache(settings.cache,
+                                       settings.cache_size * 1024 * 1024)
+            atexit.register(result_cache.close)
+
+    return result_cache
+
+
+class Trace:
+    """Wall time and number of calls of stages of analysis and of
+    subprocesses, time of nested stage (decode in sampling) is counted
+    also in its parent stage."""
+    def __init__(self):
+        # Name of stage: [seconds, calls]
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        """Time stage, time and calls of stage are summed
+        :param name: name of stage
+        :type name: str
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = self.stages.setdefault(name, [0.0, 0])
+            record[0] += time.perf_counter() - start
+            record[1] += 1
+
+    def merge(self, stages: dict):
+        """Add stages of other trace (file of batch)
+        :param stages: seconds and calls of stages
+        :type stages: dict
+        """
+        for name, (seconds, calls) in stages.items():
+            record = self.stages.setdefault(name, [0.0, 0])
+            record[0] += seconds
+            record[1] += calls
+
+    def write(self, path, **info):
+        """Write trace as JSON
+        :param path: JSON file
+        :type path: str
+        :param info: values written before stages (file name)
+        :type info: Any
+        """
+        import json
+
+        stages = {name: {"seconds": round(seconds, 6), "calls": calls}
+                  for name, (seconds, calls) in self.stages.items()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({**info, "stages": stages}, f, indent=2)
+
+
+@contextmanager
+def trace_file(fname: str, settings: Settings):
+    """Trace stages of analysis of file in this thread when tracing
+    is on, trace is written to {fname}.trace.json also when analysis
+    fails. Inside trace of the same thread (analyze_image called by
+    analyze_file) stages go to the outer trace.
+    :param fname: file name
+    :type fname: str
+    :param settings: options of analysis
+    :type settings: Settings
+    :return: trace of file, None when tracing is off
+    :rtype: Trace
+    """
+    if not settings.trace or current_trace.get() is not None:
+        yield current_trace.get()
+        return
+
+    trace = Trace()
+    token = current_trace.set(trace)
+    try:
+        with trace.stage("total"):
+            yield trace
+    finally:
+        current_trace.reset(token)
+        trace.write(f"{fname}{TRACE_SUFFIX}", file=fname)
+
+
+def trace_stage(name: str):
+    """Time stage in trace of file analyzed in this thread, nothing
+    is timed when tracing is off
+    :param name: name of stage
+    :type name: str
+    :return: context manager of stage
+    :rtype: ContextManager
+    """
+    trace = current_trace.get()
+    if trace is None:
+        return NO_STAGE
+
+    return trace.stage(name)
+
+
+def write_trace_summary(summary: Trace, files: int, directory: str,
+                        **info):
+    """Print time of stages of all traced files and write them to
+    deltae_trace.json
+    :param summary: merged traces of files
+    :type summary: Trace
+    :param files: number of traced files
+    :type files: int
+    :param directory: directory of deltae_trace.json
+    :type directory: str
+    :param info: values written before stages (time of batch)
+    :type info: Any
+    """
+    total = summary.stages.get("total", (0.0, 0))[0] or 1.0
+    print(f"\nStages of {files} files (nested stages are counted also "
+          "in parent):")
+    for name, (seconds, calls) in sorted(summary.stages.items(),
+                                         key=lambda item: -item[1][0]):
+        print(f"{name:15} {seconds:9.3f} s {seconds / total:7.1%} "
+              f"{calls:8} calls")
+
+    path = os.path.join(directory, TRACE_SUMMARY)
+    summary.write(path, files=files, **info)
+    print(f"Trace summary: {path}")
+
+
+def get_export_rows(result, settings: Settings) -> tuple:
+    """Make row of capture and rows of its patches for export, stars
+    only with deltaE 2000 (FADGI)
+    :param result: results of image or of capture of text file
+    :type result: ImageResult or TextResult
+    :param settings: options of analysis
+    :type settings: Settings
+    :return: row of capture and rows of patches (columns of
+             EXPORT_CAPTURE_FIELDS and EXPORT_PATCH_FIELDS)
+    :rtype: dict, list
+    """
+    capture = {"file": result.filename, "formula": settings.deltae,
+               "analyzed": datetime.now().isoformat(timespec="seconds"),
+               "deltae": result.deltae}
+
+    if isinstance(result, TextResult):
+        capture.update(capture=result.capture, checker=result.checker)
+        patches = [{"file": result.filename, "capture": result.capture,
+                    "patch": pname, "dE": de}
+                   for pname, de in zip(result.patches, result.de.tolist())]
+        return capture, patches
+
+    sharpness = result.sharpness
+    capture.update(capture="", checker=settings.spec.name,
+                   **result.exif._asdict(), tone=result.tone,
+                   white_balance=result.white_balance,
+                   lightness_uniformity=result.lightness_uniformity,
+                   color_accuracy=result.color_accuracy,
+                   noise=result.noise, sfr50=sharpness.sfr50,
+                   sfr10=sharpness.sfr10, sharpening=sharpness.sharpening,
+                   misregistration=sharpness.misregistration,
+                   edges=len(sharpness.edges), rotation=result.rotation)
+    del capture["filename"]
+
+    if settings.deltae == "2k":
+        stars = get_fadgi_stars(result.exif, result.deltae, result.tone,
+                                result.white_balance,
+                                result.lightness_uniformity,
+                                result.color_accuracy, result.noise,
+                                sharpness)
+        values = (result.deltae, None, None, None, None, result.tone,
+                  result.white_balance, result.lightness_uniformity,
+                  result.color_accuracy, result.noise, sharpness.sfr10,
+                  sharpness.sharpening, sharpness.misregistration)
+        # No stars for parameter which wasn't measured
+        for (field, _), star, value in zip(EXPORT_CAPTURE_FIELDS[-13:],
+                                           stars, values):
+            if value is None or not numpy.isnan(value):
+                capture[field] = star.count("*")
+
+    names = PATCH_DTYPE.names
+    patches = [{"file": result.filename, "capture": "",
+                **dict(zip(names, values))}
+               for values in result.patches.tolist()]
+
+    return capture, patches
+
+
+class ResultExport:
+    """Rows of captures and patches appended in chunks to captures.csv
+    and patches.csv and, when pyarrow is installed, as row groups to
+    Parquet files of this run in captures/ and patches/."""
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.captures = []
+        self.patches = []
+        # Parquet file can't be appended, every run writes its own
+        self.run = f"{datetime.now():%Y%m%d-%H%M%S}-{os.getpid()}"
+        self.writers = {}
+        # Turned off by first write without pyarrow
+        self.parquet = True
+
+    def add(self, rows: list):
+        """Add rows of file, they are written when chunk is full
+        :param rows: row of capture and rows of its patches for every
+                     capture of file (get_export_rows)
+        :type rows: list
+        """
+        for capture, patches in rows:
+            self.captures.append(capture)
+            self.patches.extend(patches)
+        if len(self.captures) >= EXPORT_CHUNK:
+            self.flush()
+
+    def iter_added(self, results, settings: Settings):
+        """Give results and add their rows as they pass
+        :param results: results of images or captures of text file
+        :type results: Iterator[ImageResult or TextResult]
+        :param settings: options of analysis
+        :type settings: Settings
+        :return: the same results
+        :rtype: Iterator[ImageResult or TextResult]
+        """
+        for result in results:
+            self.add([get_export_rows(result, settings)])
+            yield result
+
+    def flush(self):
+        """Append buffered rows to files"""
+        for name, fields, rows in (
+                ("captures", EXPORT_CAPTURE_FIELDS, self.captures),
+                ("patches", EXPORT_PATCH_FIELDS, self.patches)):
+            if not rows:
+                continue
+            self.write_csv(name, fields, rows)
+            if self.parquet:
+                self.write_parquet(name, fields, rows)
+        self.captures = []
+        self.patches = []
+
+    def write_csv(self, name: str, fields: tuple, rows: list):
+        """Append rows to CSV file, header is written to new file
+        :param name: captures or patches
+        :type name: str
+        :param fields: columns and their Arrow types
+        :type fields: tuple
+        :param rows: rows
+        :type rows: list
+        """
+        import csv
+
+        path = os.path.join(self.directory, f"{name}.csv")
+        new_file = not os.path.exists(path) or not os.path.getsize(path)
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, [field for field, _ in fields])
+            if new_file:
+                writer.writeheader()
+            writer.writerows(rows)
+
+    def write_parquet(self, name: str, fields: tuple, rows: list):
+        """Write rows as row group of Parquet file of this run
+        :param name: captures or patches
+        :type name: str
+        :param fields: columns and their Arrow types
+        :type fields: tuple
+        :param rows: rows
+        :type rows: list
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            self.parquet = False
+            return
+
+        schema = pyarrow.schema([(field, pyarrow.type_for_alias(kind))
+                                 for field, kind in fields])
+        if name not in self.writers:
+            os.makedirs(os.path.join(self.directory, name), exist_ok=True)
+            self.writers[name] = pyarrow.parquet.ParquetWriter(
+                os.path.join(self.directory, name, f"{self.run}.parquet"),
+                schema)
+        self.writers[name].write_table(pyarrow.Table.from_pylist(rows,
+                                                                 schema))
+
+    def close(self):
+        """Write buffered rows and close Parquet files"""
+        self.flush()
+        for writer in self.writers.values():
+            writer.close()
+        self.writers = {}
+
+
+def sample_image(cc_file: Image, settings: Settings) -> tuple:
+    """Get Lab values of all patches with sampler selected in settings.
+    :param cc_file: Image to analyze
+    :type cc_file: Image
+    :param settings: options of analysis
+    :type settings: Settings
+    :return: values of patches (PATCH_DTYPE), decoded pixels in
+             orientation of file (None for magick sampler), maximum
+             value of channel, scale of decoded pixels and rotation
+             of checker (found one for auto orientation)
+    :rtype: numpy.ndarray, numpy.ndarray, int, float, int
+    """
+    cc_array, max_value, decode_scale = None, None, 1.0
+    sampler = settings.sampler
+
+    geometry = auto_samples = None
+    auto_time = 0.0
+    if settings.locate:
+        with trace_stage("locate"):
+            geometry, cc_array, max_value = locate_checker(cc_file,
+                                                           settings)
+    elif settings.rotation is None:
+        # Patches are sampled together with finding of orientation
+        auto_start = time.perf_counter()
+        with trace_stage("orientation"):
+            rotation, auto_samples, cc_array, max_value = get_orientation(
+                cc_file, settings)
+        settings = settings._replace(rotation=rotation)
+        auto_time = time.perf_counter() - auto_start
+
+    # Comparison with magick is skipped when it isn't installed
+    compare_magick = settings.compare_sampling and sampler != "magick"
+    if compare_magick:
+        import shutil
+
+        if shutil.which("magick") is None:
+            print("Warning: magick isn't installed, sampling isn't "
+                  "compared")
+            compare_magick = False
+
+    if compare_magick or sampler == "magick":
+        magick_start = time.perf_counter()
+        samples = [get_patch_value(patch, cc_file, settings, geometry)
+                   for patch in settings.spec.patches]
+        magick_time = time.perf_counter() - magick_start
+        magick_rgb = {pn: rgb for pn, rgb, *_ in samples}
+
+    sample_start = time.perf_counter()
+
+    if sampler == "region":
+        samples = auto_samples or get_patch_values_region(cc_file, settings,
+                                                          geometry)
+        if samples is None:
+            print(f"Warning: {cc_file.filename} can't be read by regions, "
+                  "decoding whole image")
+            sampler = "pillow"
+
+    if sampler == "pillow" and auto_samples:
+        samples = auto_samples
+    elif sampler == "pillow":
+        # Located checker is sampled in full resolution
+        if settings.reduced_decode and geometry is None:
+            decode_scale = set_reduced_decode(cc_file, settings)
+        if cc_array is None:
+            cc_array, max_value = get_image_array(cc_file, cc_file.tell())
+        samples = [get_patch_value_array(patch, cc_array, max_value,
+                                         settings, decode_scale, geometry)
+                   for patch in settings.spec.patches]
+
+    sample_time = time.perf_counter() - sample_start + auto_time
+
+    # Only when reduced resolution was really used
+    if decode_scale != 1.0:
+        print(f"Reduced decode: scale {decode_scale:.4f} "
+              f"({cc_array.shape[1]}x{cc_array.shape[0]}), "
+              f"sampling {sample_time:.3f} s")
+
+    if compare_magick:
+        rgb_diff = max(abs(mv - pv) * 65536
+                       for pn, rgb, *_ in samples
+                       for mv, pv in zip(magick_rgb[pn], rgb))
+        print(f"Sampling: {sampler} {sample_time:.3f} s, "
+              f"magick {magick_time:.3f} s "
+              f"({magick_time / sample_time:.1f}x), "
+              f"max difference {rgb_diff:.1f} (16-bit)")
+
+    if decode_scale != 1.0 and (settings.compare_sampling
+                                or settings.reduced_tolerance is not None):
+        compare_full_resolution(cc_file.filename, samples, sample_time,
+                                settings)
+
+    patch_values = store_patch_values(samples)
+
+    return patch_values, cc_array, max_value, decode_scale, settings.rotation
+
+
+def get_orientation(cc_file: Image, settings: Settings) -> tuple:
+    """Find orientation of checker: probes of all four rotations are
+    sampled at once and mean dE against reference is compared, warn
+    when two orientations are close
+    :param cc_file: Image to analyze
+    :type cc_file: Image
+    :param settings: options of analysis
+    :type settings: Settings
+    :return: rotation with the lowest mean dE, patch name, RGB values,
+             probe and its statistics of every patch in it, decoded
+             pixels (None when only regions were read) and maximum
+             value of channel
+    :rtype: int, list, numpy.ndarray, int
+    """
+    spec = settings.spec
+    rotations = sorted(ORIENTATION_ROTATION.values())
+    geometries = [get_checker_boxes(spec.name, *cc_file.size, rotation)
+                  for rotation in rotations]
+    # Grid of checker is nearly symmetric and probes of rotations
+    # overlap, every box is sampled once
+    boxes, box_index = numpy.unique(
+        numpy.concatenate([boxes for _, boxes in geometries]), axis=0,
+        return_inverse=True)
+    box_index = box_index.reshape(len(rotations), -1)
+
+    cc_array = regions = None
+    if settings.sampler == "region":
+        regions = read_tiff_regions(cc_file, boxes.tolist())
+    if regions is None:
+        cc_array, max_value = get_image_array(cc_file, cc_file.tell())
+        regions = ([cc_array[top:bottom, left:right] for left, top, right,
+                    bottom in boxes.tolist()], max_value)
+    pixels, max_value = regions
+    box_rgb = [get_mean_rgb(region, max_value) for region in pixels]
+    box_lab = rgb_to_lab_array(box_rgb)
+
+    # Every rotation is only other indexing of sampled values
+    reference = [spec.patches.index(pname) for pname in settings.reference]
+    reference_lab = lab_array(settings.reference.values())
+    mean_de = [delta_e_calc_array(reference_lab,
+                                  box_lab[indexes[reference]],
+                                  settings.deltae).mean()
+               for indexes in box_index]
+
+    best, second = numpy.argsort(mean_de)[:2]
+    names = {rotation: name for name, rotation
+             in ORIENTATION_ROTATION.items()}
+    if mean_de[second] - mean_de[best] < ORIENTATION_MARGIN:
+        print(f"Warning: orientation of {cc_file.filename} is uncertain: "
+              f"{names[rotations[best]]} mean dE {mean_de[best]:.2f}, "
+              f"{names[rotations[second]]} mean dE {mean_de[second]:.2f}")
+
+    probes = geometries[best][0].tolist()
+    samples = [(pname, box_rgb[index], tuple(probe),
+                get_patch_stats(pixels[index], max_value))
+               for pname, index, probe
+               in zip(spec.patches, box_index[best].tolist(), probes)]
+
+    return rotations[best], samples, cc_array, max_value
+
+
+def set_reduced_decode(cc_file: Image, settings: Settings) -> float:
+    """Select smallest decode of image which still gives probes of full
+    size inside every patch: draft mode of JPEG (1/2, 1/4, 1/8) or reduced
+    resolution page of pyramidal TIFF
+    :param cc_file: Image to decode, draft or page is set on it
+    :type cc_file: Image
+    :param settings: options of analysis
+    :type settings: Settings
+    :return: scale of decoded image against full resolution
+    :rtype: float
+    """
+    width, height = cc_file.size
+
+    def probe_size(level_width, level_height):
+        probes, _ = get_checker_boxes(settings.spec.name, level_width,
+                                      level_height, settings.rotation)
+        return int(probes[0, 2])
+
+    full_probe = probe_size(width, height)
+
+    if cc_file.format == "JPEG":
+        for reduce in (8, 4, 2):
+            level_size = (-(-width // reduce), -(-height // reduce))
+            if probe_size(*level_size) == full_probe:
+                cc_file.draft(cc_file.mode, level_size)
+                break
+    elif cc_file.format == "TIFF":
+        # Reduced pages have bit 0 of NewSubfileType set
+        levels = []
+        for frame in range(cc_file.n_frames):
+            cc_file.seek(frame)
+            level_width, level_height = cc_file.size
+            same_aspect = abs(level_width / level_height
+                              - width / height) < 0.01
+            if (frame == 0 or cc_file.tag_v2.get(254, 0) & 1) \
+                    and same_aspect \
+                    and probe_size(level_width, level_height) == full_probe:
+                levels.append((level_width, frame))
+        cc_file.seek(min(levels)[1])
+
+    return cc_file.size[0] / width
+
+
+def compare_full_resolution(fname, samples: list, reduced_time: float,
+                            settings: Settings):
+    """Sample full resolution of image and report time saved by reduced
+    decode and difference of Lab values, warn when it is bigger than
+    tolerance
+    :param fname: file name
+    :type fname: str
+    :param samples: patch name, RGB values, probe from reduced decode
+    :type samples: list
+    :param reduced_time: time of sampling from reduced decode
+    :type reduced_time: float
+    :param settings: options of analysis
+    :type settings: Settings
+    """
+    from PIL import Image
+
+    full_start = time.perf_counter()
+    with Image.open(fname) as full_file:
+        full_array, full_max = get_image_array(full_file)
+        full_samples = [get_patch_value_array(pn, full_array, full_max,
+                                              settings)
+                        for pn, *_ in samples]
+    full_time = time.perf_counter() - full_start
+
+    de_diff = delta_e_calc_array(
+        rgb_to_lab_array([rgb for _, rgb, *_ in samples]),
+        rgb_to_lab_array([rgb for _, rgb, *_ in full_samples]),
+        settings.deltae).max()
+
+    print(f"Full resolution: sampling {full_time:.3f} s "
+          f"(saved {full_time - reduced_time:.3f} s), "
+          f"max dE difference {de_diff:.3f}")
+    tolerance = settings.reduced_tolerance
+    if tolerance is None:
+        tolerance = REDUCED_TOLERANCE
+    if de_diff > tolerance:
+        print(f"Warning: reduced decode differs from full resolution "
+              f"by more than dE {tolerance}")
+
+
+def draw_proof(cc_array, max_value, patch_values, term_string,
+               settings: Settings, decode_scale=1.0) -> Image:
+    """Draw probes and dE of patches on image and add report below
+    :param cc_array: pixels in orientation of file
+    :type cc_array: numpy.ndarray
+    :param max_value: maximum value of channel (255 or 65535)
+    :type max_value: int
+    :param patch_values: values of patches (PATCH_DTYPE)
+    :type patch_values: numpy.ndarray
+    :param term_string: report to write under image
+    :type term_string: str
+    :param settings: options of analysis
+    :type settings: Settings
+    :param decode_scale: scale of pixels against full resolution
+    :type decode_scale: float
+    :return: proof image in S orientation
+    :rtype: Image
+    """
+    from PIL import Image, ImageDraw
+
+    cc_height, cc_width = cc_array.shape[:2]
+    scale = 1.0
+    if 0 < settings.proof_size < max(cc_width, cc_height):
+        scale = settings.proof_size / max(cc_width, cc_height)
+
+    # Skip pixels down to proof size before proper resize, proof only
+    # shows placement of probes, so it doesn't need more detail
+    step = max(int(1 / scale), 1)
+    proof_array = cc_array[::step, ::step]
+    if max_value == 65535:
+        proof_array = (proof_array >> 8).astype(numpy.uint8)
+    elif max_value != 255:
+        proof_array = ((proof_array.astype(numpy.uint32) * 255
+                        + max_value // 2) // max_value).astype(numpy.uint8)
+    proof = Image.fromarray(numpy.ascontiguousarray(
+        proof_array[..., 0] if proof_array.shape[-1] == 1 else proof_array))
+    proof = proof.convert("RGB").resize((round(cc_width * scale),
+                                         round(cc_height * scale)),
+                                        Image.Resampling.LANCZOS)
+    # Rotate only small proof, clockwise like magick -rotate, probes of
+    # located checker are in orientation of file
+    if settings.rotation and not settings.locate:
+        proof = proof.rotate(-settings.rotation, expand=True)
+
+    draw = ImageDraw.Draw(proof)
+    patch_font = get_proof_font(30)
+    for *probe, patch_de in patch_values[["x", "y", "size", "dE"]].tolist():
+        # Marker becomes red when dE bigger than 3.0 which means
+        # it falls below 3* in FADGI2023
+        if patch_de <= 3.5:
+            stroke = "green"
+        else:
+            stroke = "red"
+        p_x, p_y, psize = (x * scale * decode_scale for x in probe)
+        draw.rectangle((p_x, p_y, p_x + psize, p_y + psize),
+                       outline=stroke, width=2)
+        draw.text((p_x, p_y + psize + 30), f"{patch_de:.2f}", font=patch_font,
+                  anchor="ls", fill="white", stroke_width=1,
+                  stroke_fill="black")
+
+    return append_report(proof, term_string)
+
+
+def draw_flat_field(lightness, mean, term_string) -> Image:
+    """Draw heatmap of L* of flat field blocks: lighter blocks red,
+    darker blue, full color at FLAT_HEAT_RANGE from mean, and add
+    report below
+    :param lightness: L* of blocks
+    :type lightness: numpy.ndarray (rows, columns)
+    :param mean: mean L* of blocks
+    :type mean: float
+    :param term_string: report to write under heatmap
+    :type term_string: str
+    :return: heatmap
+    :rtype: Image
+    """
+    from PIL import Image, ImageDraw
+
+    shift = numpy.clip((lightness - mean) / FLAT_HEAT_RANGE, -1.0, 1.0)
+    # White at mean, other channels fade towards red or blue
+    fade = numpy.round(255 * (1 - numpy.abs(shift))).astype(numpy.uint8)
+    cells = numpy.stack((numpy.where(shift > 0, 255, fade),
+                         fade,
+                         numpy.where(shift < 0, 255, fade)), axis=-1)
+    heatmap = Image.fromarray(cells.astype(numpy.uint8)).resize(
+        (cells.shape[1] * FLAT_HEAT_CELL, cells.shape[0] * FLAT_HEAT_CELL),
+        Image.Resampling.NEAREST)
+
+    draw = ImageDraw.Draw(heatmap)
+    cell_font = get_proof_font(FLAT_HEAT_CELL // 4)
+    for (row, column), lab_l in numpy.ndenumerate(lightness):
+        draw.text(((column + 0.5) * FLAT_HEAT_CELL,
+                   (row + 0.5) * FLAT_HEAT_CELL),
+                  f"{lab_l - mean:+.2f}", font=cell_font, anchor="mm",
+                  fill="white", stroke_width=1, stroke_fill="black")
+
+    return append_report(heatmap, term_string, 20)
+
+
+def append_report(image, term_string, size=40) -> Image:
+    """Append report below image like magick label: -append
+    :param image: proof or heatmap
+    :type image: Image
+    :param term_string: report
+    :type term_string: str
+    :param size: size of font in pixels
+    :type size: int
+    :return: image with report
+    :rtype: Image
+    """
+    from PIL import Image, ImageDraw
+
+    label_font = get_proof_font(size)
+    label_box = ImageDraw.Draw(image).multiline_textbbox(
+        (0, 0), term_string, font=label_font)
+    framed = Image.new("RGB", (max(image.width, label_box[2]),
+                               image.height + label_box[3]), "white")
+    framed.paste(image)
+    ImageDraw.Draw(framed).multiline_text((0, image.height), term_string,
+                                          font=label_font, fill="black")
+
+    return framed
+
+
+@lru_cache(maxsize=None)
+def get_proof_font(size: int):
+    """Get monospaced font for proof, default font of Pillow when
+    Consolas or DejaVu Sans Mono are not installed
+    :param size: size of font in pixels
+    :type size: int
+    :return: font
+    :rtype: ImageFont.FreeTypeFont
+    """
+    from PIL import ImageFont
+
+    for font_name in PROOF_FONTS:
+        try:
+            return ImageFont.truetype(font_name, size)
+        except OSError:
+            continue
+
+    return ImageFont.load_default(size)
+
+
+def get_exif_data(fname, method="session") -> tuple:
+    """Get exif data for file and return it structured
+    :param fname: Name of file
+    :type fname: str
+    :param method: session, exiftool or pillow
+    :type method: str
+    :return: Named tuple with structured data for exif
+    :rtype: NamedTuple
+    """
+    if method == "pillow":
+        with trace_stage("metadata"):
+            exif_out = get_exif_values_pillow(fname)
+    elif method == "session":
+        session = get_exiftool_session()
+        try:
+            with trace_stage("exiftool"):
+                exif_out = session.execute(
+                    "-s", "-S", "-T", *(f"-{tag}" for tag in EXIF_TAGS),
+                    fname).split("\t")
+        except RuntimeError as error:
+            # Next file starts new session, this one is read by Pillow
+            end_exiftool_session(session)
+            print(f"Warning: {error}, metadata of {fname} read by Pillow")
+            with trace_stage("metadata"):
+                exif_out = get_exif_values_pillow(fname)
+    else:
+        with trace_stage("exiftool"):
+            exif_out = os.popen("exiftool -s -S -T "
+                                + " ".join(f"-{tag}" for tag in EXIF_TAGS)
+                                + f" {re.escape(fname)}").read().split("\t")
+
+    # Remove last element (Compression), we get it only to scrap and get
+    # rid of new line added by Windows version of exiftool
+    exifd = Edata._make(exif_out[:len(Edata._fields)])
+
+    return exifd
+
+
+class ExifToolSession:
+    """Persistent exiftool process (-stay_open) used for all files
+    of run instead of new exiftool process for every file."""
+    def __init__(self):
+        import subprocess
+
+        self.process = subprocess.Popen(["exiftool", "-stay_open", "True",
+                                         "-@", "-"],
+                                        stdin=subprocess.PIPE,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL,
+                                        encoding="utf-8")
+        # One command at a time when threads share session
+        self.lock = threading.Lock()
+
+    def execute(self, *params) -> str:
+        """Run one exiftool command in session
+        :param params: exiftool arguments, one per element
+        :type params: str
+        :return: output of exiftool
+        :rtype: str
+        """
+        with self.lock:
+            try:
+                self.process.stdin.write("\n".join(params)
+                                         + "\n-execute\n")
+                self.process.stdin.flush()
+            except BrokenPipeError:
+                raise RuntimeError("exiftool session ended "
+                                   "unexpectedly") from None
+
+            output = ""
+            while True:
+                line = self.process.stdout.readline()
+                if not line:
+                    raise RuntimeError("exiftool session ended "
+                                       "unexpectedly")
+                if line.rstrip() == "{ready}":
+                    return output
+                output += line
+
+    def close(self):
+        """Stop exiftool process"""
+        if self.process.poll() is None:
+            self.process.stdin.write("-stay_open\nFalse\n")
+            self.process.stdin.flush()
+            self.process.wait()
+
+
+def get_exiftool_session() -> ExifToolSession:
+    """Return exiftool session of this process, start it when needed
+    :return: exiftool session
+    :rtype: ExifToolSession
+    """
+    global exiftool_session
+
+    with exiftool_lock:
+        if exiftool_session is None:
+            with trace_stage("exiftool start"):
+                exiftool_session = ExifToolSession()
+            atexit.register(exiftool_session.close)
+
+    return exiftool_session
+
+
+def end_exiftool_session(session: ExifToolSession):
+    """Stop exiftool session which failed, next file starts new one
+    :param session: failed exiftool session
+    :type session: ExifToolSession
+    """
+    global exiftool_session
+
+    with exiftool_lock:
+        if exiftool_session is session:
+            exiftool_session = None
+    session.process.kill()
+    session.process.wait()
+
+
+def get_exif_values_pillow(fname) -> list:
+    """Read metadata with Pillow without exiftool
+    :param fname: Name of file
+    :type fname: str
+    :return: values of EXIF_TAGS formatted like exiftool -T does
+    :rtype: list
+    """
+    from PIL import Image, ImageCms
+
+    with Image.open(fname) as cc_file:
+        exif = cc_file.getexif()
+        exif_ifd = exif.get_ifd(0x8769)
+        xmp = get_xmp_values(cc_file)
+        icc = cc_file.info.get("icc_profile")
+
+        bps = "-"
+        if cc_file.format == "TIFF":
+            bps = " ".join(str(x) for x in cc_file.tag_v2.get(258, ()))
+        elif cc_file.format == "JPEG":
+            bps = str(cc_file.bits)
+
+        resolution = exif.get(282) or cc_file.info.get("dpi", ("-",))[0]
+        compression = exif.get(259)
+
+        exif_values = {
+            "Filename": os.path.basename(fname),
+            "FileType": cc_file.format,
+            "Creator": xmp.get("creator"),
+            "ColorMode": PS_COLOR_MODES.get(xmp.get("ColorMode")),
+            "XResolution": exif_number(resolution),
+            "Make": exif.get(271),
+            "Model": exif.get(272),
+            "SerialNumber": (exif_ifd.get(0xA431)
+                             or xmp.get("SerialNumber")),
+            "Lens": xmp.get("Lens") or exif_ifd.get(0xA434),
+            "ProfileDescription": (
+                ImageCms.getProfileDescription(
+                    ImageCms.ImageCmsProfile(io.BytesIO(icc))).strip()
+                if icc else None),
+            "BitsPerSample": bps,
+            "ShutterSpeed": exif_exposure_time(exif_ifd.get(0x829A)),
+            "Aperture": exif_fnumber(exif_ifd.get(0x829D)),
+            "ISO": exif_number(exif_ifd.get(0x8827)),
+            "Compression": TIFF_COMPRESSIONS.get(compression, compression)}
+
+    return [str(exif_values[tag]).strip("\x00 ")
+            if exif_values[tag] not in (None, "") else "-"
+            for tag in EXIF_TAGS]
+
+
+def get_xmp_values(cc_file: Image) -> dict:
+    """Get XMP values used in report (dc:creator, photoshop:ColorMode,
+    aux:SerialNumber, aux:Lens)
+    :param cc_file: Image with XMP packet
+    :type cc_file: Image
+    :return: dict with key: local name of property, value: value
+    :rtype: dict
+    """
+    from xml.etree import ElementTree
+
+    xmp = cc_file.info.get("xmp") or cc_file.info.get("XML:com.adobe.xmp")
+    if xmp is None and cc_file.format == "TIFF":
+        xmp = cc_file.tag_v2.get(700)
+    if not xmp:
+        return {}
+
+    try:
+        root = ElementTree.fromstring(xmp)
+    except ElementTree.ParseError:
+        return {}
+
+    xmp_values = {}
+    for element in root.iter():
+        for key, value in element.attrib.items():
+            xmp_values.setdefault(key.rsplit("}", 1)[-1], value)
+        name = element.tag.rsplit("}", 1)[-1]
+        if name == "creator":
+            # list of creators is joined like exiftool does
+            xmp_values[name] = ", ".join(li.text for li in element.iter()
+                                         if li.text and li.text.strip())
+        elif element.text and element.text.strip():
+            xmp_values.setdefault(name, element.text.strip())
+
+    return xmp_values
+
+
+def exif_number(value) -> str:
+    """Format number from EXIF (also rationals) like exiftool
+    :param value: number
+    :type value: Any
+    :return: formatted number
+    :rtype: str
+    """
+    if isinstance(value, tuple):
+        value = value[0] if value else None
+    try:
+        return f"{float(value):.10g}"
+    except (TypeError, ValueError, ZeroDivisionError):
+        return "-" if value is None else str(value)
+
+
+def exif_exposure_time(value) -> str:
+    """Format exposure time like exiftool (1/60, 0.5, 2)
+    :param value: exposure time in seconds
+    :type value: Any
+    :return: formatted exposure time
+    :rtype: str
+    """
+    try:
+        secs = float(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return "-"
+    if 0 < secs < 0.25001:
+        return f"1/{int(0.5 + 1 / secs)}"
+
+    return f"{secs:.1f}".removesuffix(".0")
+
+
+def exif_fnumber(value) -> str:
+    """Format aperture like exiftool (8.0, 0.95)
+    :param value: F number
+    :type value: Any
+    :return: formatted F number
+    :rtype: str
+    """
+    try:
+        fnumber = float(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return "-"
+    if fnumber <= 0:
+        return str(value)
+
+    return f"{fnumber:.2f}" if fnumber < 1 else f"{fnumber:.1f}"
+
+
+def create_exif_string(ex_data, de, tone, wb, lu, ca, formula="2k",
+                       noise=float("nan"), sharpness=None) -> str:
+    """Create string with exif data for debug files
+    It will consists of two parts. General metadata and FADGI
+    :param exifdata: Exif data in namedtuple
+    :type exifdata: namedtuple
+    :param de: deltaE 2000
+    :type de: float
+    :param tone: tone
+    :type tone: float
+    :param wb: white balance
+    :type tone: float
+    :param lu: Light uniformity
+    :type tone: float
+    :param ca: Color accuracy
+    :type tone: float
+    :param formula: deltaE formula, 2k (FADGI) or 76 (Metamorfoze)
+    :type formula: str
+    :param noise: standard deviation of L* in gray patches, NaN when
+                  sampler didn't give pixels
+    :type noise: float
+    :param sharpness: SFR of slanted edges, None for checkers without
+                      them
+    :type sharpness: Sharpness
+    :return: string to add for jpg and text files
+    :rtype: str
+    """
+
+    general_txt = create_general_string(ex_data)
+
+    if sharpness is None:
+        sharpness = Sharpness(float("nan"), float("nan"), float("nan"),
+                              float("nan"), [])
+
+    fadgi_stars = get_fadgi_stars(ex_data, de, tone, wb, lu, ca, noise,
+                                  sharpness)
+
+    det_txt = ""
+
+    if formula == "2k":
+
+        det_txt = ("FADGI2023: prints, photographs, "
+                   "maps, posters, paintings, other 2D art\n\n"
+                   f"{'DeltaE 2000:':23}{fadgi_stars.de}{de:.3f}\n"
+                   f"{'Filetype:':23}{fadgi_stars.ft}{ex_data.filetype}\n"
+                   f"{'Bit depth:':23}{fadgi_stars.bd}{ex_data.bps}\n"
+                   f"{'Color profile:':23}{fadgi_stars.icc}{ex_data.profile}\n"
+                   f"{'Color mode:':23}{fadgi_stars.cm}{ex_data.colormode}\n"
+                   f"{'Tone response:':23}{fadgi_stars.tone}{tone:.3f}\n"
+                   f"{'White balance:':23}{fadgi_stars.wb}{wb:.3f}\n"
+                   f"{'Lightness uniformity:':23}{fadgi_stars.lu}{lu:.3%}\n"
+                   f"{'Color accuracy:':23}{fadgi_stars.ca}{ca:.3f}\n"
+                   )
+        if not numpy.isnan(noise):
+            det_txt += (f"{'Noise (L* std):':23}"
+                        f"{fadgi_stars.noise}{noise:.3f}\n")
+        if sharpness.edges:
+            # SFR in percents of Nyquist frequency (0.5 cycle per pixel),
+            # - when SFR didn't fall to level
+            sfr10, sfr50 = ("-" if numpy.isnan(sfr) else f"{sfr * 2:.1%}"
+                            for sfr in (sharpness.sfr10, sharpness.sfr50))
+            det_txt += (f"{'SFR10:':23}{fadgi_stars.sfr10}{sfr10} "
+                        f"({len(sharpness.edges)} edges)\n"
+                        f"{'SFR50:':23}{'':10}{sfr50}\n"
+                        f"{'Sharpening:':23}{fadgi_stars.sharpening}"
+                        f"{sharpness.sharpening:.3f}\n")
+        if not numpy.isnan(sharpness.misregistration):
+            det_txt += (f"{'Misregistration:':23}"
+                        f"{fadgi_stars.misregistration}"
+                        f"{sharpness.misregistration:.3f} px\n")
+
+    elif formula == "76":
+
+        det_txt = ("Metamorfoze: preserving the paper heritage\n\n"
+                   f"{'DeltaE 1976:':23}{de:.3f}\n"
+                   f"{'Filetype:':23}{ex_data.filetype}\n"
+                   f"{'Bit depth:':23}{ex_data.bps}\n"
+                   f"{'Color profile:':23}{ex_data.profile}\n"
+                   f"{'Color mode:':23}{ex_data.colormode}\n"
+                   )
+
+    return general_txt + "\n\n" + det_txt
+
+
+def get_fadgi_stars(ex_data, de, tone, wb, lu, ca, noise,
+                    sharpness: Sharpness) -> NamedTuple:
+    """Rate parameters of image according to FADGI 2023
+    :param ex_data: Exif data in namedtuple
+    :type ex_data: Edata
+    :param de: deltaE 2000
+    :type de: float
+    :param tone: tone
+    :type tone: float
+    :param wb: white balance
+    :type wb: float
+    :param lu: Light uniformity
+    :type lu: float
+    :param ca: Color accuracy
+    :type ca: float
+    :param noise: standard deviation of L* in gray patches
+    :type noise: float
+    :param sharpness: SFR of slanted edges
+    :type sharpness: Sharpness
+    :return: named tuple of strings (get_stars)
+    :rtype: namedtuple
+    """
+    fadgi_data = (de, ex_data.filetype, ex_data.bps, ex_data.profile,
+                  ex_data.colormode, tone, wb, lu, ca, noise,
+                  sharpness.sfr10, sharpness.sharpening,
+                  sharpness.misregistration)
+
+    return get_stars(fadgi_data)
+
+
+def create_general_string(ex_data) -> str:
+    """Create general part of report: file, author, camera and exposure
+    :param ex_data: Exif data in namedtuple
+    :type ex_data: Edata
+    :return: string to add for jpg and text files
+    :rtype: str
+    """
+    serial_no = ""
+    if ex_data.serialnumber != "-":
+        serial_no = f" ({ex_data.serialnumber})"
+
+    return (f"{'Filename:':9} {ex_data.filename}\n"
+            f"{'Author:':9} {ex_data.creator}\n"
+            f"{'Camera:':9} {ex_data.make} {ex_data.model}{serial_no}\n"
+            f"{'Lens:':9} {ex_data.lens}\n"
+            f"{'ISO:':9} {ex_data.iso:9} "
+            f"{'Aperture:':9} {ex_data.aperture:9} "
+            f"{'Shutter:':9} {ex_data.shutter:9}")
+
+
+def create_flat_field_string(ex_data, lightness, mean, deviation,
+                             non_uniformity, formula="2k") -> str:
+    """Create string with exif data and illumination of flat field
+    :param ex_data: Exif data in namedtuple
+    :type ex_data: Edata
+    :param lightness: L* of blocks
+    :type lightness: numpy.ndarray
+    :param mean: mean L* of blocks
+    :type mean: float
+    :param deviation: max difference of block L* from mean
+    :type deviation: float
+    :param non_uniformity: range of block L* / mean L*
+    :type non_uniformity: float
+    :param formula: deltaE formula, 2k (FADGI) or 76 (Metamorfoze)
+    :type formula: str
+    :return: string to add for jpg and text files
+    :rtype: str
+    """
+    rows, columns = lightness.shape
+    values_txt = (f"{'Blocks:':23}{columns} x {rows}\n"
+                  f"{'L* mean:':23}{mean:.3f}\n"
+                  f"{'L* min / max:':23}{lightness.min():.3f} / "
+                  f"{lightness.max():.3f}\n"
+                  f"{'Max L* from mean:':23}{deviation:.3f}\n")
+
+    if formula == "2k":
+        det_txt = ("FADGI2023: illumination of flat field\n\n"
+                   f"{'Non-uniformity:':23}"
+                   f"{get_flat_field_stars(non_uniformity)}"
+                   f"{non_uniformity:.3%}\n" + values_txt)
+    else:
+        det_txt = ("Metamorfoze: illumination of flat field\n\n"
+                   f"{'Non-uniformity:':23}{non_uniformity:.3%}\n"
+                   + values_txt)
+
+    return create_general_string(ex_data) + "\n\n" + det_txt
+
+
+def get_stars(color_data: tuple) -> NamedTuple:
+    """Process parameters of color and return star rating according
+    to FADGI 2023
+    :param color_data: color data
+    :type color_data: tuple
+    :return: named tuple of strings
+    :rtype: namedtuple
+
+    FADGI 2023
+    Prints and photographs,
+    Bound volumes: rare and special materials
+    Documents (unbound): manuscripts and other rare and special materials
+    Documents (unbound): general collections
+    Oversize items: maps, posters and other materials
+    Paintings and other 2D art
+
+    File Format
+    1-4 stars TIFF, JP2 (JPEG 2000)
+    Bit depth
+    1-2 stars 8 bit
+    3-4 stars 16 bit
+    Color space
+    1-2 sRGB
+    3-4 Adobe RGB (1998), ProPhoto, ECIRGB_v2
+    Color Mode
+    1 Grayscale
+    2-4 Color (RGB)
+    Tone Response
+    1 <= 6, 2 <= 4.5, 3 <= 3, 4 <= 1.5
+    White balance
+    1 <= 8, 2 <= 6, 3 <= 4, 4 <= 2
+    Lightness uniformity
+    1 <= 8%, 2 <= 5%, 3 <= 3%, 4 <= 1%
+    DeltaE 2k
+    1 <= 6.5, 2 <= 5, 3 <= 3.5, 4 <= 2
+    Color accuracy
+    1 <= 13, 2 <= 10, 3 <= 7, 4 <= 4
+    Color channel Misregistration (pixels)
+    1 <= 1.2, 2 <= 0.8, 3 <= 0.5, 4 <= 0.33
+    SFR10 (of Nyquist frequency)
+    1 >= 60%, 2 >= 70%, 3 >= 80%, 4 >= 90%
+    SFR50
+    ---
+    Sharpening (units max modulation)
+    1 < 1.15, 2 < 1.1, 3 < 1.05, 4 <= 1.02
+    Noise (Upper limit, Units Std Dev of L*)
+    1 <= 4, 2 <= 3, 3 <= 2, 4 <= 1
+
+
+    """
+    (deltae, ftype, bdepth, icc, cmode, toner, whiteb, lunif, cacc,
+     noise, sfr10, sharpening, misregistration) = color_data
+
+    init_data: list[Any] = []
+
+    # Deltae test
+    if deltae <= 2:
+        init_data.append(4)
+    elif deltae <= 3.5:
+        init_data.append(3)
+    elif deltae <= 5:
+        init_data.append(2)
+    elif deltae <= 6.5:
+        init_data.append(1)
+    else:
+        init_data.append("No stars!")
+
+    # Filetype test
+    if ftype in ["TIFF", "JP2"]:
+        init_data.append(4)
+    else:
+        init_data.append("-")
+
+    # Bitdepth test
+    if bdepth in ("16 16 16", "16"):
+        init_data.append(4)
+    elif bdepth in ("8 8 8", "8"):
+        init_data.append(2)
+    else:
+        init_data.append("Unknown bit-depth")
+
+    # ICC test
+    if icc in ["Adobe RGB (1998)", "ProPhoto", "ECIRGB_v2"]:
+        init_data.append(4)
+    elif icc == "sRGB":
+        init_data.append(2)
+    else:
+        init_data.append(f"Unknown profile ({icc})")
+
+    # Color mode test
+    if cmode == "RGB":
+        init_data.append(4)
+    else:
+        init_data.append(f"{cmode}")
+
+    # Tone response test
+    if toner <= 1.5:
+        init_data.append(4)
+    elif toner <= 3:
+        init_data.append(3)
+    elif toner <= 4.5:
         init_data.append(2)
     elif toner <= 6:
         init_data.append(1)
     else:
         init_data.append("-")
 
-    # White balance test
-    if whiteb <= 2:
-        init_data.append(4)
-    elif whiteb <= 4:
-        init_data.append(3)
-    elif whiteb <= 6:
-        init_data.append(2)
-    elif whiteb <= 8:
-        init_data.append(1)
+    # White balance test
+    if whiteb <= 2:
+        init_data.append(4)
+    elif whiteb <= 4:
+        init_data.append(3)
+    elif whiteb <= 6:
+        init_data.append(2)
+    elif whiteb <= 8:
+        init_data.append(1)
+    else:
+        init_data.append("-")
+
+    # Lightness uniformity test
+    if lunif <= 1:
+        init_data.append(4)
+    elif lunif <= 3:
+        init_data.append(3)
+    elif lunif <= 5:
+        init_data.append(2)
+    elif lunif <= 6.5:
+        init_data.append(1)
+    else:
+        init_data.append("-")
+
+    # Color accuracy test
+    if cacc <= 4:
+        init_data.append(4)
+    elif cacc <= 7:
+        init_data.append(3)
+    elif cacc <= 10:
+        init_data.append(2)
+    elif cacc <= 13:
+        init_data.append(1)
+    else:
+        init_data.append("-")
+
+    # Noise test
+    if noise <= 1:
+        init_data.append(4)
+    elif noise <= 2:
+        init_data.append(3)
+    elif noise <= 3:
+        init_data.append(2)
+    elif noise <= 4:
+        init_data.append(1)
+    else:
+        init_data.append("-")
+
+    # SFR10 test, in cycles per pixel
+    if sfr10 >= 0.9 * 0.5:
+        init_data.append(4)
+    elif sfr10 >= 0.8 * 0.5:
+        init_data.append(3)
+    elif sfr10 >= 0.7 * 0.5:
+        init_data.append(2)
+    elif sfr10 >= 0.6 * 0.5:
+        init_data.append(1)
+    else:
+        init_data.append("-")
+
+    # Sharpening test
+    if sharpening <= 1.02:
+        init_data.append(4)
+    elif sharpening < 1.05:
+        init_data.append(3)
+    elif sharpening < 1.1:
+        init_data.append(2)
+    elif sharpening < 1.15:
+        init_data.append(1)
+    else:
+        init_data.append("-")
+
+    # Color channel misregistration test
+    if misregistration <= 0.33:
+        init_data.append(4)
+    elif misregistration <= 0.5:
+        init_data.append(3)
+    elif misregistration <= 0.8:
+        init_data.append(2)
+    elif misregistration <= 1.2:
+        init_data.append(1)
+    else:
+        init_data.append("-")
+
+    # STAR = "★"   # ALT+9733
+    STAR = "*"
+    final_stars = [f"{x * STAR:10}"
+                   if isinstance(x, int) else f"{x:10}" for x in init_data]
+
+    Stars = namedtuple('Stars',
+                       'de, ft, bd, icc, cm, tone, wb, lu, ca, noise, '
+                       'sfr10, sharpening, misregistration')
+
+    fadgi = Stars._make(final_stars)
+
+    return fadgi
+
+
+def get_flat_field_stars(non_uniformity: float) -> str:
+    """Rate illumination of flat field like lightness uniformity
+    in FADGI 2023: 1 <= 8%, 2 <= 5%, 3 <= 3%, 4 <= 1%
+    :param non_uniformity: range of block L* / mean L*
+    :type non_uniformity: float
+    :return: stars
+    :rtype: str
+    """
+    STAR = "*"
+    for stars, limit in ((4, 0.01), (3, 0.03), (2, 0.05), (1, 0.08)):
+        if non_uniformity <= limit:
+            return f"{stars * STAR:10}"
+
+    return f"{'-':10}"
+
+
+def get_tone_wb(tested: dict, reference: dict, settings: Settings) -> tuple:
+    """Get tone response for CC as defined in FADGI:
+    Tone response dL2k for any given gray patch.
+    :param tested: Values for patches in tested file
+    :type tested: dict
+    :param reference: Values for patches in reference file
+    :type reference: dict
+    :param settings: options of analysis
+    :type settings: Settings
+    :return: max absolute difference in gray patches in L channel
+             and difference in colors
+    :rtype: Tuple(float, float)
+    """
+    grays = list(itertools.compress(settings.spec.patches,
+                                    settings.spec.gray_mask))
+    test = lab_array(tested[patch_name] for patch_name in grays)
+    ref = lab_array(reference[patch_name] for patch_name in grays)
+
+    # test tone response
+    tone_response = numpy.abs(test[:, 0] - ref[:, 0])
+    # test white balance
+    white_balance = delta_e_calc_array(test, ref, settings.deltae)
+
+    return float(tone_response.max()), float(white_balance.max())
+
+
+def get_ligthness_uniformity(lab_values: dict, de_values: list) -> float:
+    """ Get lightness uniformity - standard deviation of dE / mean L*
+    :param lab_values: Values of patches
+    :type lab_values: dict
+    :param de_values: dE values for all patches
+    :type de_values: list
+    :return: Ligthness uniformity number
+    :rtype: float
+    """
+    from statistics import stdev
+
+    de_standard_deviation = stdev(de_values)
+    l_values = [x.lab_l for x in lab_values.values()]
+    l_mean = sum(l_values) / len(l_values)
+
+    return de_standard_deviation / l_mean
+
+
+def get_color_accuracy(de: list) -> float:
+    """ Get 90th percentile color accuracy of all patches
+    :param de: list of deltae of all patches
+    :type de: list
+    :return: color accuracy
+    :rtype: float
+    """
+    from statistics import quantiles
+
+    color_accuracy = quantiles(de, n=10)[-1]
+    return color_accuracy
+
+
+def get_source_box(pname, src_width, src_height, settings: Settings,
+                   geometry=None) -> tuple:
+    """ Get sampling square of patch and map it into pixels of file
+    in its own orientation, so image doesn't have to be rotated
+    :param pname: name of patch in range of A1 - F4
+    :type pname: str
+    :param src_width: width of image file
+    :type src_width: int
+    :param src_height: height of image file
+    :type src_height: int
+    :param settings: options of analysis
+    :type settings: Settings
+    :param geometry: probes and boxes of located checker, None for
+                     cropped checker
+    :type geometry: tuple
+    :return: coords of upper-left corner and side of square in
+             S orientation, box (left, top, right, bottom) in file
+    :rtype: tuple, tuple
+    """
+    probes, boxes = geometry or get_checker_boxes(
+        settings.spec.name, src_width, src_height, settings.rotation)
+    index = settings.spec.patches.index(pname)
+
+    return tuple(probes[index].tolist()), tuple(boxes[index].tolist())
+
+
+def store_patch_values(samples: list) -> numpy.ndarray:
+    """ Convert mean RGB of all patches to Lab and store them in
+    record array
+    :param samples: patch name, RGB values in 0-1 scale, (x, y, size)
+                    of probe and statistics of probe (get_patch_stats,
+                    None when unknown) for every patch
+    :type samples: list
+    :return: values of patches (PATCH_DTYPE), dE is not set yet
+    :rtype: numpy.ndarray
+    """
+    rgb_values = numpy.array([rgb for _, rgb, _, _ in samples])
+    lab_values = rgb_to_lab_array(rgb_values)
+    probes = numpy.array([probe for _, _, probe, _ in samples])
+
+    patch_values = numpy.zeros(len(samples), dtype=PATCH_DTYPE)
+    patch_values["patch"] = [pname for pname, _, _, _ in samples]
+    for index, field in enumerate(("L", "a", "b")):
+        patch_values[field] = lab_values[:, index]
+    for index, field in enumerate(("R", "G", "B")):
+        patch_values[field] = rgb_values[:, index]
+    for index, field in enumerate(("x", "y", "size")):
+        patch_values[field] = probes[:, index]
+    patch_values["dE"] = numpy.nan
+
+    stats = [(index, patch_stats) for index, (_, _, _, patch_stats)
+             in enumerate(samples) if patch_stats is not None]
+    for field in ("L_trim", "a_trim", "b_trim", "L_std"):
+        patch_values[field] = numpy.nan
+    for field in ("clip_R", "clip_G", "clip_B"):
+        patch_values[field] = -1
+    if stats:
+        indexes = [index for index, _ in stats]
+        trim_lab = rgb_to_lab_array([trim for _, (trim, _, _) in stats])
+        for index, field in enumerate(("L_trim", "a_trim", "b_trim")):
+            patch_values[field][indexes] = trim_lab[:, index]
+        patch_values["L_std"][indexes] = [l_std for _, (_, l_std, _)
+                                          in stats]
+        clipped = numpy.array([clip for _, (_, _, clip) in stats])
+        for index, field in enumerate(("clip_R", "clip_G", "clip_B")):
+            patch_values[field][indexes] = clipped[:, index]
+
+    return patch_values
+
+
+@lru_cache(maxsize=None)
+def get_conversion_matrices(rgb_type=AdobeRGBColor,
+                            illuminant="d50") -> tuple:
+    """ Prepare matrices for conversion from RGB space to Lab, once
+    for every pair of RGB space and illuminant
+    :param rgb_type: colormath2 class of RGB space
+    :type rgb_type: type
+    :param illuminant: target illuminant of Lab values
+    :type illuminant: str
+    :return: RGB to XYZ matrix, chromatic adaptation (Bradford)
+             matrix and white point of illuminant
+    :rtype: tuple
+    """
+    observer = "2"
+    rgb_matrix = rgb_type.conversion_matrices["rgb_to_xyz"]
+    wp_src = color_constants.ILLUMINANTS[observer][rgb_type.native_illuminant]
+    wp_dst = color_constants.ILLUMINANTS[observer][illuminant]
+
+    # Same steps as colormath2.chromatic_adaptation
+    m_sharp = color_constants.ADAPTATION_MATRICES["bradford"]
+    m_rat = numpy.diag(numpy.dot(m_sharp, wp_dst) / numpy.dot(m_sharp, wp_src))
+    adaptation = numpy.dot(numpy.dot(numpy.linalg.pinv(m_sharp), m_rat),
+                           m_sharp)
+
+    return rgb_matrix, adaptation, numpy.array(wp_dst)
+
+
+def rgb_to_lab_array(rgb, rgb_type=AdobeRGBColor,
+                     illuminant="d50") -> numpy.ndarray:
+    """ Convert RGB values to Lab like colormath2 convert_color does,
+    all colors in one call
+    :param rgb: RGB values in 0-1 scale
+    :type rgb: numpy.ndarray (N, 3)
+    :param rgb_type: colormath2 class of RGB space
+    :type rgb_type: type
+    :param illuminant: target illuminant of Lab values
+    :type illuminant: str
+    :return: Lab values
+    :rtype: numpy.ndarray (N, 3)
+    """
+    with trace_stage("convert"):
+        rgb_matrix, adaptation, white = get_conversion_matrices(rgb_type,
+                                                                illuminant)
+        rgb = numpy.asarray(rgb, dtype=float).reshape(-1, 3)
+
+        # Linearize values
+        if issubclass(rgb_type, sRGBColor):
+            linear = numpy.where(rgb <= 0.04045, rgb / 12.92,
+                                 numpy.power((rgb + 0.055) / 1.055, 2.4))
+        else:
+            linear = numpy.power(rgb, rgb_type.rgb_gamma)
+
+        # colormath2 clamps XYZ before adaptation
+        xyz = numpy.maximum(linear @ rgb_matrix.T, 0.0)
+        if rgb_type.native_illuminant != illuminant:
+            xyz = xyz @ adaptation.T
+
+        xyz = xyz / white
+        xyz = numpy.where(xyz > color_constants.CIE_E, numpy.cbrt(xyz),
+                          (7.787 * xyz) + (16.0 / 116.0))
+
+        return numpy.stack((116.0 * xyz[:, 1] - 16.0,
+                            500.0 * (xyz[:, 0] - xyz[:, 1]),
+                            200.0 * (xyz[:, 1] - xyz[:, 2])), axis=-1)
+
+
+def get_patch_value(pname, cc_file: Image, settings: Settings,
+                    geometry=None):
+    """ Get Lab values from single patch with ImageMagick
+    :param pname: name of patch in range of A1 - F4
+    :type pname: str
+    :param cc_file: Image to analyze
+    :type cc_file: Image
+    :param settings: options of analysis
+    :type settings: Settings
+    :param geometry: probes and boxes of located checker
+    :type geometry: tuple
+    :return: analyzed patch name, RGB values, coords (upper-left)
+             and size of probe, statistics of probe aren't known (None)
+    :rtype: str, tuple, tuple, None
+
+    Every call starts new magick process which decodes whole file,
+    kept as reference for get_patch_value_array.
+    """
+    probe, (left, top, right, bottom) = get_source_box(pname, *cc_file.size,
+                                                       settings, geometry)
+    # Magick command:
+    #   extract patch, box is already in orientation of file
+    #   resize it to 1x1 to get mean color
+    #   and get text for values
+    magic_string = (f"magick -quiet {re.escape(cc_file.filename)}[0] "
+                    f"-crop {right - left}x{bottom - top}+{left}+{top} "
+                    "-resize 1x1 "
+                    "-colorspace RGB "
+                    "-depth 16 -colorspace sRGB txt:")
+    with trace_stage("magick"):
+        p_text = os.popen(magic_string).read()
+    # Proper way to get appropriate Lab values:
+    # one pixel 0-1 values in RGB and later using colormath python:
+    # Extract RGB values from magick string and convert them to 0-1 scale
+    p_rgb = re.findall(r"0,0: \((.*)\) ", p_text)
+    if not p_rgb:
+        raise RuntimeError(f"magick didn't give color of patch {pname} "
+                           f"of {cc_file.filename}, is it installed?")
+    rgb_full_scale = p_rgb[0].split(",")[:3]
+    # I am dealing with 16-bit values
+    rgb = tuple(float(x) / 65536 for x in rgb_full_scale)
+
+    return pname, rgb, probe, None
+
+
+def get_patch_value_array(pname, cc_array, max_value, settings: Settings,
+                          decode_scale=1.0, geometry=None):
+    """ Get Lab values from single patch of already decoded image
+    :param pname: name of patch in range of A1 - F4
+    :type pname: str
+    :param cc_array: pixels of image in orientation of file
+    :type cc_array: numpy.ndarray
+    :param max_value: maximum value of channel (255 or 65535)
+    :type max_value: int
+    :param settings: options of analysis
+    :type settings: Settings
+    :param decode_scale: scale of pixels against full resolution
+    :type decode_scale: float
+    :param geometry: probes and boxes of located checker
+    :type geometry: tuple
+    :return: analyzed patch name, RGB values, coords (upper-left)
+             and size of probe in full resolution, statistics of probe
+    :rtype: str, tuple, tuple, tuple
+    """
+    cc_height, cc_width = cc_array.shape[:2]
+
+    probe, (left, top, right, bottom) = get_source_box(
+        pname, cc_width, cc_height, settings, geometry)
+    pixels = cc_array[top:bottom, left:right]
+
+    if decode_scale != 1.0:
+        probe = tuple(round(x / decode_scale) for x in probe)
+
+    return (pname, get_mean_rgb(pixels, max_value), probe,
+            get_patch_stats(pixels, max_value))
+
+
+def get_mean_rgb(pixels, max_value) -> tuple:
+    """ Get mean color of probe
+    :param pixels: pixels of probe
+    :type pixels: numpy.ndarray (height, width, channels)
+    :param max_value: maximum value of channel (255 or 65535)
+    :type max_value: int
+    :return: RGB values in 0-1 scale
+    :rtype: tuple
+    """
+    # Mean of encoded values like magick, its -resize 1x1 comes before
+    # -colorspace RGB, so it doesn't average in linear light either.
+    # Sums of integer values are exact, so mean doesn't depend on
+    # orientation of pixels
+    p_mean = pixels.reshape(-1, pixels.shape[-1]).mean(axis=0)
+    if len(p_mean) == 1:
+        p_mean = p_mean.repeat(3)
+    # Scale to 16-bit values like magick -depth 16 and convert
+    # them to 0-1 scale
+    return tuple(float(x) * 65535 / max_value / 65536 for x in p_mean[:3])
+
+
+def get_patch_stats(pixels, max_value) -> tuple:
+    """ Get statistics of probe which mean can't show, in one pass over
+    its pixels: trimmed mean (dust, highlights), noise and clipping
+    :param pixels: pixels of probe
+    :type pixels: numpy.ndarray (height, width, channels)
+    :param max_value: maximum value of channel (255 or 65535)
+    :type max_value: int
+    :return: trimmed mean RGB in 0-1 scale (PATCH_TRIM cut from both
+             ends of every channel), standard deviation of L* and
+             number of clipped pixels (0 or maximum) of R, G and B
+    :rtype: tuple, float, tuple
+    """
+    values = pixels.reshape(-1, pixels.shape[-1])[:, :3]
+    if values.shape[1] == 1:
+        values = values.repeat(3, axis=1)
+    # Same scale as mean of probe
+    scale = 65535 / max_value / 65536
+
+    ordered = numpy.sort(values, axis=0)
+    cut = int(len(ordered) * PATCH_TRIM)
+    trimmed = ordered[cut:len(ordered) - cut].mean(axis=0) * scale
+    l_std = rgb_to_lab_array(values * scale)[:, 0].std()
+    clipped = ((values == 0) | (values >= max_value)).sum(axis=0)
+
+    return tuple(trimmed.tolist()), float(l_std), tuple(clipped.tolist())
+
+
+def get_patch_values_region(cc_file: Image, settings: Settings,
+                            geometry=None):
+    """ Get values of all patches reading only strips or tiles of TIFF
+    which cover probes
+    :param cc_file: Image to analyze
+    :type cc_file: Image
+    :param settings: options of analysis
+    :type settings: Settings
+    :param geometry: probes and boxes of located checker
+    :type geometry: tuple
+    :return: patch name, RGB values, probe and statistics of probe for
+             every patch or None when file can't be read by regions
+    :rtype: list
+    """
+    probes, boxes = geometry or get_checker_boxes(
+        settings.spec.name, *cc_file.size, settings.rotation)
+
+    with trace_stage("regions"):
+        regions = read_tiff_regions(cc_file, boxes.tolist())
+    if regions is None:
+        return None
+
+    pixels, max_value = regions
+
+    return [(pname, get_mean_rgb(region, max_value), tuple(probe),
+             get_patch_stats(region, max_value))
+            for pname, probe, region
+            in zip(settings.spec.patches, probes.tolist(), pixels)]
+
+
+def measure_sharpness(cc_file: Image, cc_array, max_value,
+                      decode_scale=1.0) -> NamedTuple:
+    """ Measure SFR of slanted edges of target and misregistration of
+    color channels on them: edges are found in downsampled copy and
+    measured in full resolution, in pixels decoded for sampling
+    :param cc_file: Image to analyze
+    :type cc_file: Image
+    :param cc_array: pixels decoded for sampling or None
+    :type cc_array: numpy.ndarray
+    :param max_value: maximum value of channel
+    :type max_value: int
+    :param decode_scale: scale of cc_array against full resolution
+    :type decode_scale: float
+    :return: medians of SFR50, SFR10 and sharpening, max misregistration
+             and edges
+    :rtype: Sharpness
+    """
+    from PIL import Image
+
+    if decode_scale != 1.0:
+        # Reduced decode isn't good for SFR, size and pixels of reduced
+        # page or JPEG draft are replaced by full resolution (frame 0)
+        with Image.open(cc_file.filename) as full_file:
+            return measure_sharpness(full_file, None, max_value)
+
+    width, height = cc_file.size
+    step = max(int(max(width, height) / SFR_SEARCH_SIZE), 1)
+
+    overview = None
+    if cc_array is None:
+        # Only copy and edges are read from TIFF, other files are
+        # decoded
+        overview, max_value, scale = get_proof_regions(cc_file,
+                                                       SFR_SEARCH_SIZE)
+        if overview is None:
+            with Image.open(cc_file.filename) as full_file:
+                cc_array, max_value = get_image_array(full_file,
+                                                      cc_file.tell())
+        else:
+            step = round(1 / scale)
+    if overview is None:
+        overview = cc_array[::step, ::step]
+
+    found = find_slanted_edges(get_luminance(overview, max_value))
+    half = SFR_TILE * step // 2
+    boxes = [(max(x * step - half, 0), max(y * step - half, 0),
+              min(x * step + half, width), min(y * step + half, height))
+             for x, y, _ in found]
+    rois = []
+    if cc_array is None and boxes:
+        rois = (read_tiff_regions(cc_file, boxes) or (None,))[0]
+        if rois is None:
+            # Pixels of edges are missing (truncated file), decoded
+            # like other files
+            with Image.open(cc_file.filename) as full_file:
+                cc_array, max_value = get_image_array(full_file,
+                                                      cc_file.tell())
+    if cc_array is not None:
+        rois = [cc_array[top:bottom, left:right]
+                for left, top, right, bottom in boxes]
+
+    edges = []
+    for (left, top, right, bottom), roi, (*_, vertical) in zip(
+            boxes, rois, found):
+        sfr = get_edge_sfr(get_luminance(roi, max_value), vertical)
+        if sfr is not None:
+            edges.append(((left + right) // 2, (top + bottom) // 2, *sfr,
+                          *get_edge_shifts(roi / max_value, vertical)))
+
+    if not edges:
+        return Sharpness(float("nan"), float("nan"), float("nan"),
+                         float("nan"), [])
+
+    values = numpy.array(edges)
+    # Edges without crossing of level (NaN) don't count in median
+    medians = [float(numpy.median(column[~numpy.isnan(column)]))
+               if not numpy.isnan(column).all() else float("nan")
+               for column in values[:, 3:6].T]
+    # Misregistration grows to corners, so the worst edge counts
+    misregistration = float(numpy.abs(values[:, 6:]).max())
+
+    return Sharpness(*medians, misregistration, edges)
+
+
+def find_slanted_edges(lum) -> list:
+    """ Find tiles with single straight edge slanted by SFR_ANGLES
+    from vertical or horizontal: gradients of all tiles are reduced
+    at once to structure tensor, its coherence shows one direction
+    :param lum: luminance of downsampled copy
+    :type lum: numpy.ndarray (height, width)
+    :return: middle of edge in copy and whether it is near vertical,
+             the strongest edges first, at most SFR_EDGES
+    :rtype: list
+    """
+    # 3x3 mean first, edges of copy made by skipping pixels are jagged
+    # and gradients of jagged edge don't show its slant
+    rows = lum[:, :-2] + lum[:, 1:-1] + lum[:, 2:]
+    lum = (rows[:-2] + rows[1:-1] + rows[2:]) / 9
+    grad_x = lum[:-1, 1:] - lum[:-1, :-1]
+    grad_y = lum[1:, :-1] - lum[:-1, :-1]
+    rows, columns = grad_x.shape[0] // SFR_TILE, grad_x.shape[1] // SFR_TILE
+    if not rows or not columns:
+        return []
+
+    def tiles(values):
+        return values[:rows * SFR_TILE, :columns * SFR_TILE].reshape(
+            rows, SFR_TILE, columns, SFR_TILE)
+
+    grad_x, grad_y = tiles(grad_x), tiles(grad_y)
+    j_xx = (grad_x ** 2).sum(axis=(1, 3))
+    j_yy = (grad_y ** 2).sum(axis=(1, 3))
+    j_xy = (grad_x * grad_y).sum(axis=(1, 3))
+    energy = j_xx + j_yy
+    coherence = numpy.hypot(j_xx - j_yy, 2 * j_xy) / numpy.maximum(
+        energy, 1e-12)
+    # Direction of gradient, 0 for vertical edge
+    direction = numpy.abs(numpy.degrees(0.5 * numpy.arctan2(2 * j_xy,
+                                                           j_xx - j_yy)))
+    vertical = direction < 45
+    slant = numpy.where(vertical, direction, 90 - direction)
+    lum_tiles = tiles(lum[:-1, :-1])
+    contrast = lum_tiles.max(axis=(1, 3)) - lum_tiles.min(axis=(1, 3))
+
+    good = ((coherence >= SFR_COHERENCE) & (slant >= SFR_ANGLES[0])
+            & (slant <= SFR_ANGLES[1]) & (contrast >= SFR_MIN_CONTRAST))
+
+    # Middle of edge by magnitude of gradients, edge doesn't have to
+    # cross middle of tile
+    magnitude = numpy.hypot(grad_x, grad_y)
+    weight = numpy.maximum(magnitude.sum(axis=(1, 3)), 1e-12)
+    offsets = numpy.arange(SFR_TILE) + 0.5
+    mid_y = (magnitude.sum(axis=3) * offsets[:, numpy.newaxis]).sum(
+        axis=1) / weight
+    mid_x = (magnitude.sum(axis=1) * offsets).sum(axis=2) / weight
+
+    found = []
+    for row, column in sorted(zip(*numpy.nonzero(good)),
+                              key=lambda tile: -energy[tile]):
+        # Mean moved copy by one pixel
+        x = column * SFR_TILE + mid_x[row, column] + 1
+        y = row * SFR_TILE + mid_y[row, column] + 1
+        # One edge from neighbouring tiles
+        if any(abs(x - fx) < SFR_TILE and abs(y - fy) < SFR_TILE
+               for fx, fy, _ in found):
+            continue
+        found.append((round(x), round(y), bool(vertical[row, column])))
+        if len(found) == SFR_EDGES:
+            break
+
+    return found
+
+
+def get_edge_sfr(roi, vertical=True):
+    """ Measure SFR of slanted edge like ISO 12233 e-SFR: centroids
+    of derivative of rows are fitted with line, pixels are binned by
+    distance from it into oversampled edge profile, its derivative
+    (line spread) gives SFR by FFT
+    :param roi: luminance around edge
+    :type roi: numpy.ndarray (height, width)
+    :param vertical: edge is near vertical, horizontal one is transposed
+    :type vertical: bool
+    :return: slant in degrees, SFR50 and SFR10 in cycles per pixel (NaN
+             when SFR doesn't fall to level up to 1 cycle per pixel) and
+             max of SFR up to Nyquist, None when edge isn't straight
+             or doesn't cross region
+    :rtype: tuple
+    """
+    if not vertical:
+        roi = roi.T
+    height, width = roi.shape
+    if height < SFR_TILE or width < SFR_TILE:
+        return None
+    # Dark side on the left
+    if roi[:, 0].mean() > roi[:, -1].mean():
+        roi = roi[:, ::-1]
+
+    line, residual = fit_edge_line(roi)
+    edge_x = numpy.polyval(line, numpy.arange(height))[:, numpy.newaxis]
+
+    slant = numpy.degrees(numpy.arctan(abs(line[0])))
+    margin = min(edge_x.min(), width - 1 - edge_x.max())
+    if (residual > SFR_MAX_RESIDUAL
+            or not SFR_ANGLES[0] <= slant <= SFR_ANGLES[1] or margin < 4):
+        return None
+
+    # Distance of pixels from edge across it
+    cosine = numpy.cos(numpy.arctan(line[0]))
+    distance = (numpy.arange(width) - edge_x) * cosine
+    inside = numpy.abs(distance) < margin * cosine
+    bins = numpy.floor(distance[inside] * SFR_OVERSAMPLING).astype(int)
+    bins -= bins.min()
+    counts = numpy.bincount(bins)
+    sums = numpy.bincount(bins, roi[inside])
+    filled = numpy.nonzero(counts)[0]
+    esf = numpy.interp(numpy.arange(len(counts)), filled,
+                       sums[filled] / counts[filled])
+
+    lsf = numpy.gradient(esf)
+    peak = numpy.argmax(lsf)
+    lsf *= 0.54 + 0.46 * numpy.cos(numpy.pi * numpy.clip(
+        (numpy.arange(len(lsf)) - peak) / (len(lsf) / 2), -1, 1))
+
+    sfr = numpy.abs(numpy.fft.rfft(lsf))
+    if sfr[0] <= 0:
+        return None
+    frequency = numpy.arange(len(sfr)) * SFR_OVERSAMPLING / len(lsf)
+    # Derivative of profile by central difference damps high frequencies
+    sfr = sfr / sfr[0] / numpy.sinc(frequency / SFR_OVERSAMPLING * 2)
+    sfr, frequency = sfr[frequency <= 1], frequency[frequency <= 1]
+
+    def crossing(level: float) -> float:
+        below = numpy.nonzero(sfr < level)[0]
+        # Not measured, edge is sharper than measurable
+        if not len(below) or below[0] == 0:
+            return float("nan")
+        index = below[0]
+        return float(numpy.interp(level, (sfr[index], sfr[index - 1]),
+                                  (frequency[index],
+                                   frequency[index - 1])))
+
+    return (float(slant), crossing(0.5), crossing(0.1),
+            float(sfr[frequency <= 0.5].max()))
+
+
+def fit_edge_line(roi) -> tuple:
+    """ Fit line of near vertical edge: centroids of derivative of
+    rows, second time with Hamming window around first line to suppress
+    noise far from edge
+    :param roi: one channel around edge
+    :type roi: numpy.ndarray (height, width)
+    :return: slope and intercept of x of edge by row and standard
+             deviation of centroids from line in pixels
+    :rtype: numpy.ndarray, float
+    """
+    height, width = roi.shape
+    derivative = numpy.diff(roi, axis=1)
+    # Dark to light from left in any channel
+    if derivative.sum() < 0:
+        derivative = -derivative
+    positions = numpy.arange(width - 1) + 0.5
+    rows = numpy.arange(height)
+
+    window = numpy.ones_like(derivative)
+    for _ in range(2):
+        weighted = derivative * window
+        centroids = (weighted * positions).sum(axis=1) / numpy.maximum(
+            weighted.sum(axis=1), 1e-12)
+        line = numpy.polyfit(rows, centroids, 1)
+        edge_x = numpy.polyval(line, rows)
+        window = 0.54 + 0.46 * numpy.cos(numpy.pi * numpy.clip(
+            (positions - edge_x[:, numpy.newaxis]) / (width / 2), -1, 1))
+
+    return line, float(numpy.std(centroids - edge_x))
+
+
+def get_edge_shifts(roi, vertical=True) -> tuple:
+    """ Get misregistration of color channels on slanted edge: edge
+    line of every channel and shift of R and B line from G one across
+    edge in the middle of region
+    :param roi: pixels around edge in 0-1 scale
+    :type roi: numpy.ndarray (height, width, channels)
+    :param vertical: edge is near vertical, horizontal one is transposed
+    :type vertical: bool
+    :return: shift of R and B from G in pixels (NaN for grayscale)
+    :rtype: float, float
+    """
+    if roi.shape[-1] < 3:
+        return float("nan"), float("nan")
+    if not vertical:
+        roi = roi.transpose(1, 0, 2)
+
+    middle = (roi.shape[0] - 1) / 2
+    lines = [fit_edge_line(roi[..., channel])[0] for channel in range(3)]
+    red, green, blue = (numpy.polyval(line, middle) for line in lines)
+    cosine = numpy.cos(numpy.arctan(lines[1][0]))
+
+    return (float((red - green) * cosine), float((blue - green) * cosine))
+
+
+def get_luminance(pixels, max_value) -> numpy.ndarray:
+    """ Get luminance of pixels (Rec. 601 weights like ISO 12233)
+    :param pixels: pixels
+    :type pixels: numpy.ndarray (height, width, channels)
+    :param max_value: maximum value of channel
+    :type max_value: int
+    :return: luminance in 0-1 scale
+    :rtype: numpy.ndarray (height, width)
+    """
+    if pixels.shape[-1] == 1:
+        return pixels[..., 0] / max_value
+
+    return (pixels[..., :3] @ numpy.array((0.299, 0.587, 0.114))) / max_value
+
+
+def locate_checker(cc_file: Image, settings: Settings) -> tuple:
+    """ Find checker on uncropped capture in downsampled copy of image
+    and map its patches into pixels of full resolution
+    :param cc_file: Image to analyze
+    :type cc_file: Image
+    :param settings: options of analysis
+    :type settings: Settings
+    :return: probes and boxes of patches in orientation of file (like
+             get_checker_boxes), decoded pixels (None when only
+             downsampled copy was read) and maximum value of channel
+    :rtype: tuple, numpy.ndarray, int
+    """
+    width, height = cc_file.size
+
+    cc_array = pixels = None
+    if settings.sampler == "region":
+        pixels, max_value, scale = get_proof_regions(cc_file, LOCATE_SIZE)
+    if pixels is None:
+        # Whole image is decoded anyway, downsample it by skipping pixels
+        cc_array, max_value = get_image_array(cc_file, cc_file.tell())
+        step = max(int(max(width, height) / LOCATE_SIZE), 1)
+        pixels, scale = cc_array[::step, ::step], 1 / step
+
+    transform = get_checker_transform(pixels, max_value, settings.spec)
+    if transform is None:
+        raise CheckerNotFound(f"checker {settings.spec.name} not found in "
+                              f"{cc_file.filename}")
+    # From downsampled copy to full resolution
+    transform = numpy.diag((1 / scale, 1 / scale, 1.0)) @ transform
+
+    spec = settings.spec
+    centres = apply_transform(transform, spec.centres)
+    # Size of probe from width of checker, like for cropped checker
+    middle = spec.centres[:, 1].mean()
+    left_end, right_end = apply_transform(transform,
+                                          [(0, middle), (100, middle)])
+    patch_size = min(round(numpy.hypot(*(right_end - left_end))
+                           * spec.patch_fraction / 2), 25)
+    probes = numpy.column_stack(
+        (numpy.round(centres - patch_size),
+         numpy.full(len(centres), patch_size * 2))).astype(int)
+
+    left = numpy.maximum(probes[:, 0], 0)
+    top = numpy.maximum(probes[:, 1], 0)
+    right = numpy.minimum(probes[:, 0] + probes[:, 2], width)
+    bottom = numpy.minimum(probes[:, 1] + probes[:, 2], height)
+    if (right <= left).any() or (bottom <= top).any():
+        raise CheckerNotFound(f"checker {spec.name} is not whole in "
+                              f"{cc_file.filename}")
+
+    return ((probes, numpy.column_stack((left, top, right, bottom))),
+            cc_array, max_value)
+
+
+def get_checker_transform(pixels, max_value, spec: CheckerSpec):
+    """ Find patches of checker by their reference colors and fit
+    transform of checker coordinates (percents) into pixels with RANSAC:
+    homography, or mapping of row when all patches are in one row
+    :param pixels: downsampled pixels of capture
+    :type pixels: numpy.ndarray (height, width, channels)
+    :param max_value: maximum value of channel (255 or 65535)
+    :type max_value: int
+    :param spec: data of checker
+    :type spec: CheckerSpec
+    :return: transform (3, 3) or None when checker isn't found
+    :rtype: numpy.ndarray
+    """
+    blob_patch, blob_area, blob_xy = get_blobs(
+        get_patch_labels(pixels, max_value, spec.reference))
+
+    # Largest blobs of every patch are candidates for its middle
+    candidates = []
+    for index in range(len(spec.patches)):
+        found = numpy.flatnonzero((blob_patch == index)
+                                  & (blob_area >= LOCATE_MIN_AREA))
+        candidates.extend(
+            found[numpy.argsort(-blob_area[found])][:LOCATE_CANDIDATES])
+    cand_patch, cand_xy = blob_patch[candidates], blob_xy[candidates]
+
+    min_patches = max(6, len(spec.patches) // 3)
+    if len(set(cand_patch.tolist())) < min_patches:
+        return None
+
+    layout = spec.centres
+    if is_collinear(layout):
+        fit, sample_size = fit_row_transform, 2
     else:
-        init_data.append("-")
+        fit, sample_size = fit_homography, 4
+    # Middle of blob must be closer than half of typical patch
+    tolerance = max(numpy.median(numpy.sqrt(blob_area[candidates])) / 2, 2)
 
-    # Lightness uniformity test
-    if lunif <= 1:
-        init_data.append(4)
-    elif lunif <= 3:
-        init_data.append(3)
-    elif lunif <= 5:
-        init_data.append(2)
-    elif lunif <= 6.5:
-        init_data.append(1)
+    rng = numpy.random.default_rng(0)
+    best, best_score = None, (0, 0.0)
+    for _ in range(LOCATE_ITERATIONS):
+        sample = rng.choice(len(candidates), sample_size, replace=False)
+        source = layout[cand_patch[sample]]
+        if len(set(cand_patch[sample].tolist())) < sample_size \
+                or (sample_size == 4 and is_collinear(source, True)):
+            continue
+        inliers, error = get_inliers(fit(source, cand_xy[sample]), layout,
+                                     cand_patch, cand_xy, tolerance)
+        if (len(inliers), -error) > best_score:
+            best, best_score = inliers, (len(inliers), -error)
+
+    if best is None:
+        return None
+    # Fit all inliers, twice as patches can be added by better transform
+    for _ in range(2):
+        transform = fit(layout[cand_patch[best]], cand_xy[best])
+        best, _ = get_inliers(transform, layout, cand_patch, cand_xy,
+                              tolerance)
+    if len(best) < min_patches \
+            or (fit is fit_homography and is_collinear(layout[
+                cand_patch[best]])):
+        return None
+
+    return fit(layout[cand_patch[best]], cand_xy[best])
+
+
+def get_patch_labels(pixels, max_value, reference) -> numpy.ndarray:
+    """ Label pixels with index of patch of nearest reference color,
+    -1 when no patch is close or when 4 neighbours have other label
+    (noise and edges of patches)
+    :param pixels: downsampled pixels of capture
+    :type pixels: numpy.ndarray (height, width, channels)
+    :param max_value: maximum value of channel (255 or 65535)
+    :type max_value: int
+    :param reference: reference Lab of patches
+    :type reference: numpy.ndarray (N, 3)
+    :return: labels of pixels
+    :rtype: numpy.ndarray (height, width)
+    """
+    height, width = pixels.shape[:2]
+    if pixels.shape[-1] == 1:
+        pixels = pixels.repeat(3, axis=-1)
+    lab = rgb_to_lab_array(pixels[..., :3].reshape(-1, 3) / max_value)
+
+    # Squared distances to all patches as |lab|^2 - 2 lab.ref + |ref|^2,
+    # one matrix product instead of differences of all pairs
+    distance = lab @ (-2 * reference.T) + (reference ** 2).sum(axis=1)
+    nearest = distance.argmin(axis=1)
+    distance = (distance[numpy.arange(len(nearest)), nearest]
+                + (lab ** 2).sum(axis=1))
+    labels = numpy.where(distance <= LOCATE_TOLERANCE ** 2, nearest, -1)
+    labels = labels.reshape(height, width)
+
+    inner = labels[1:-1, 1:-1]
+    same = numpy.zeros(labels.shape, dtype=bool)
+    same[1:-1, 1:-1] = ((inner == labels[:-2, 1:-1])
+                        & (inner == labels[2:, 1:-1])
+                        & (inner == labels[1:-1, :-2])
+                        & (inner == labels[1:-1, 2:]))
+
+    return numpy.where(same, labels, -1)
+
+
+def get_blobs(labels) -> tuple:
+    """ Find connected areas of pixels with the same label, runs of
+    label in rows are joined with runs in row above
+    :param labels: labels of pixels, -1 for background
+    :type labels: numpy.ndarray (height, width)
+    :return: label, area and middle (x, y) of every blob
+    :rtype: numpy.ndarray, numpy.ndarray, numpy.ndarray (N, 2)
+    """
+    height, width = labels.shape
+    # Column of -1 ends runs at end of row
+    padded = numpy.full((height, width + 1), -1, dtype=labels.dtype)
+    padded[:, :width] = labels
+    flat = padded.ravel()
+    starts = numpy.flatnonzero(numpy.diff(flat, prepend=-2))
+    ends = numpy.append(starts[1:], flat.size)
+    run_label = flat[starts]
+    valid = run_label >= 0
+    starts, ends, run_label = starts[valid], ends[valid], run_label[valid]
+    rows = starts // (width + 1)
+    first = starts % (width + 1)
+    last = first + ends - starts
+
+    parent = list(range(len(starts)))
+
+    def find(index):
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    row_start = numpy.searchsorted(rows, numpy.arange(height + 1)).tolist()
+    first_list, last_list = first.tolist(), last.tolist()
+    label_list = run_label.tolist()
+    for row in range(1, height):
+        above, below = row_start[row - 1], row_start[row]
+        above_end, below_end = row_start[row], row_start[row + 1]
+        while above < above_end and below < below_end:
+            if first_list[above] < last_list[below] \
+                    and first_list[below] < last_list[above] \
+                    and label_list[above] == label_list[below]:
+                parent[find(below)] = find(above)
+            if last_list[above] < last_list[below]:
+                above += 1
+            else:
+                below += 1
+
+    _, blob = numpy.unique([find(index) for index in range(len(parent))],
+                           return_inverse=True)
+    lengths = last - first
+    area = numpy.bincount(blob, lengths, minlength=blob.max(initial=-1) + 1)
+    blob_x = numpy.bincount(blob, lengths * (first + last - 1) / 2) / area
+    blob_y = numpy.bincount(blob, lengths * rows) / area
+    blob_label = numpy.zeros(len(area), dtype=int)
+    blob_label[blob] = run_label
+
+    return blob_label, area, numpy.column_stack((blob_x, blob_y))
+
+
+def get_inliers(transform, layout, cand_patch, cand_xy,
+                tolerance) -> tuple:
+    """ Get blobs which are close to patches mapped by transform, the
+    closest one for every patch
+    :param transform: transform of checker coordinates to pixels
+    :type transform: numpy.ndarray (3, 3)
+    :param layout: middles of patches in percents of checker
+    :type layout: numpy.ndarray (N, 2)
+    :param cand_patch: patch of every blob
+    :type cand_patch: numpy.ndarray
+    :param cand_xy: middle of every blob
+    :type cand_xy: numpy.ndarray (M, 2)
+    :param tolerance: maximum distance in pixels
+    :type tolerance: float
+    :return: indexes of inlier blobs and sum of their distances
+    :rtype: numpy.ndarray, float
+    """
+    distance = numpy.hypot(*(apply_transform(transform, layout[cand_patch])
+                             - cand_xy).T)
+    order = numpy.argsort(distance)
+    order = order[distance[order] < tolerance]
+    _, first = numpy.unique(cand_patch[order], return_index=True)
+    inliers = order[first]
+
+    return inliers, float(distance[inliers].sum())
+
+
+def apply_transform(transform, points) -> numpy.ndarray:
+    """ Map points with homography
+    :param transform: homography
+    :type transform: numpy.ndarray (3, 3)
+    :param points: points (x, y)
+    :type points: numpy.ndarray (N, 2)
+    :return: mapped points, not finite for degenerate transform
+    :rtype: numpy.ndarray (N, 2)
+    """
+    mapped = (numpy.asarray(points, dtype=float) @ transform[:, :2].T
+              + transform[:, 2])
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return mapped[:, :2] / mapped[:, 2:]
+
+
+def is_collinear(points, any_three=False) -> bool:
+    """ Check if points lie on one line
+    :param points: points (x, y)
+    :type points: numpy.ndarray (N, 2)
+    :param any_three: check every three points instead of all of them
+    :type any_three: bool
+    :return: points are collinear
+    :rtype: bool
+    """
+    points = numpy.asarray(points, dtype=float)
+    if any_three:
+        return any(is_collinear(triple)
+                   for triple in itertools.combinations(points, 3))
+    spread = numpy.linalg.svd(points - points.mean(axis=0),
+                              compute_uv=False)
+    return spread[1] <= 0.05 * spread[0]
+
+
+def fit_homography(source, target) -> numpy.ndarray:
+    """ Fit homography mapping source points to target points, least
+    squares for more than 4 points (normalized DLT)
+    :param source: points (x, y)
+    :type source: numpy.ndarray (N, 2)
+    :param target: points (x, y)
+    :type target: numpy.ndarray (N, 2)
+    :return: homography
+    :rtype: numpy.ndarray (3, 3)
+    """
+    def normalize(points):
+        # Move middle to 0 and scale mean distance from it to sqrt(2)
+        middle = points.mean(axis=0)
+        scale = numpy.sqrt(2) / max(
+            numpy.hypot(*(points - middle).T).mean(), 1e-9)
+        return numpy.array([[scale, 0, -scale * middle[0]],
+                            [0, scale, -scale * middle[1]],
+                            [0, 0, 1]])
+
+    source_norm, target_norm = normalize(source), normalize(target)
+    src = numpy.column_stack((apply_transform(source_norm, source),
+                              numpy.ones(len(source))))
+    dst = apply_transform(target_norm, target)
+
+    equations = numpy.zeros((2 * len(src), 9))
+    equations[0::2, 0:3] = src
+    equations[0::2, 6:9] = -dst[:, :1] * src
+    equations[1::2, 3:6] = src
+    equations[1::2, 6:9] = -dst[:, 1:] * src
+    homography = numpy.linalg.svd(equations)[2][-1].reshape(3, 3)
+
+    return numpy.linalg.inv(target_norm) @ homography @ source_norm
+
+
+def fit_row_transform(source, target) -> numpy.ndarray:
+    """ Fit mapping of patches in one row: shift, rotation and scale
+    along the row (least squares), across the row scale is the same
+    :param source: collinear points (x, y)
+    :type source: numpy.ndarray (N, 2)
+    :param target: points (x, y)
+    :type target: numpy.ndarray (N, 2)
+    :return: transform
+    :rtype: numpy.ndarray (3, 3)
+    """
+    middle = source.mean(axis=0)
+    direction = numpy.linalg.svd(source - middle)[2][0]
+    along = (source - middle) @ direction
+    (origin, step), *_ = numpy.linalg.lstsq(
+        numpy.column_stack((numpy.ones(len(along)), along)), target,
+        rcond=None)
+
+    linear = (numpy.outer(step, direction)
+              + numpy.outer((-step[1], step[0]),
+                            (-direction[1], direction[0])))
+    transform = numpy.eye(3)
+    transform[:2, :2] = linear
+    transform[:2, 2] = origin - linear @ middle
+
+    return transform
+
+
+def read_tiff_regions(cc_file: Image, boxes: list, step=1):
+    """ Read only parts of TIFF file: strips or tiles which cover boxes,
+    uncompressed data are memory mapped, deflate data are decompressed
+    row by row and only needed rows are kept
+    :param cc_file: TIFF image (not loaded)
+    :type cc_file: Image
+    :param boxes: boxes (left, top, right, bottom) to read
+    :type boxes: list
+    :param step: read every step-th row and column of boxes
+    :type step: int
+    :return: pixels (height, width, channels) for every box and maximum
+             value of channel, None when layout of file isn't supported
+             or some pixels of boxes are missing (truncated file)
+    :rtype: list, int
+    """
+    if cc_file.format != "TIFF":
+        return None
+
+    tags = cc_file.tag_v2
+    width, height = cc_file.size
+    spp = tags.get(277, 1)
+    bps = set(tags.get(258, (1,)))
+    compression = tags.get(259, 1)
+    # Gray (BlackIsZero) or RGB, besides extra samples (alpha)
+    colors = {1: 1, 2: 3}.get(tags.get(262))
+
+    if (tags.get(284, 1) != 1 or compression not in TIFF_DEFLATE + (1,)
+            or bps not in ({8}, {16})
+            or colors != spp - len(tags.get(338, ()))):
+        return None
+
+    if 322 in tags:
+        chunk_w, chunk_h = tags[322], tags[323]
+        offsets, counts = tags[324], tags[325]
     else:
-        init_data.append("-")
+        chunk_w, chunk_h = width, min(tags.get(278, height), height)
+        offsets, counts = tags[273], tags[279]
+    if isinstance(offsets, int):
+        offsets, counts = (offsets,), (counts,)
 
-    # Color accuracy test
-    if cacc <= 4:
-        init_data.append(4)
-    elif cacc <= 7:
-        init_data.append(3)
-    elif cacc <= 10:
-        init_data.append(2)
-    elif cacc <= 13:
-        init_data.append(1)
+    bits = bps.pop()
+    endian = "<" if tags.prefix == b"II" else ">"
+    dtype = numpy.dtype(f"{endian}u{bits // 8}")
+    native = dtype.newbyteorder("=")
+    row_bytes = chunk_w * spp * dtype.itemsize
+    across = -(-width // chunk_w)
+
+    outputs = [numpy.empty((len(range(top, bottom, step)),
+                            len(range(left, right, step)), spp),
+                           dtype=native)
+               for left, top, right, bottom in boxes]
+    # Pixels written to outputs, rows of strips and tiles can be missing
+    filled = [0] * len(boxes)
+
+    raw = None
+    if compression == 1:
+        raw = numpy.memmap(cc_file.filename, dtype=numpy.uint8, mode="r")
+
+    with open(cc_file.filename, "rb") as fp:
+        for index, (offset, count) in enumerate(zip(offsets, counts)):
+            c_left = index % across * chunk_w
+            c_top = index // across * chunk_h
+            c_right = min(c_left + chunk_w, width)
+            c_bottom = min(c_top + chunk_h, height)
+
+            hits = [(number, box, out) for number, (box, out)
+                    in enumerate(zip(boxes, outputs))
+                    if box[0] < c_right and box[2] > c_left
+                    and box[1] < c_bottom and box[3] > c_top]
+            if not hits:
+                continue
+
+            # Rows of chunk needed by any box
+            needed = sorted({y - c_top for _, box, _ in hits
+                             for y in range(box[1], box[3], step)
+                             if c_top <= y < c_bottom})
+            if not needed:
+                continue
+
+            if raw is not None:
+                rows = ((row, raw[offset + row * row_bytes:
+                                  offset + (row + 1) * row_bytes])
+                        for row in needed if (row + 1) * row_bytes <= count)
+            else:
+                rows = iter_deflate_rows(fp, offset, count, row_bytes,
+                                         needed)
+
+            for row, data in rows:
+                row_pixels = data.view(dtype).reshape(chunk_w, spp)
+                row_pixels = row_pixels.astype(native)
+                if tags.get(317, 1) == 2:
+                    row_pixels = numpy.cumsum(row_pixels, axis=0,
+                                              dtype=native)
+                y = c_top + row
+                for number, (left, top, right, bottom), out in hits:
+                    if not top <= y < bottom or (y - top) % step:
+                        continue
+                    # First column of box inside of chunk on step grid
+                    x_start = max(left, c_left)
+                    x_start += (left - x_start) % step
+                    x_end = min(right, c_right)
+                    columns = row_pixels[x_start - c_left:x_end - c_left:step]
+                    out[(y - top) // step,
+                        (x_start - left) // step:
+                        (x_end - left + step - 1) // step] = columns
+                    filled[number] += len(columns)
+
+    if any(count != out.shape[0] * out.shape[1]
+           for count, out in zip(filled, outputs)):
+        return None
+
+    return outputs, 2 ** bits - 1
+
+
+def get_proof_regions(cc_file: Image, proof_size: int) -> tuple:
+    """ Read every n-th row and column of TIFF for proof without
+    decoding whole image
+    :param cc_file: Image to analyze
+    :type cc_file: Image
+    :param proof_size: longer side of proof image, 0 for full size
+    :type proof_size: int
+    :return: pixels, maximum value of channel and their scale
+             (pixels are None when file can't be read by regions)
+    :rtype: numpy.ndarray, int, float
+    """
+    width, height = cc_file.size
+    step = 1
+    if 0 < proof_size < max(width, height):
+        # Down to proof size, like in draw_proof
+        step = max(int(max(width, height) / proof_size), 1)
+
+    regions = read_tiff_regions(cc_file, [(0, 0, width, height)], step)
+    if regions is None:
+        return None, None, 1.0
+
+    return regions[0][0], regions[1], 1 / step
+
+
+def get_block_lightness(cc_file: Image, threads=None) -> numpy.ndarray:
+    """ Reduce flat field to L* of mean color of square blocks, every
+    row of blocks is read (strips or tiles of TIFF like region sampler)
+    and reduced in its own task, so only rows of running threads are
+    in memory, other files are decoded whole
+    :param cc_file: Image to analyze
+    :type cc_file: Image
+    :param threads: number of threads, number of CPUs when None
+    :type threads: int
+    :return: L* of blocks
+    :rtype: numpy.ndarray (rows, columns)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    width, height = cc_file.size
+    block = -(-max(width, height) // FLAT_BLOCKS)
+    lefts = numpy.arange(0, width, block)
+    # Blocks on right and bottom edge may be smaller
+    widths = numpy.diff(numpy.append(lefts, width))
+
+    cc_array = None
+    regions = read_tiff_regions(cc_file, [])
+    if regions is None:
+        cc_array, max_value = get_image_array(cc_file)
     else:
-        init_data.append("-")
+        max_value = regions[1]
 
-    # STAR = "★"   # ALT+9733
-    STAR = "*"
-    final_stars = [f"{x * STAR:10}"
-                   if isinstance(x, int) else f"{x:10}" for x in init_data]
+    def reduce_row(top: int) -> numpy.ndarray:
+        bottom = min(top + block, height)
+        if cc_array is None:
+            band = read_tiff_regions(cc_file, [(0, top, width, bottom)])
+            if band is None:
+                # Like full decode of truncated file
+                raise OSError(f"{cc_file.filename} is truncated")
+            band = band[0][0]
+        else:
+            band = cc_array[top:bottom]
+        # Sums of columns first, then of blocks
+        sums = numpy.add.reduceat(band.sum(axis=0, dtype=numpy.float64),
+                                  lefts, axis=0)
+        return sums / (widths * (bottom - top))[:, numpy.newaxis]
 
-    Stars = namedtuple('Stars', 'de, ft, bd, icc, cm, tone, wb, lu, ca')
+    with ThreadPoolExecutor(max_workers=threads
+                            or os.cpu_count()) as executor:
+        means = numpy.stack(list(executor.map(reduce_row,
+                                              range(0, height, block))))
 
-    fadgi = Stars._make(final_stars)
+    if means.shape[-1] == 1:
+        means = means.repeat(3, axis=-1)
+    # Same scale as mean of probe
+    rgb = means[..., :3] * 65535 / max_value / 65536
 
-    return fadgi
+    return rgb_to_lab_array(rgb)[:, 0].reshape(means.shape[:2])
 
 
-def get_tone_wb(tested: dict, reference: dict) -> tuple:
-    """Get tone response for CC as defined in FADGI:
-    Tone response dL2k for any given gray patch.
-    :param tested: Values for patches in tested file
-    :type tested: dict
-    :param reference: Values for patches in reference file
-    :type reference: dict
-    :return: max absolute difference in gray patches in L channel
-             and difference in colors
-    :rtype: Tuple(float, float)
+def iter_deflate_rows(fp, offset, count, row_bytes, needed):
+    """ Decompress deflate strip or tile in blocks and give only needed
+    rows, stops after last of them
+    :param fp: opened TIFF file
+    :type fp: file
+    :param offset: offset of compressed data
+    :type offset: int
+    :param count: size of compressed data
+    :type count: int
+    :param row_bytes: size of decompressed row
+    :type row_bytes: int
+    :param needed: sorted numbers of rows in strip or tile
+    :type needed: list
+    :return: number and data of row
+    :rtype: Iterator[tuple]
     """
-    tone_response: list = []
-    white_balance: list = []
+    decompressor = zlib.decompressobj()
+    fp.seek(offset)
+    remaining = count
+    buffer = bytearray()
+    # Number of first row in buffer
+    row = 0
 
-    for patch_name in cc_graylist:
-        # test tone response
-        test = tested[patch_name].lab_l
-        ref = reference[patch_name].lab_l
-        tone_response.append(abs(test - ref))
-        # test white balance
-        point_gray = delta_e_calc(tested[patch_name], reference[patch_name])
-        white_balance.append(point_gray)
+    for next_row in needed:
+        while (next_row - row + 1) * row_bytes > len(buffer):
+            # Drop rows before next needed one to keep buffer small
+            drop = min(next_row - row, len(buffer) // row_bytes)
+            del buffer[:drop * row_bytes]
+            row += drop
 
-    return max(tone_response), max(white_balance)
+            if decompressor.unconsumed_tail:
+                block = decompressor.unconsumed_tail
+            elif remaining:
+                block = fp.read(min(TIFF_READ_BLOCK, remaining))
+                remaining -= len(block)
+            else:
+                return
+            buffer += decompressor.decompress(block, TIFF_READ_BLOCK * 4)
 
+        start = (next_row - row) * row_bytes
+        yield next_row, numpy.frombuffer(bytes(buffer[start:start
+                                                      + row_bytes]),
+                                         dtype=numpy.uint8)
 
-def get_ligthness_uniformity(lab_values: dict, de_values: list) -> float:
-    """ Get lightness uniformity - standard deviation of dE / mean L*
-    :param lab_values: Values of patches
-    :type lab_values: dict
-    :param de_values: dE values for all patches
-    :type de_values: list
-    :return: Ligthness uniformity number
-    :rtype: float
+
+def get_image_array(cc_file: Image, frame=0) -> tuple:
+    """ Decode frame of image once for sampling of all patches
+    :param cc_file: Image to decode
+    :type cc_file: Image
+    :param frame: frame (page) of image, first by default
+    :type frame: int
+    :return: pixels (height, width, channels) and maximum value
+             of channel
+    :rtype: numpy.ndarray, int
     """
-    de_standard_deviation = stdev(de_values)
-    l_values = [x.lab_l for x in lab_values.values()]
-    l_mean = sum(l_values) / len(l_values)
+    cc_file.seek(frame)
 
-    return de_standard_deviation / l_mean
+    with trace_stage("decode"):
+        # Pillow keeps only 8 bits from 16-bit RGB TIFF, read them
+        if cc_file.format == "TIFF" \
+                and max(cc_file.tag_v2.get(258, (8,))) > 8:
+            cc_array = read_tiff16(cc_file)
+            if cc_array is not None:
+                return cc_array, 65535
 
+        if cc_file.mode in ("I;16", "I;16B", "I;16L"):
+            return numpy.asarray(cc_file)[..., numpy.newaxis], 65535
 
-def get_color_accuracy(de: list) -> float:
-    """ Get 90th percentile color accuracy of all patches
-    :param de: list of deltae of all patches
-    :type de: list
-    :return: color accuracy
-    :rtype: float
+        # Pillow keeps only high bytes of 16-bit RGB PNG
+        if cc_file.format == "PNG" and ";16" in str(cc_file.tile):
+            cc_array = read_png16(cc_file)
+            if cc_array is not None:
+                return cc_array, 65535
+            print(f"Warning: {cc_file.filename} decoded with 8-bit "
+                  "precision")
+
+        if cc_file.mode == "L":
+            return numpy.asarray(cc_file)[..., numpy.newaxis], 255
+        if cc_file.mode != "RGB":
+            cc_file = cc_file.convert("RGB")
+
+        return numpy.asarray(cc_file), 255
+
+
+def read_png16(cc_file: Image):
+    """ Read 16-bit PNG with full precision
+    :param cc_file: Image to decode
+    :type cc_file: Image
+    :return: pixels (height, width, 3) or None when layout of file
+             isn't supported
+    :rtype: numpy.ndarray
+
+    Pillow unfilters rows of 16-bit samples and unpacks their high
+    (big endian) bytes, second decode of the same data unpacked as
+    little endian gives low bytes.
     """
-    color_accuracy = quantiles(de, n=10)[-1]
-    return color_accuracy
+    from PIL import Image
 
+    tile = cc_file.tile[0]
+    if cc_file.tell() or len(cc_file.tile) != 1 \
+            or not isinstance(tile.args, str) \
+            or not tile.args.endswith(";16B"):
+        return None
 
-def get_patch_value(pname, cc_file: Image):
-    """ Get Lab values from single patch
-    :param pname: name of patch in range of A1 - F4
-    :type pname: str
-    :param cc_file: Image to analyze
+    halves = []
+    for rawmode in (tile.args, tile.args[:-1] + "L"):
+        with Image.open(cc_file.filename) as png:
+            png.tile = [tile._replace(args=rawmode)]
+            try:
+                png.load()
+            except (OSError, ValueError):
+                return None
+            halves.append(numpy.asarray(png.convert("RGB")))
+
+    return halves[0].astype(numpy.uint16) << 8 | halves[1]
+
+
+def read_tiff16(cc_file: Image):
+    """ Read 16-bit TIFF with full precision
+    :param cc_file: Image to decode
     :type cc_file: Image
-    :return: analyzed patch name, color values, coords (upper-left)
-    :rtype: str, tuple
+    :return: pixels (height, width, channels) or None when layout of
+             file isn't supported
+    :rtype: numpy.ndarray
+
+    Handles uncompressed and deflate strips and tiles (with horizontal
+    predictor), other compressions go through tifffile when installed.
     """
-    cc_width, cc_height = cc_file.size
+    tags = cc_file.tag_v2
+    width, height = cc_file.size
+    spp = tags.get(277, 1)
+    compression = tags.get(259, 1)
 
-    # We have to 'rotate' values to get proper patch positions for
-    # W (270), E (90) positions
-    if cc_rotation in (270, 90):
-        cc_height, cc_width = cc_width, cc_height
+    if (tags.get(284, 1) != 1 or compression not in TIFF_DEFLATE + (1,)
+            or set(tags.get(258)) != {16}):
+        try:
+            import tifffile
+        except ImportError:
+            print(f"Warning: {cc_file.filename} decoded with "
+                  "8-bit precision (install tifffile)")
+            return None
+        cc_array = tifffile.imread(cc_file.filename, key=cc_file.tell())
+        if cc_array.ndim == 2:
+            cc_array = cc_array[..., numpy.newaxis]
+        return cc_array[..., :3]
 
-    # Calculate size of square to get color depending on size of
-    # checker image bigger is better because we need more precise
-    # approximation. Also bigger is more risk to not fit into
-    # real square.
-    patch_size = round(cc_width * cc_ps / 2)
-    patch_size = min(patch_size, 25)
-    patch_side = patch_size * 2
-    # Extract middle of the patch
-    cc_x = cc_coords[pname][0]
-    cc_y = cc_coords[pname][1]
-    # Create coords for magick extraction
-    p_x = round((cc_width * cc_x / 100) - patch_size)
-    p_y = round((cc_height * cc_y / 100) - patch_size)
-    # Magick command:
-    #   extract patch, with size of {patch_side}
-    #   resize it to 1x1 to get mean color
-    #   and get text for values
-    magic_string = (f"magick -quiet {re.escape(cc_file.filename)}[0] "
-                    f"-rotate {cc_rotation} "
-                    f"-crop {patch_side}x{patch_side}+{p_x}+{p_y} "
-                    "-resize 1x1 "
-                    "-colorspace RGB "
-                    "-depth 16 -colorspace sRGB txt:")
-    p_text = os.popen(magic_string).read()
-    # Proper way to get appropriate Lab values:
-    # one pixel 0-1 values in RGB and later using colormath python:
-    # Extract RGB values from magick string and convert them to 0-1 scale
-    p_rgb = re.findall(r"0,0: \((.*)\) ", p_text)[0]
-    rgb_full_scale = p_rgb.split(",")[:3]
-    # I am dealing with 16-bit values
-    rgb_r, rgb_g, rgb_b = (float(x) / 65536 for x in rgb_full_scale)
+    if 322 in tags:
+        chunk_w, chunk_h = tags[322], tags[323]
+        offsets, counts = tags[324], tags[325]
+    else:
+        chunk_w, chunk_h = width, min(tags.get(278, height), height)
+        offsets, counts = tags[273], tags[279]
+    if isinstance(offsets, int):
+        offsets, counts = (offsets,), (counts,)
+
+    dtype = numpy.dtype("<u2" if tags.prefix == b"II" else ">u2")
+    across = -(-width // chunk_w)
+    cc_array = numpy.empty((height, width, spp), dtype=numpy.uint16)
+
+    with open(cc_file.filename, "rb") as fp:
+        for index, (offset, count) in enumerate(zip(offsets, counts)):
+            fp.seek(offset)
+            data = fp.read(count)
+            if compression != 1:
+                data = zlib.decompress(data)
+            chunk = numpy.frombuffer(data, numpy.uint8)
+            chunk = chunk[:chunk.size // (chunk_w * spp * 2)
+                          * chunk_w * spp * 2].view(dtype)
+            chunk = chunk.reshape(-1, chunk_w, spp).astype(numpy.uint16,
+                                                            copy=False)
+            if tags.get(317, 1) == 2:
+                chunk = numpy.cumsum(chunk, axis=1, dtype=numpy.uint16)
+            top = index // across * chunk_h
+            left = index % across * chunk_w
+            rows = min(chunk_h, height - top)
+            cols = min(chunk_w, width - left)
+            if chunk.shape[0] < rows:
+                raise OSError(f"image file {cc_file.filename} is "
+                              "truncated")
+            cc_array[top:top + rows, left:left + cols] = chunk[:rows, :cols]
+
+    return cc_array[..., :3]
+
+
+def collect_files(paths: list, files_from=None) -> list:
+    """Expand directories and globs into list of files to test
+    :param paths: files, directories or globs from CLI
+    :type paths: list
+    :param files_from: file with list of files, one per line
+    :type files_from: str
+    :return: files to test in order of arguments
+    :rtype: list
+    """
+    paths = list(paths)
+    if files_from:
+        with open(files_from, encoding="utf-8") as ff:
+            paths += [line.strip() for line in ff if line.strip()]
+
+    def is_capture(fn):
+        # Skip reports, proofs and traces written by previous runs
+        return (fn.endswith(text_extensions + image_extensions)
+                and not fn.endswith(REPORT_SUFFIXES))
+
+    testfiles = []
+    for path in paths:
+        if os.path.isdir(path):
+            testfiles += sorted(os.path.join(path, fn)
+                                for fn in os.listdir(path)
+                                if is_capture(fn))
+        elif glob.has_magic(path) and not os.path.exists(path):
+            testfiles += sorted(fn for fn in glob.glob(path)
+                                if is_capture(fn))
+        else:
+            testfiles.append(path)
+
+    return testfiles
+
+
+def analyze_file(fname: str, settings: Settings, threads=None,
+                 export=None) -> tuple:
+    """Calculate deltae for one file of batch, error doesn't stop batch
+    :param fname: file name
+    :type fname: str
+    :param settings: options of analysis
+    :type settings: Settings
+    :param threads: number of threads reducing blocks of flat field
+    :type threads: int
+    :param export: export where rows are added as captures come (rows
+                   added before error stay there), without it rows are
+                   returned (worker process)
+    :type export: ResultExport
+    :return: file name, deltae or non-uniformity of flat field (None
+             in case of error), error message, stages of trace (None
+             when tracing is off) and rows for export (None without
+             export or with export given)
+    :rtype: tuple
+    """
+    trace = deltae = error = None
+    rows = [] if settings.export and export is None else None
+    try:
+        with trace_file(fname, settings) as trace:
+            if fname.endswith(image_extensions) and settings.flat_field:
+                deltae = analyze_flat_field(fname, settings,
+                                            threads).non_uniformity
+            elif fname.endswith(text_extensions + image_extensions):
+                if fname.endswith(text_extensions):
+                    results = iter_text_results(fname, settings)
+                else:
+                    results = [analyze_image(fname, settings)]
+                # Mean of all captures in file, captures aren't kept
+                total, count = 0.0, 0
+                for result in results:
+                    total += result.deltae
+                    count += 1
+                    if export is not None:
+                        export.add([get_export_rows(result, settings)])
+                    elif rows is not None:
+                        rows.append(get_export_rows(result, settings))
+                if not count:
+                    raise SystemExit("something wrong with file, "
+                                     "didn't get patches.")
+                deltae = total / count
+            else:
+                raise SystemExit(f"don't recognize extension of {fname}")
+    except (Exception, SystemExit) as exception:
+        deltae, error = None, f"{type(exception).__name__}: {exception}"
+        rows = None
+
+    return fname, deltae, error, trace and trace.stages, rows
+
+
+def run_batch(testfiles: list, jobs: int, settings: Settings):
+    """Calculate deltae for all files in worker processes and print
+    results in order of files, errors and throughput
+    :param testfiles: files to test
+    :type testfiles: list
+    :param jobs: number of worker processes
+    :type jobs: int
+    :param settings: options of analysis
+    :type settings: Settings
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Traces of files merged and rows exported as they come
+    summary = Trace() if settings.trace else None
+    export = ResultExport(settings.export) if settings.export else None
+    batch_start = time.perf_counter()
+
+    if jobs > 1:
+        # CPUs shared by threads of flat field in every worker
+        threads = max(os.cpu_count() // jobs, 1)
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            # With export text files are analyzed here, their rows go
+            # to export as captures come instead of all at once from
+            # worker
+            futures = [None if export is not None
+                       and fname.endswith(text_extensions)
+                       else executor.submit(analyze_file, fname, settings,
+                                            threads)
+                       for fname in testfiles]
+            results = (analyze_file(fname, settings, export=export)
+                       if future is None else future.result()
+                       for fname, future in zip(testfiles, futures))
+            errors = print_batch_results(results, settings.flat_field,
+                                         summary, export)
+    else:
+        errors = print_batch_results((analyze_file(fname, settings,
+                                                   export=export)
+                                      for fname in testfiles),
+                                     settings.flat_field, summary, export)
+    if export is not None:
+        export.close()
+
+    batch_time = time.perf_counter() - batch_start
+
+    if errors:
+        print(f"\nErrors ({len(errors)}):")
+        for fname, error in errors:
+            print(f"{fname}: {error}")
 
-    lab_color = convert_color(AdobeRGBColor(rgb_r, rgb_g, rgb_b), LabColor,
-                              target_illuminant="d50")
+    print(f"\n{len(testfiles)} files in {batch_time:.2f} s "
+          f"({len(testfiles) / batch_time:.2f} files/s), "
+          f"{len(errors)} errors, {jobs} jobs")
 
-    lab_tuple = (lab_color.lab_l, lab_color.lab_a, lab_color.lab_b)
+    if summary is not None:
+        directory = os.path.commonpath([os.path.dirname(os.path.abspath(
+            fname)) for fname in testfiles])
+        write_trace_summary(summary, len(testfiles), directory,
+                            batch_seconds=round(batch_time, 6), jobs=jobs)
 
-    checker_values[pname] = Patch(*lab_tuple,
-                                  rgb_r, rgb_g, rgb_b,
-                                  p_x, p_y,
-                                  patch_side)
 
-    return pname, lab_tuple
+def print_text_results(results):
+    """Print deltae of text file as captures come, with capture id and
+    target type when file has more captures
+    :param results: results of captures
+    :type results: Iterator[TextResult]
+    """
+    first = next(results, None)
+    if first is None:
+        raise SystemExit("something wrong with file, didn't get patches.")
+    second = next(results, None)
+    if second is None:
+        print(f"dE: {first.deltae:.3f}")
+        return
+
+    for result in itertools.chain((first, second), results):
+        print(f"{result.capture} ({result.target}): "
+              f"dE {result.deltae:.3f}")
+
+
+def print_batch_results(results, flat_field=False, summary=None,
+                        export=None) -> list:
+    """Print results of batch as they come
+    :param results: file name, deltae, error message, stages of trace
+                    and rows for export for every file
+    :type results: iterable
+    :param flat_field: results are non-uniformity of flat fields
+    :type flat_field: bool
+    :param summary: trace where stages of files are added, None when
+                    tracing is off
+    :type summary: Trace
+    :param export: export where rows of files are added, None without
+                   export
+    :type export: ResultExport
+    :return: file names and messages of failed files
+    :rtype: list
+    """
+    errors = []
+    for fname, deltae, error, stages, rows in results:
+        if summary is not None and stages:
+            summary.merge(stages)
+        if export is not None and rows:
+            export.add(rows)
+        if error:
+            errors.append((fname, error))
+            print(f"{fname}: error")
+        elif flat_field and not fname.endswith(text_extensions):
+            print(f"{fname}: non-uniformity {deltae:.3%}")
+        else:
+            print(f"{fname}: dE {deltae:.3f}")
+
+    return errors
+
+
+def warm_up(settings: Settings):
+    """Prepare everything what doesn't depend on image before first
+    file comes: Pillow plugins, conversion matrices, fonts of proof,
+    exiftool session and cache
+    :param settings: options of analysis
+    :type settings: Settings
+    """
+    from PIL import Image
+
+    Image.init()
+    get_conversion_matrices()
+    get_proof_font(30)
+    get_proof_font(40)
+    if settings.flat_field:
+        get_proof_font(FLAT_HEAT_CELL // 4)
+        get_proof_font(20)
+    if settings.metadata == "session":
+        get_exiftool_session()
+    if settings.cache:
+        get_result_cache(settings)
+
+
+def watch_folder(folder: str, settings: Settings, settle=0.5):
+    """Analyze images which land in folder until interrupted, file is
+    analyzed when its size and time of modification didn't change for
+    settle seconds, files with up to date report are skipped
+    :param folder: watched folder
+    :type folder: str
+    :param settings: options of analysis
+    :type settings: Settings
+    :param settle: seconds without change of file before analysis
+    :type settle: float
+    """
+    warm_up(settings)
+    print(f"Watching {folder} (Ctrl-C to stop)")
+
+    # Signature of file (size, mtime) when it was analyzed or seen first
+    # with its current signature
+    done = {}
+    pending = {}
+    analyzed = 0
+    summary = Trace() if settings.trace else None
+    export = ResultExport(settings.export) if settings.export else None
+    try:
+        while True:
+            now = time.monotonic()
+            for entry in os.scandir(folder):
+                if not entry.name.endswith(image_extensions) \
+                        or entry.name.endswith(REPORT_SUFFIXES) \
+                        or not entry.is_file():
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                signature = (stat.st_size, stat.st_mtime_ns)
+                if done.get(entry.path) == signature:
+                    continue
+                if pending.get(entry.path, (None,))[0] != signature:
+                    pending[entry.path] = (signature, now)
+                    continue
+                if now - pending[entry.path][1] < settle:
+                    continue
+
+                # Latency is counted from last change seen, not from
+                # start of analysis, so it includes settle time
+                changed = pending.pop(entry.path)[1]
+                done[entry.path] = signature
+                # Report written after last change of image
+                report = f"{entry.path}.txt"
+                if os.path.exists(report) \
+                        and os.stat(report).st_mtime_ns >= stat.st_mtime_ns:
+                    continue
+
+                analyzed += 1
+                trace = None
+                try:
+                    with trace_file(entry.path, settings) as trace:
+                        result = watch_file(entry.path, settings, changed)
+                    # Rows of every file are written at once
+                    if export is not None:
+                        export.add([get_export_rows(result, settings)])
+                        export.flush()
+                except (Exception, SystemExit) as error:
+                    print(f"{entry.path}: {type(error).__name__}: {error}",
+                          flush=True)
+                if trace is not None:
+                    summary.merge(trace.stages)
+
+            time.sleep(WATCH_INTERVAL)
+    except KeyboardInterrupt:
+        print(f"\n{analyzed} files analyzed")
+        if summary is not None and analyzed:
+            write_trace_summary(summary, analyzed, folder)
+    finally:
+        if export is not None:
+            export.close()
+
+
+def watch_file(fname: str, settings: Settings, changed: float):
+    """Analyze file of watched folder, verdict is printed before
+    report and proof are written, with seconds since last change of file
+    :param fname: file name
+    :type fname: str
+    :param settings: options of analysis
+    :type settings: Settings
+    :param changed: time when last change of size or time of
+                    modification of file was seen (time.monotonic)
+    :type changed: float
+    :return: results of image or flat field
+    :rtype: ImageResult or FlatFieldResult
+    """
+    if settings.flat_field:
+        result, term_string = measure_flat_field(fname, settings)
+        print(f"{fname}: non-uniformity {result.non_uniformity:.3%} "
+              f"({time.monotonic() - changed:.2f} s)", flush=True)
+        write_flat_field_report(result, term_string)
+    else:
+        result, term_string, pixels = measure_image(fname, settings)
+        print(f"{fname}: dE {result.deltae:.3f} "
+              f"({time.monotonic() - changed:.2f} s)", flush=True)
+        write_image_report(result, term_string, settings, pixels)
+
+    return result
 
 
 if __name__ == '__main__':
 
     ap = argparse.ArgumentParser(description="Test color data")
 
-    ap.add_argument("testfile", type=str,
-                    help="File to test")
+    ap.add_argument("testfile", type=str, nargs="*",
+                    help="""File to test, more files, directories
+                         or globs are tested in batch mode""")
     ap.add_argument("--checker", "-c",
                     nargs="?", default="cc24", choices=[*checker_data.keys()],
                     help="""Name of checker, supported values:
@@ -1123,14 +4667,24 @@ if __name__ == '__main__':
                          - gt10 (GoldenThread Regular),
                          - gt05 (GoldenThread Small)""")
     ap.add_argument("--orientation", "-o",
-                    nargs="?", default="S", choices=['S', 'W', 'N', 'E'],
+                    nargs="?", default="S",
+                    choices=['S', 'W', 'N', 'E', 'auto'],
                     help="""Orientation of checker:
-                         possible values are S, W, N, E (default S)
+                         possible values are S, W, N, E, auto (default S)
                          S - in case of CC family greys are at the bottom,
                              in case of GT you can read text normally,
                          W - greys are on the left,
                          N - greys are on the top,
-                         E - greys are on the left""")
+                         E - greys are on the left,
+                         auto - orientation with the lowest mean dE""")
+    ap.add_argument("--locate", "-l", action="store_true",
+                    help="""Find checker on uncropped capture (and its
+                         orientation) in downsampled copy, patches are
+                         sampled in full resolution""")
+    ap.add_argument("--flat-field", "-F", action="store_true",
+                    help="""Measure illumination of flat field (grey card
+                         or white board filling frame) by L* of blocks
+                         instead of checker, heatmap {file}_ff.jpg""")
     ap.add_argument("--deltae", "-d", type=str,
                     nargs="?", default="2k", choices=['2k', '76'],
                     help="""DeltaE difference according to:
@@ -1142,33 +4696,124 @@ if __name__ == '__main__':
                     help="""File with coordinates of fields in
                          percentages of file (must be in tune
                          with color data)""")
+    ap.add_argument("--sampler", "-s", type=str,
+                    nargs="?", default="pillow",
+                    choices=['pillow', 'region', 'magick'],
+                    help="""How to get values of patches from image:
+                         - pillow (default) decode file once in process
+                         - region read only strips or tiles of TIFF
+                           (uncompressed or deflate) covering patches
+                         - magick one ImageMagick process per patch""")
+    ap.add_argument("--compare-sampling", action="store_true",
+                    help="""Sample patches with both samplers and report
+                         time and difference of values""")
+
+    ap.add_argument("--reduced-decode", action="store_true",
+                    help="""Decode image in smallest scale which still
+                         gives full sized probes: JPEG draft (1/2, 1/4,
+                         1/8) or reduced page of pyramidal TIFF""")
+    ap.add_argument("--reduced-tolerance", type=float, default=None,
+                    help="""With --reduced-decode sample also full
+                         resolution and warn when dE between them is
+                         bigger (default 0.5 with --compare-sampling)""")
+    ap.add_argument("--proof-size", type=int, default=3000,
+                    help="""Maximum width or height of proof image
+                         {file}_de.jpg in pixels (default 3000),
+                         0 for size of tested image""")
+    ap.add_argument("--metadata", "-m", type=str,
+                    nargs="?", default="session",
+                    choices=['session', 'exiftool', 'pillow'],
+                    help="""How to read metadata of images:
+                         - session (default) one exiftool process
+                           (-stay_open) for all files,
+                         - exiftool new exiftool process for every file,
+                         - pillow in process without exiftool""")
+    ap.add_argument("--no-cache", action="store_true",
+                    help=f"""Analyze images again, don't use cached results
+                         (cache: {CACHE_FILE})""")
+    ap.add_argument("--cache-size", type=float, default=256,
+                    help="""Maximum size of cache in MB, least recently
+                         used results are removed (default 256)""")
+    ap.add_argument("--watch", "-w", type=str,
+                    help="""Folder to watch, new images are analyzed
+                         when they are written, until Ctrl-C""")
+    ap.add_argument("--settle", type=float, default=0.5,
+                    help="""Seconds without change of file in watched
+                         folder before analysis (default 0.5)""")
+    ap.add_argument("--files-from", "-f", required=False, type=str,
+                    help="""File with list of files to test,
+                         one per line""")
+    ap.add_argument("--jobs", "-j", type=int, default=os.cpu_count(),
+                    help="""Number of worker processes in batch mode
+                         (default number of CPUs)""")
+    ap.add_argument("--export", "-e", type=str, metavar="DIR",
+                    help="""Append results as rows to DIR/captures.csv
+                         (metadata, parameters and stars of capture) and
+                         DIR/patches.csv (Lab, RGB, dE of patches), with
+                         pyarrow also to Parquet in DIR/captures/ and
+                         DIR/patches/""")
+    ap.add_argument("--trace", action="store_true",
+                    default=os.environ.get(TRACE_ENV, "0") not in ("", "0"),
+                    help=f"""Write wall time and calls of stages and
+                         subprocesses to {{file}}{TRACE_SUFFIX}, summary
+                         of batch to {TRACE_SUMMARY} (also when
+                         {TRACE_ENV}=1)""")
 
     args = ap.parse_args()
+    analysis_settings = get_settings(args.checker, args.orientation,
+                                     args.deltae, args.color, args.sampler,
+                                     args.compare_sampling,
+                                     args.reduced_decode,
+                                     args.reduced_tolerance,
+                                     args.proof_size, args.metadata, True,
+                                     None if args.no_cache else CACHE_FILE,
+                                     args.cache_size, args.locate,
+                                     args.flat_field, args.trace,
+                                     args.export)
 
-    # All values for checker go here
-    checker_values: dict = {}
+    if args.export and args.flat_field:
+        ap.error("--export is not available for --flat-field")
+    if args.sampler == "magick":
+        import shutil
 
-    # Rotate checker to make sure we have it in proper orientation
-    # With S - everythin is OK, with W bottom is on the left and we have
-    # to rotate it 270 degrees, with N bottom is on top, etc.
-    cc_rotation_values = {'S': 0, 'W': 270, 'N': 180, 'E': 90}
-    cc_rotation = cc_rotation_values[args.orientation]
+        if shutil.which("magick") is None:
+            ap.error("--sampler magick needs ImageMagick (magick)")
 
-    # Get data for particular color checker
-    cc_colors, cc_coords, cc_graylist, cc_ps = load_checker_data(args.checker)
-    cc_name = args.checker
+    if args.watch:
+        watch_folder(args.watch, analysis_settings, args.settle)
+        raise SystemExit()
 
-    # Fill color data
-    cc_values = process_color_data(args.color)
+    testfiles = collect_files(args.testfile, args.files_from)
 
-    try:
-        DELTAEFILE = args.testfile
-    except IndexError as ede:
-        raise SystemExit('usage: cvs file from deltae required') from ede
-
-    if DELTAEFILE.endswith(text_extensions):
-        calculate_from_text(DELTAEFILE)
-    elif DELTAEFILE.endswith(image_extensions):
-        calculate_from_image(DELTAEFILE)
+    if not testfiles:
+        ap.error("no files to test")
+
+    if testfiles == args.testfile and len(testfiles) == 1:
+        DELTAEFILE = testfiles[0]
+
+        if not DELTAEFILE.endswith(text_extensions + image_extensions):
+            raise SystemExit(f'usage: don\'t recognize extension of '
+                             f'{DELTAEFILE}')
+
+        export = ResultExport(args.export) if args.export else None
+        with trace_file(DELTAEFILE, analysis_settings):
+            if DELTAEFILE.endswith(text_extensions):
+                # Captures are printed and exported as they come
+                results = iter_text_results(DELTAEFILE, analysis_settings)
+                if export is not None:
+                    results = export.iter_added(results, analysis_settings)
+                print_text_results(results)
+            elif args.flat_field:
+                analyze_flat_field(DELTAEFILE, analysis_settings)
+            else:
+                try:
+                    result = analyze_image(DELTAEFILE, analysis_settings)
+                except CheckerNotFound as error:
+                    raise SystemExit(error) from None
+                if export is not None:
+                    export.add([get_export_rows(result, analysis_settings)])
+
+        if export is not None:
+            export.close()
     else:
-        raise SystemExit(f'usage: don\'t recognize extension of {DELTAEFILE}')
+        run_batch(testfiles, args.jobs, analysis_settings)
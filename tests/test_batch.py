@@ -0,0 +1,34 @@
+""" Batch of directories and globs tests only captures, not reports,
+proofs and traces of previous runs."""
+import os
+import sys
+import subprocess
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+import synthetic  # noqa: E402
+
+deltae = synthetic.deltae
+DELTAE = os.path.join(synthetic.DELTAE_DIR, "deltae.py")
+
+
+def test_glob_twice(tmp_path):
+    for orientation in ("S", "W"):
+        synthetic.generate(str(tmp_path), "cc24", orientation, megapixels=1)
+    pattern = str(tmp_path / "cc24_*")
+    captures = deltae.collect_files([pattern])
+    assert len(captures) == 2
+
+    for _ in range(2):
+        result = subprocess.run([sys.executable, DELTAE, pattern,
+                                 "--orientation", "auto", "--metadata",
+                                 "pillow", "--trace"],
+                                capture_output=True, text=True)
+        assert result.returncode == 0, result.stdout + result.stderr
+        assert ": error" not in result.stdout
+        assert deltae.collect_files([pattern]) == captures
+
+    written = sorted(os.listdir(tmp_path))
+    assert not [fn for fn in written if fn.endswith("_de.jpg_de.jpg")]
+    assert len(written) == 2 * 4 + 1
@@ -0,0 +1,35 @@
+""" Boxes of patches in orientation of file cover the same pixels as
+probes cropped from file rotated to S orientation (magick -rotate
+and -crop)."""
+import os
+import sys
+
+import numpy
+import pytest
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+import synthetic  # noqa: E402
+
+deltae = synthetic.deltae
+
+
+@pytest.mark.parametrize("size", ((1001, 667), (667, 1001), (333, 221),
+                                  (45, 31)))
+@pytest.mark.parametrize("rotation", (0, 90, 180, 270))
+@pytest.mark.parametrize("checker", list(deltae.checker_data))
+def test_boxes_like_rotate_crop(checker, rotation, size):
+    width, height = size
+    # Every pixel has its own value
+    pixels = numpy.arange(width * height).reshape(height, width)
+    # Clockwise like magick -rotate
+    rotated = numpy.rot90(pixels, -rotation // 90)
+
+    probes, boxes = deltae.get_checker_boxes(checker, width, height,
+                                             rotation)
+    for (p_x, p_y, side), (left, top, right, bottom) in zip(probes, boxes):
+        # -crop clips probe to image
+        crop = rotated[max(p_y, 0):p_y + side, max(p_x, 0):p_x + side]
+        box = numpy.rot90(pixels[top:bottom, left:right], -rotation // 90)
+        assert numpy.array_equal(box, crop)
@@ -0,0 +1,82 @@
+""" Cache of results is found by content of file, not its name, depends
+on options of analysis and keeps only recently used results."""
+import os
+import sys
+import itertools
+
+import numpy
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+import synthetic  # noqa: E402
+
+deltae = synthetic.deltae
+
+
+def get_settings(tmp_path, **options):
+    return deltae.get_settings(metadata="pillow", write_report=False,
+                               cache=str(tmp_path / "cache.sqlite"),
+                               **options)
+
+
+def test_hit_after_rename(tmp_path, monkeypatch):
+    fname = synthetic.generate(str(tmp_path), "cc24", megapixels=1,
+                               noise=0.02)["file"]
+    settings = get_settings(tmp_path)
+    monkeypatch.setattr(deltae, "result_cache", None)
+    first = deltae.analyze_image(fname, settings)
+
+    renamed = str(tmp_path / "renamed.tif")
+    os.rename(fname, renamed)
+
+    def sample_image(*_):
+        raise AssertionError("cached file is sampled")
+    monkeypatch.setattr(deltae, "sample_image", sample_image)
+    second = deltae.analyze_image(renamed, settings)
+    assert second.filename == renamed
+    assert second.deltae == first.deltae
+    assert (second.patches == first.patches).all()
+
+
+def test_key_of_settings(tmp_path):
+    fname = synthetic.generate(str(tmp_path), "cc24", megapixels=1)["file"]
+    key = deltae.get_cache_key(fname, get_settings(tmp_path))
+    assert deltae.get_cache_key(fname, get_settings(tmp_path)) == key
+
+    keys = {deltae.get_cache_key(fname, get_settings(tmp_path, **options))
+            for options in ({"deltae": "76"}, {"sampler": "region"},
+                            {"orientation": "W"}, {"locate": True},
+                            {"reduced_decode": True})}
+    assert key not in keys and len(keys) == 5
+
+
+def test_least_recently_used(tmp_path, monkeypatch):
+    # Every use is later than previous one
+    clock = itertools.count()
+    monkeypatch.setattr(deltae.time, "time", lambda: next(clock))
+
+    patches = numpy.zeros(24, dtype=deltae.PATCH_DTYPE)
+    metrics = (1.0, 0.5, 0.5, 0.1, 2.0, 0, [float("nan")] * 4 + [[]])
+    exif = deltae.Edata._make(["-"] * len(deltae.Edata._fields))
+    keys = [f"{number:064x}" for number in range(4)]
+
+    cache = deltae.ResultCache(str(tmp_path / "size.sqlite"), 2 ** 30)
+    cache.put(keys[0], patches, metrics, exif)
+    size, = cache.connection.execute("SELECT size FROM results").fetchone()
+    cache.close()
+
+    # Three results fit
+    cache = deltae.ResultCache(str(tmp_path / "cache.sqlite"), size * 3)
+    cache.put(keys[0], patches, metrics, exif)
+    cache.put(keys[1], patches, metrics, exif)
+    cache.put(keys[2], patches, metrics, exif)
+    assert cache.get(keys[0]) is not None
+    cache.put(keys[3], patches, metrics, exif)
+
+    assert cache.get(keys[1]) is None
+    for key in (keys[0], keys[2], keys[3]):
+        cached_patches, cached_metrics, cached_exif = cache.get(key)
+        assert (cached_patches == patches).all()
+        assert cached_exif == exif
+    cache.close()
@@ -0,0 +1,63 @@
+""" Vectorized deltaE and RGB to Lab give the same values as colormath2
+which they replace."""
+import os
+import sys
+
+import numpy
+import pytest
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+import synthetic  # noqa: E402
+
+deltae = synthetic.deltae
+colormath2 = pytest.importorskip("colormath2")
+
+from colormath2.color_conversions import convert_color  # noqa: E402
+from colormath2.color_diff import (delta_e_cie1976,  # noqa: E402
+                                   delta_e_cie2000)
+from colormath2.color_objects import (LabColor, AdobeRGBColor,  # noqa: E402
+                                      sRGBColor)
+
+# Max difference from colormath2 (rounding of float operations)
+TOLERANCE = 1e-12
+
+
+def random_lab(rng, count):
+    lab = numpy.column_stack((rng.uniform(0, 100, count),
+                              rng.uniform(-128, 127, (count, 2))))
+    # Neutral colors and near ones, where hue of dE 2000 is special
+    lab[:count // 10, 1:] = 0.0
+    lab[count // 10:count // 5, 1:] *= 1e-3
+    return lab
+
+
+@pytest.mark.parametrize("formula, colormath_delta_e",
+                         (("2k", delta_e_cie2000), ("76", delta_e_cie1976)))
+def test_delta_e(formula, colormath_delta_e):
+    rng = numpy.random.default_rng(0)
+    lab1, lab2 = random_lab(rng, 1000), random_lab(rng, 1000)
+    # Small differences like of good captures
+    lab2[::2] = lab1[::2] + rng.normal(0, 1, (500, 3))
+
+    values = deltae.delta_e_calc_array(lab1, lab2, formula)
+    expected = [colormath_delta_e(LabColor(*color1), LabColor(*color2))
+                for color1, color2 in zip(lab1, lab2)]
+    assert numpy.abs(values - expected).max() < TOLERANCE
+
+
+@pytest.mark.parametrize("rgb_type", (AdobeRGBColor, sRGBColor))
+def test_rgb_to_lab(rgb_type):
+    rng = numpy.random.default_rng(0)
+    rgb = rng.uniform(0, 1, (1000, 3))
+    # Blacks and whites, near linear part of sRGB curve
+    rgb[:10] = 0.0
+    rgb[10:20] = 1.0
+    rgb[20:100] *= 0.05
+
+    values = deltae.rgb_to_lab_array(rgb, rgb_type)
+    expected = [convert_color(rgb_type(*color), LabColor,
+                              target_illuminant="d50").get_value_tuple()
+                for color in rgb]
+    assert numpy.abs(values - expected).max() < TOLERANCE
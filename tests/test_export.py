@@ -0,0 +1,60 @@
+""" Every run appends rows to CSV files of export, header is written
+only to new file."""
+import os
+import sys
+import csv
+import subprocess
+
+import pytest
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+import synthetic  # noqa: E402
+
+deltae = synthetic.deltae
+DELTAE = os.path.join(synthetic.DELTAE_DIR, "deltae.py")
+
+
+def read_csv(fname):
+    with open(fname, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_runs_append(tmp_path):
+    fname = synthetic.generate(str(tmp_path), "cc24", megapixels=1)["file"]
+    export = tmp_path / "export"
+    for _ in range(2):
+        result = subprocess.run([sys.executable, DELTAE, fname, "--export",
+                                 str(export), "--metadata", "pillow"],
+                                capture_output=True, text=True)
+        assert result.returncode == 0, result.stdout + result.stderr
+
+    for name, fields, count in (
+            ("captures", deltae.EXPORT_CAPTURE_FIELDS, 1),
+            ("patches", deltae.EXPORT_PATCH_FIELDS, 24)):
+        rows = read_csv(export / f"{name}.csv")
+        header = [field for field, _ in fields]
+        assert rows[0] == header
+        assert header not in rows[1:]
+        assert len(rows) == 1 + 2 * count
+        # Second run gives the same values, only time of analysis differs
+        values = [[value for field, value in zip(header, row)
+                   if field != "analyzed"] for row in rows[1:]]
+        assert values[:count] == values[count:]
+
+
+def test_parquet_of_runs(tmp_path):
+    pyarrow_parquet = pytest.importorskip("pyarrow.parquet")
+    fname = synthetic.generate(str(tmp_path), "cc24", megapixels=1)["file"]
+    export = tmp_path / "export"
+    for _ in range(2):
+        subprocess.run([sys.executable, DELTAE, fname, "--export",
+                        str(export), "--metadata", "pillow"], check=True,
+                       capture_output=True)
+
+    runs = sorted(os.listdir(export / "patches"))
+    assert len(runs) == 2
+    for run in runs:
+        assert pyarrow_parquet.read_table(export / "patches" / run
+                                          ).num_rows == 24
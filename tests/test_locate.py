@@ -0,0 +1,44 @@
+""" Checker which isn't on capture raises CheckerNotFound, which only
+command line turns into exit with message."""
+import os
+import sys
+import subprocess
+
+import pytest
+from PIL import Image
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+import synthetic  # noqa: E402
+
+deltae = synthetic.deltae
+DELTAE = os.path.join(synthetic.DELTAE_DIR, "deltae.py")
+
+
+@pytest.fixture
+def blank(tmp_path):
+    fname = str(tmp_path / "blank.tif")
+    Image.new("RGB", (1200, 800), (128, 128, 128)).save(fname)
+    return fname
+
+
+def test_not_found(blank):
+    settings = deltae.get_settings(locate=True, metadata="pillow",
+                                   write_report=False)
+    with pytest.raises(deltae.CheckerNotFound, match="not found"):
+        deltae.analyze_image(blank, settings)
+
+    # Batch and watch report it as error of file
+    fname, value, error, _, _ = deltae.analyze_file(blank, settings)
+    assert value is None
+    assert error.startswith("CheckerNotFound: checker cc24 not found")
+
+
+def test_not_found_cli(blank):
+    result = subprocess.run([sys.executable, DELTAE, blank, "--locate",
+                             "--metadata", "pillow"],
+                            capture_output=True, text=True)
+    assert result.returncode == 1
+    assert result.stderr.startswith("checker cc24 not found")
+    assert "Traceback" not in result.stderr
@@ -0,0 +1,49 @@
+""" File whose exiftool session ends gets metadata from Pillow, next
+file starts new session."""
+import os
+import sys
+
+import pytest
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+import synthetic  # noqa: E402
+
+deltae = synthetic.deltae
+
+# exiftool -stay_open which answers every command with the same values
+FAKE_EXIFTOOL = f"""#!{sys.executable}
+import sys
+for line in sys.stdin:
+    if line.strip() == "-execute":
+        print("\\t".join(["Fake"] * 15) + "\\n{{ready}}", flush=True)
+"""
+
+
+@pytest.fixture
+def exiftool(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "exiftool").write_text(FAKE_EXIFTOOL)
+    (bin_dir / "exiftool").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(deltae, "exiftool_session", None)
+    yield
+    if deltae.exiftool_session is not None:
+        deltae.end_exiftool_session(deltae.exiftool_session)
+
+
+def test_session_ended(tmp_path, exiftool, capsys):
+    fname = synthetic.generate(str(tmp_path), "cc24", megapixels=1)["file"]
+    assert deltae.get_exif_data(fname).make == "Fake"
+
+    session = deltae.exiftool_session
+    session.process.kill()
+    session.process.wait()
+    exif = deltae.get_exif_data(fname)
+    assert exif.filetype == "TIFF"
+    assert "exiftool session ended unexpectedly" in capsys.readouterr().out
+
+    assert deltae.get_exif_data(fname).make == "Fake"
+    assert deltae.exiftool_session is not session
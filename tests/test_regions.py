@@ -0,0 +1,99 @@
+""" Region sampler reads the same pixels as full decode and leaves
+truncated or not RGB TIFF files to it."""
+import os
+import sys
+import struct
+
+import numpy
+import pytest
+from PIL import Image
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+import synthetic  # noqa: E402
+
+deltae = synthetic.deltae
+
+
+def set_tag(fname, tag, change):
+    """Change value (or values at offset) of tag of TIFF written by
+    synthetic.write_tiff"""
+    with open(fname, "r+b") as f:
+        f.seek(4)
+        ifd, = struct.unpack("<I", f.read(4))
+        f.seek(ifd)
+        entries, = struct.unpack("<H", f.read(2))
+        for entry in range(entries):
+            f.seek(ifd + 2 + 12 * entry)
+            number, kind, count, value = struct.unpack("<HHII", f.read(12))
+            if number != tag:
+                continue
+            if kind == 3 and count == 1:
+                f.seek(ifd + 2 + 12 * entry + 8)
+                f.write(struct.pack("<HH", change(value & 0xFFFF), 0))
+            elif count == 1:
+                f.seek(ifd + 2 + 12 * entry + 8)
+                f.write(struct.pack("<I", change(value)))
+            else:
+                f.seek(value)
+                values = struct.unpack(f"<{count}I", f.read(4 * count))
+                f.seek(value)
+                f.write(struct.pack(f"<{count}I", *map(change, values)))
+
+
+def analyze(fname, sampler, checker="cc24"):
+    settings = deltae.get_settings(checker, sampler=sampler,
+                                   metadata="pillow", write_report=False)
+    return deltae.analyze_image(fname, settings)
+
+
+@pytest.mark.parametrize("deflate", (False, True))
+@pytest.mark.parametrize("bits", (8, 16))
+@pytest.mark.parametrize("checker", ("cc24", "gt10"))
+def test_region_like_pillow(tmp_path, checker, bits, deflate):
+    fname = synthetic.generate(str(tmp_path), checker, bits=bits,
+                               megapixels=2, noise=0.02,
+                               deflate=deflate)["file"]
+    region = analyze(fname, "region", checker)
+    pillow = analyze(fname, "pillow", checker)
+    for field in ("R", "G", "B", "L_trim", "L_std"):
+        assert (region.patches[field] == pillow.patches[field]).all()
+    assert region.noise == pillow.noise
+    # Edges without SFR50 have NaN
+    numpy.testing.assert_array_equal(region.sharpness.edges,
+                                     pillow.sharpness.edges)
+
+
+@pytest.mark.parametrize("deflate", (False, True))
+@pytest.mark.parametrize("bits", (8, 16))
+def test_truncated(tmp_path, bits, deflate):
+    fname = synthetic.generate(str(tmp_path), "cc24", bits=bits,
+                               megapixels=1, deflate=deflate)["file"]
+    # Strips lose second half of their data
+    set_tag(fname, 279, lambda count: count // 2)
+
+    with Image.open(fname) as cc_file:
+        boxes = deltae.get_checker_boxes("cc24", *cc_file.size, 0)[1]
+        assert deltae.read_tiff_regions(cc_file, boxes.tolist()) is None
+    # Region sampler decodes all like pillow sampler, not mean of memory
+    # which wasn't read: same error, or same values when pillow reads
+    # past counts of strips
+    try:
+        pillow = analyze(fname, "pillow")
+    except Exception as error:
+        with pytest.raises(type(error)):
+            analyze(fname, "region")
+    else:
+        region = analyze(fname, "region")
+        for field in ("R", "G", "B"):
+            assert (region.patches[field] == pillow.patches[field]).all()
+
+
+def test_not_rgb(tmp_path):
+    fname = synthetic.generate(str(tmp_path), "cc24", megapixels=1)["file"]
+    # YCbCr
+    set_tag(fname, 262, lambda photometric: 6)
+
+    with Image.open(fname) as cc_file:
+        assert deltae.read_tiff_regions(cc_file, [(0, 0, 8, 8)]) is None
@@ -0,0 +1,54 @@
+""" Sampling of patches: check of reduced decode against full resolution
+runs without ImageMagick, mean of probe like magick."""
+import os
+import sys
+
+import numpy
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+import synthetic  # noqa: E402
+
+deltae = synthetic.deltae
+
+
+def test_reduced_tolerance_without_magick(tmp_path, monkeypatch, capsys):
+    # Big enough for JPEG draft with full sized probes
+    fname = synthetic.generate(str(tmp_path), "cc24", file_format="jpg",
+                               megapixels=20)["file"]
+    monkeypatch.setenv("PATH", str(tmp_path))
+
+    for options in ({"reduced_tolerance": 0.5}, {"compare_sampling": True}):
+        settings = deltae.get_settings(reduced_decode=True,
+                                       metadata="pillow",
+                                       write_report=False, **options)
+        deltae.analyze_image(fname, settings)
+        out = capsys.readouterr().out
+        assert "Reduced decode: scale 0.25" in out
+        assert "Full resolution:" in out
+        assert "Warning: reduced decode differs" not in out
+    assert "magick isn't installed" in out
+
+
+def test_mean_of_encoded_values():
+    # Noisy probes of all patches of cc24, noise 1 % of range gives L* std
+    # about 1 (4 FADGI stars)
+    spec = deltae.get_checker_spec("cc24")
+    rgb = synthetic.lab_to_rgb(spec.reference)
+    rng = numpy.random.default_rng(0)
+    pixels = numpy.clip(rgb[:, numpy.newaxis]
+                        + rng.normal(0, 0.01, (len(rgb), 2500, 3)), 0, 1)
+    pixels = numpy.round(pixels * 65535).astype(numpy.uint16)
+
+    encoded = numpy.array([deltae.get_mean_rgb(probe[numpy.newaxis], 65535)
+                           for probe in pixels])
+    assert numpy.allclose(encoded, pixels.mean(axis=1) / 65536)
+
+    # Mean in linear light (not used) differs a little
+    gamma = deltae.AdobeRGBColor.rgb_gamma
+    linear = ((pixels / 65535) ** gamma).mean(axis=1) ** (1 / gamma)
+    de = deltae.delta_e_calc_array(deltae.rgb_to_lab_array(encoded),
+                                   deltae.rgb_to_lab_array(linear * 65535
+                                                           / 65536), "2k")
+    assert de.max() < 0.05
@@ -0,0 +1,18 @@
+""" Startup of deltae.py (benchmarks/startup.py) is in budget and text
+check doesn't load modules of image path."""
+import os
+import sys
+import subprocess
+
+STARTUP = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks", "startup.py")
+# Median of CLI checking text file in ms, about 3 times of
+# benchmarks/startup_baseline.txt as shared machines vary a lot
+BUDGET_MS = 500
+
+
+def test_startup_budget():
+    result = subprocess.run([sys.executable, STARTUP, "--runs", "3",
+                             "--budget", str(BUDGET_MS)],
+                            capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,56 @@
+""" Synthetic captures of benchmarks/synthetic.py: probes of deltae.py get
+only their patches and noiseless captures match the reference."""
+import os
+import sys
+
+import numpy
+import pytest
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+import synthetic  # noqa: E402
+
+deltae = synthetic.deltae
+
+
+@pytest.mark.parametrize("megapixels", (1, 2, 5))
+@pytest.mark.parametrize("checker", list(deltae.checker_data))
+def test_probes_outside_squares(checker, megapixels):
+    width = round((megapixels * 1e6 * synthetic.ASPECT) ** 0.5)
+    height = round(width / synthetic.ASPECT)
+    index, _ = synthetic.render_index(checker, width, height)
+    index = numpy.asarray(index)
+    _, boxes = deltae.get_checker_boxes(checker, width, height, 0)
+    # 0 is background, 1 slanted squares, patches from 2
+    for left, top, right, bottom in boxes.tolist():
+        assert index[top:bottom, left:right].min() > 1
+
+
+@pytest.mark.parametrize("orientation", ("S", "E"))
+@pytest.mark.parametrize("checker", list(deltae.checker_data))
+def test_noiseless_deltae(tmp_path, checker, orientation):
+    # 16-bit, rounding to 8 bits alone gives dE about 0.2
+    entry = synthetic.generate(str(tmp_path), checker, orientation, 16)
+    settings = deltae.get_settings(checker, orientation, metadata="pillow",
+                                   write_report=False)
+    result = deltae.analyze_image(entry["file"], settings)
+    assert result.deltae < 0.05
+    if checker in deltae.SFR_CHECKERS:
+        assert result.sharpness.edges
+
+
+def test_png16_full_precision(tmp_path):
+    from PIL import Image
+
+    arrays = []
+    for file_format in ("png", "tif"):
+        entry = synthetic.generate(str(tmp_path), "cc24", bits=16,
+                                   file_format=file_format, megapixels=1,
+                                   noise=0.01)
+        with Image.open(entry["file"]) as cc_file:
+            arrays.append(deltae.get_image_array(cc_file))
+    (png, png_max), (tif, tif_max) = arrays
+    assert png_max == tif_max == 65535
+    assert png.dtype == numpy.uint16
+    assert (png == tif).all()
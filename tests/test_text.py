@@ -0,0 +1,85 @@
+""" Captures of text files are compared with checker of their target
+type, unknown ones are skipped."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+import deltae  # noqa: E402
+
+
+def write_capture(f, capture, target, checker, extra=()):
+    spec = deltae.get_checker_spec(checker)
+    f.write(f"{capture}\nCollected targets/patches\n\n"
+            f"Targettype: {target}\nPatch,R,G,B,L,a,b\n")
+    for pname, (lab_l, lab_a, lab_b) in [*zip(spec.patches,
+                                              spec.reference.tolist()),
+                                         *extra]:
+        f.write(f"{pname},0,0,0,{lab_l},{lab_a},{lab_b}\n")
+
+
+def test_target_types(tmp_path, capsys):
+    fname = str(tmp_path / "captures.txt")
+    with open(fname, "w", encoding="utf-8") as f:
+        write_capture(f, "cc", "CC", "cc24")
+        write_capture(f, "unknown", "Foo", "cc24")
+        write_capture(f, "gt", "gt10", "gt10")
+        write_capture(f, "missing", "CC", "cc24", [("Z9", (50, 0, 0))])
+
+    results = deltae.analyze_text(fname, checker="halfcc")
+    assert [(r.capture, r.checker) for r in results] == [("cc", "cc24"),
+                                                         ("gt", "gt10")]
+    assert all(r.deltae < 0.01 for r in results)
+    warnings = capsys.readouterr().out
+    assert "capture unknown skipped" in warnings
+    assert "capture missing skipped" in warnings
+
+
+def test_no_captures(tmp_path):
+    fname = str(tmp_path / "empty.txt")
+    with open(fname, "w", encoding="utf-8") as f:
+        write_capture(f, "unknown", "Foo", "cc24")
+
+    assert deltae.analyze_text(fname) == []
+
+
+def test_csv_without_target_type(tmp_path):
+    fname = str(tmp_path / "plain.csv")
+    with open(fname, "w", encoding="utf-8") as f:
+        write_capture(f, "plain", "", "cc24")
+    with open(fname, encoding="utf-8") as f:
+        lines = [line for line in f if not line.startswith("Targettype:")]
+    with open(fname, "w", encoding="utf-8") as f:
+        f.writelines(lines)
+
+    results = deltae.analyze_text(fname)
+    assert [(r.capture, r.target, r.checker) for r in results] == [
+        ("plain", "-", "cc24")]
+    assert results[0].deltae < 0.01
+
+
+def write_cgats(f, capture, ids, names):
+    spec = deltae.get_checker_spec("cc24")
+    f.write(f'CGATS.17\nDESCRIPTOR "{capture}"\nBEGIN_DATA_FORMAT\n'
+            "SAMPLE_ID SAMPLE_NAME LAB_L LAB_A LAB_B\nEND_DATA_FORMAT\n"
+            "BEGIN_DATA\n")
+    for sample_id, name, (lab_l, lab_a, lab_b) in zip(
+            ids, names, spec.reference.tolist()):
+        f.write(f"{sample_id} {name} {lab_l} {lab_a} {lab_b}\n")
+    f.write("END_DATA\n")
+
+
+def test_cgats_sample_name_and_id(tmp_path):
+    patches = deltae.get_checker_spec("cc24").patches
+    fname = str(tmp_path / "captures.txt")
+    with open(fname, "w", encoding="utf-8") as f:
+        # Standard: numbers in SAMPLE_ID, patches in SAMPLE_NAME
+        write_cgats(f, "numbers", range(1, 25), patches)
+        # Patches in SAMPLE_ID, other names in SAMPLE_NAME
+        write_cgats(f, "names", patches, [f"color{i}" for i in range(24)])
+
+    results = deltae.analyze_text(fname)
+    assert [r.capture for r in results] == ["numbers", "names"]
+    for result in results:
+        assert result.patches == tuple(patches)
+        assert result.deltae < 0.01
@@ -0,0 +1,45 @@
+""" Tracing of files analyzed concurrently: every file gets only stages
+of its own analysis."""
+import os
+import sys
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+import synthetic  # noqa: E402
+
+deltae = synthetic.deltae
+
+
+def read_stages(fname):
+    with open(f"{fname}{deltae.TRACE_SUFFIX}", encoding="utf-8") as f:
+        trace = json.load(f)
+    assert trace["file"] == fname
+    return {name: stage["calls"] for name, stage in trace["stages"].items()}
+
+
+def test_concurrent_traces(tmp_path):
+    files = {checker: synthetic.generate(str(tmp_path), checker,
+                                         megapixels=1)["file"]
+             for checker in ("cc24", "gt10")}
+
+    def analyze(checker):
+        settings = deltae.get_settings(checker, metadata="pillow",
+                                       trace=True)
+        return deltae.analyze_image(files[checker], settings)
+
+    alone = {}
+    for checker, fname in files.items():
+        analyze(checker)
+        alone[checker] = read_stages(fname)
+    # SFR is measured only on GoldenThread
+    assert "sfr" not in alone["cc24"] and "sfr" in alone["gt10"]
+
+    # Repeated, so that stages of both files overlap in time
+    for _ in range(3):
+        with ThreadPoolExecutor(2) as executor:
+            list(executor.map(analyze, files))
+        for checker, fname in files.items():
+            assert read_stages(fname) == alone[checker]
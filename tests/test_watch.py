@@ -0,0 +1,40 @@
+""" Watched file is analyzed after settle time, printed latency is
+counted from its last change, so it includes settle time."""
+import os
+import re
+import sys
+import time
+
+BENCHMARKS_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "benchmarks")
+sys.path.insert(0, BENCHMARKS_DIR)
+import synthetic  # noqa: E402
+
+deltae = synthetic.deltae
+
+SETTLE = 0.3
+
+
+def test_latency_from_change(tmp_path, monkeypatch, capsys):
+    fname = synthetic.generate(str(tmp_path), "cc24", megapixels=1)["file"]
+    settings = deltae.get_settings(metadata="pillow", cache=None)
+    sleep = time.sleep
+    scans = []
+
+    def scan_interval(seconds):
+        # Stopped like by Ctrl-C when report is written
+        scans.append(seconds)
+        if os.path.exists(f"{fname}.txt") or len(scans) > 100:
+            raise KeyboardInterrupt
+        sleep(seconds)
+    monkeypatch.setattr(deltae.time, "sleep", scan_interval)
+
+    changed = time.monotonic()
+    deltae.watch_folder(str(tmp_path), settings, SETTLE)
+    elapsed = time.monotonic() - changed
+
+    out = capsys.readouterr().out
+    latency = float(re.search(rf"{re.escape(fname)}: dE [\d.]+ "
+                              rf"\(([\d.]+) s\)", out)[1])
+    assert SETTLE <= latency <= elapsed
+    assert "1 files analyzed" in out